@@ -6,8 +6,9 @@ Evaluates student answers based on question type and answer key
 import re
 import math
 import logging
+import functools
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import nltk
@@ -16,6 +17,11 @@ from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from difflib import SequenceMatcher
 
+from modules.similarity import TfidfSimilarityEngine
+from modules.answer_key import AnswerKey
+from modules.document_model import Document
+from modules.numeric_grading import NumericGrader, parse_reference, parse_unit
+
 # Download necessary NLTK data
 try:
     nltk.download('punkt', quiet=True)
@@ -26,30 +32,60 @@ except:
 
 logger = logging.getLogger(__name__)
 
+# Runs of letters/digits - the tokens that survive the isalnum() filter
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
 class AnswerEvaluationEngine:
-    def __init__(self, llm_service=None):
+    def __init__(self, llm_service=None, tokenizer: str = "nltk",
+                 token_cache_size: int = 8192, lemma_cache_size: int = 65536):
+        """
+        Args:
+            llm_service: Optional LLM service for essay evaluation
+            tokenizer: "nltk" for word_tokenize, or "regex" for a pure-regex
+                       tokenizer that doesn't need the punkt model
+            token_cache_size: Number of preprocessed texts to memoize
+            lemma_cache_size: Number of lemmatized words to memoize
+        """
         logger.info("Initializing Answer Evaluation Engine")
         
+        if tokenizer not in ("nltk", "regex"):
+            raise ValueError(f"Unknown tokenizer: {tokenizer}")
+        self.tokenizer = tokenizer
+        
         # Initialize language processing tools
         self.lemmatizer = WordNetLemmatizer()
         self.stop_words = set(stopwords.words('english'))
         
+        # Memoize preprocessing; answer-key texts and common phrasings repeat constantly
+        self._lemmatize = functools.lru_cache(maxsize=lemma_cache_size)(self.lemmatizer.lemmatize)
+        self._preprocess_normalized = functools.lru_cache(maxsize=token_cache_size)(self._tokenize_normalized)
+        
         # Initialize text similarity tools
         self.vectorizer = TfidfVectorizer(
             tokenizer=self._preprocess_text,
             stop_words='english'
         )
         
+        # Batched similarity against the answer key, fitted once per key
+        self.similarity = TfidfSimilarityEngine(tokenizer=self._preprocess_text)
+        
+        # Unit-aware numeric comparison for mathematical questions
+        self.numeric_grader = NumericGrader()
+        
         # Initialize LLM service for essay evaluation if provided
         self.llm_service = llm_service
     
-    def evaluate(self, questions: List[Dict], answer_key: Optional[Dict] = None) -> List[Dict]:
+    def evaluate(self, questions: List[Dict], answer_key: Optional[Dict] = None,
+                 answers: Optional[Any] = None) -> List[Dict]:
         """
         Evaluate answers for all questions
         
         Args:
             questions: List of classified questions
             answer_key: Optional answer key information
+            answers: Optional AnswerKey already built with extract_answers (or a
+                     plain {question id: answer} dict), used instead of
+                     re-parsing the answer key
             
         Returns:
             List of questions with evaluation results
@@ -57,9 +93,13 @@ class AnswerEvaluationEngine:
         logger.info(f"Evaluating {len(questions)} questions")
         
         # Extract answer key data if provided
-        answers = {}
-        if answer_key:
-            answers = self._extract_answers_from_key(answer_key)
+        if answers is None:
+            answers = self.extract_answers(answer_key) if answer_key else AnswerKey()
+        elif not isinstance(answers, AnswerKey):
+            answers = AnswerKey.from_answers(answers)
+        
+        # Fit the similarity model on the answer-key corpus (a no-op for the same key)
+        self.similarity.fit(answers.references(), reference_tokens=answers.reference_tokens(self.tokenizer))
         
         # Process each question
         evaluated_questions = []
@@ -67,12 +107,14 @@ class AnswerEvaluationEngine:
         for question in questions:
             question_id = question["id"]
             
-            # Get the correct answer for this question
-            correct_answer = answers.get(question_id)
+            # Get the correct answer for this question, and the form parsed for its type
+            entry = answers.entry(question_id)
+            correct_answer = entry.raw if entry is not None else None
+            typed_answer = entry.value_for(question["type"]) if entry is not None else None
             
             # If answer key wasn't provided, try to extract from question
             if not correct_answer:
-                correct_answer = self._extract_answer_from_question(question)
+                correct_answer = typed_answer = self._extract_answer_from_question(question)
             
             # If we still don't have an answer, mark for manual review
             if not correct_answer:
@@ -89,19 +131,19 @@ class AnswerEvaluationEngine:
             
             # Evaluate based on question type
             if question["type"] == "multiple_choice":
-                self._evaluate_multiple_choice(question, correct_answer)
+                self._evaluate_multiple_choice(question, typed_answer)
             elif question["type"] == "true_false":
-                self._evaluate_true_false(question, correct_answer)
+                self._evaluate_true_false(question, typed_answer)
             elif question["type"] == "short_answer":
-                self._evaluate_short_answer(question, correct_answer)
+                self._evaluate_short_answer(question, typed_answer)
             elif question["type"] == "essay":
-                self._evaluate_essay(question, correct_answer)
+                self._evaluate_essay(question, typed_answer)
             elif question["type"] == "fill_in_blank":
-                self._evaluate_fill_in_blank(question, correct_answer)
+                self._evaluate_fill_in_blank(question, typed_answer)
             elif question["type"] == "matching":
-                self._evaluate_matching(question, correct_answer)
+                self._evaluate_matching(question, typed_answer)
             elif question["type"] == "mathematical":
-                self._evaluate_mathematical(question, correct_answer)
+                self._evaluate_mathematical(question, typed_answer)
             else:
                 # Default to marking for review
                 question["evaluation"] = {
@@ -115,43 +157,23 @@ class AnswerEvaluationEngine:
         logger.info(f"Completed evaluation for {len(evaluated_questions)} questions")
         return evaluated_questions
     
-    def _extract_answers_from_key(self, answer_key: Dict) -> Dict:
+    def extract_answers(self, answer_key: Union[Dict, Document], content_hash: Optional[str] = None) -> AnswerKey:
+        """
+        Build the AnswerKey of a processed answer key once, with the tokens of
+        its text answers precomputed, so it can be reused (and saved) for
+        every submission graded against the same key
+        
+        Args:
+            answer_key: Processed answer-key PDF content, as a pdf_content dict or a compact Document
+            content_hash: Hash of the answer-key file, identifying the saved key
+        """
+        key = self._extract_answers_from_key(answer_key, content_hash)
+        key.precompute_tokens(self._preprocess_text, self.tokenizer)
+        return key
+    
+    def _extract_answers_from_key(self, answer_key: Union[Dict, Document], content_hash: Optional[str] = None) -> AnswerKey:
         """Extract answers from the provided answer key"""
-        answers = {}
-        
-        # Process answer key based on format
-        # This is a simplified implementation
-        
-        # Check for tables containing answers
-        for table in answer_key.get("tables", []):
-            for row in table.get("cells", []):
-                for cell in row:
-                    text = cell.get("text", "").strip()
-                    
-                    # Look for question ID and answer pattern
-                    match = re.search(r'(question-\d+|q\d+)[\s:]+([A-Za-z0-9].*)', text, re.IGNORECASE)
-                    if match:
-                        q_id = match.group(1).lower()
-                        answer = match.group(2).strip()
-                        answers[q_id] = answer
-        
-        # Look for answers in text blocks
-        for page in answer_key.get("pages", []):
-            for block in page.get("text_blocks", []):
-                text = block.get("text", "").strip()
-                
-                # Look for answer patterns
-                lines = text.split('\n')
-                for line in lines:
-                    match = re.search(r'(question-\d+|q\d+|#\d+)[\s:]+([A-Za-z0-9].*)', line, re.IGNORECASE)
-                    if match:
-                        q_id = match.group(1).lower().replace('#', 'question-')
-                        if not q_id.startswith('question-'):
-                            q_id = 'question-' + q_id[1:]
-                        answer = match.group(2).strip()
-                        answers[q_id] = answer
-        
-        return answers
+        return AnswerKey.from_pdf_content(answer_key, content_hash=content_hash)
     
     def _extract_answer_from_question(self, question: Dict) -> Optional[Any]:
         """Try to extract the correct answer from the question data"""
@@ -180,17 +202,38 @@ class AnswerEvaluationEngine:
     
     def _preprocess_text(self, text: str) -> List[str]:
         """Preprocess text for similarity comparison"""
+        # Normalize case and whitespace so equivalent texts share a cache entry
+        normalized = " ".join(text.lower().split())
+        
+        return list(self._preprocess_normalized(normalized))
+    
+    def _tokenize_normalized(self, text: str) -> Tuple[str, ...]:
+        """Tokenize, filter and lemmatize normalized text (memoized by _preprocess_text)"""
         # Tokenize text
-        tokens = word_tokenize(text.lower())
+        if self.tokenizer == "regex":
+            tokens = WORD_PATTERN.findall(text)
+        else:
+            tokens = word_tokenize(text)
         
         # Remove stopwords and lemmatize
-        tokens = [
-            self.lemmatizer.lemmatize(word) 
-            for word in tokens 
+        return tuple(
+            self._lemmatize(word)
+            for word in tokens
             if word not in self.stop_words and word.isalnum()
-        ]
+        )
+    
+    def score_answers(self, student_answers: List[Dict[str, str]]) -> np.ndarray:
+        """
+        Score a whole class of answers against the fitted answer key
         
-        return tokens
+        Args:
+            student_answers: One mapping of question id to answer text per student
+            
+        Returns:
+            Similarity array of shape (students, questions), with columns
+            ordered like self.similarity.question_ids
+        """
+        return self.similarity.score_matrix(student_answers)
     
     def _calculate_text_similarity(self, text1: str, text2: str) -> float:
         """Calculate similarity between two texts"""
@@ -198,6 +241,11 @@ class AnswerEvaluationEngine:
         if len(text1) < 50 and len(text2) < 50:
             return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
         
+        # Reuse the vocabulary fitted on the answer key rather than refitting on the pair
+        if self.similarity.is_fitted:
+            vectors = self.similarity.vectorizer.transform([text1, text2])
+            return float(vectors[0].multiply(vectors[1]).sum())
+        
         # For longer texts, use TF-IDF and cosine similarity
         try:
             tfidf_matrix = self.vectorizer.fit_transform([text1, text2])
@@ -279,7 +327,9 @@ class AnswerEvaluationEngine:
     def _evaluate_fill_in_blank(self, question: Dict, correct_answer: Any):
         """Evaluate fill-in-the-blank question"""
         # Parse correct answers - may be multiple for multiple blanks
-        if isinstance(correct_answer, str) and ',' in correct_answer:
+        if isinstance(correct_answer, list):
+            correct_answers = correct_answer
+        elif isinstance(correct_answer, str) and ',' in correct_answer:
             correct_answers = [ans.strip() for ans in correct_answer.split(',')]
         else:
             correct_answers = [correct_answer]
@@ -322,15 +372,79 @@ class AnswerEvaluationEngine:
         
         question["evaluation"] = evaluation
     
+    def score_math_answers(self, question: Dict, student_answers: Sequence[Optional[str]],
+                           correct_answer: Any = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Grade a whole class's answers to a mathematical question at once
+        
+        Args:
+            question: The classified question; its required_units, tolerance,
+                      absolute_tolerance and significant_figures are applied
+            student_answers: One answer per student (None for no answer)
+            correct_answer: The key value, defaulting to the question's answer_key
+            
+        Returns:
+            NumericGrader.grade arrays over the students (score is scaled to the
+            question's points), or None if the key value isn't numeric
+        """
+        if correct_answer is None:
+            correct_answer = question.get("answer_key")
+        if correct_answer is None:
+            return None
+        
+        results = self.numeric_grader.grade(
+            correct_answer,
+            student_answers,
+            required_units=question.get("required_units"),
+            relative_tolerance=question.get("tolerance"),
+            absolute_tolerance=question.get("absolute_tolerance"),
+            significant_figures=question.get("significant_figures")
+        )
+        if results is not None:
+            results["score"] = results["score"] * question.get("points", 2.0)
+        return results
+    
     def _evaluate_mathematical(self, question: Dict, correct_answer: Any):
         """Evaluate mathematical question"""
-        # Mathematical questions need numerical comparison with tolerance
-        try:
-            # Try to convert to float if it's a number
-            correct_value = float(correct_answer)
-            has_units = False
-        except:
-            # Check if it has units
-            match = re.search(r'([\d.]+)\s*([a-zA-Z]+)', correct_answer)
-            if match:
-                correct_value =
\ No newline at end of file
+        # Mathematical questions need numerical comparison with tolerance, in compatible units
+        reference = parse_reference(str(correct_answer))
+        if reference is None:
+            question["evaluation"] = {
+                "status": "needs_review",
+                "message": "Answer key value for a mathematical question is not numeric",
+                "correct_answer": correct_answer,
+                "student_answer": None,
+                "score": 0.0,
+                "max_score": question.get("points", 2.0),
+                "confidence": 0.3
+            }
+            return
+        
+        quantity, key_absolute, key_relative = reference
+        units = quantity.unit or question.get("required_units")
+        unit = parse_unit(units) if units else None
+        relative_tolerance, absolute_tolerance = self.numeric_grader.tolerances(
+            key_relative, key_absolute, question.get("tolerance"), question.get("absolute_tolerance")
+        )
+        
+        evaluation = {
+            "status": "evaluated",
+            "correct_answer": correct_answer,
+            "correct_value": quantity.value,
+            "units": units,
+            "units_required": bool(question.get("required_units")),
+            "units_recognized": unit is not None if units else None,
+            "student_answer": None,  # Would be filled with actual student answer
+            "is_correct": False,
+            "score": 0.0,
+            "max_score": question.get("points", 2.0),
+            "confidence": 0.9,  # Numeric comparison is reliable once the units are known
+            "tolerance": {"relative": relative_tolerance, "absolute": absolute_tolerance}
+        }
+        if question.get("significant_figures"):
+            evaluation["significant_figures"] = question["significant_figures"]
+        if units and unit is None:
+            # Units outside the conversion table are only matched as written
+            evaluation["confidence"] = 0.7
+        
+        question["evaluation"] = evaluation
@@ -0,0 +1,334 @@
+# modules/answer_key.py
+"""
+Answer Key Index
+Parsed, typed and versioned answer key, built once per key file and reused for every submission
+"""
+import os
+import re
+import json
+import zlib
+import hashlib
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+from modules.pdf_cache import EXTRACTOR_VERSION
+from modules.document_model import Document
+
+logger = logging.getLogger(__name__)
+
+# "Q3: B" / "question-3 42 m/s" in table cells
+TABLE_ANSWER_PATTERN = re.compile(r'(question-\d+|q\d+)[\s:]+([A-Za-z0-9].*)', re.IGNORECASE)
+
+# Same in text blocks, also accepting "#3". Neither the separator nor ".*" crosses a
+# newline, so scanning a whole block finds the first answer on every line, like
+# searching line by line
+LINE_ANSWER_PATTERN = re.compile(r'(question-\d+|q\d+|#\d+)(?:[^\S\n]|:)+([A-Za-z0-9].*)', re.IGNORECASE)
+
+# "3", "Q3", "q.3", "#3", "Question 3", "question-3"
+QUESTION_ID_PATTERN = re.compile(r'^\s*(?:question|q)?[\s.#\-]*(\d+)\s*$', re.IGNORECASE)
+
+# Typed answer forms
+CHOICE_PATTERN = re.compile(r'^\(?([A-Ha-h])\)?[.)]?$')
+TRUE_FALSE_VALUES = {"t": "true", "true": "true", "f": "false", "false": "false"}
+MATCHING_PAIR_PATTERN = re.compile(r'^([A-Za-z0-9]{1,3})\s*-\s*([A-Za-z0-9]{1,3})$')
+
+def normalize_question_id(question_id: Any) -> str:
+    """Map the id spellings used in answer keys ("Q3", "#3", "3", ...) to "question-3" """
+    text = str(question_id)
+    match = QUESTION_ID_PATTERN.match(text)
+    if match:
+        return f"question-{int(match.group(1))}"
+    return text.strip().lower()
+
+class AnswerEntry:
+    """One answer of the key, parsed into its typed forms once"""
+    
+    def __init__(self, question_id: str, raw: str, kind: str = "text", value: Any = None,
+                 blanks: Optional[List[str]] = None, pairs: Optional[List] = None,
+                 tokens: Optional[List[str]] = None):
+        self.question_id = question_id
+        self.raw = raw
+        self.kind = kind
+        self.value = value
+        self.blanks = blanks if blanks is not None else [raw]
+        self.pairs = [tuple(pair) for pair in pairs] if pairs is not None else None
+        self.tokens = tokens
+    
+    @classmethod
+    def parse(cls, question_id: str, raw: Any) -> "AnswerEntry":
+        """
+        Detect the answer's form: true_false ("T"), choice ("B"), matching
+        ("A-1, B-3"), blanks ("Paris, Rome") or free text. Numeric keys stay
+        text; the numeric grader parses them, with their tolerance.
+        """
+        if not isinstance(raw, str):
+            return cls(question_id, raw, kind="structured", value=raw)
+        
+        text = raw.strip()
+        blanks = [part.strip() for part in text.split(',')] if ',' in text else [text]
+        
+        # "F" is false here; value_for reads it as choice F for a multiple choice question
+        lowered = text.lower()
+        if lowered in TRUE_FALSE_VALUES:
+            return cls(question_id, raw, kind="true_false", value=TRUE_FALSE_VALUES[lowered])
+        
+        match = CHOICE_PATTERN.match(text)
+        if match:
+            return cls(question_id, raw, kind="choice", value=match.group(1).upper())
+        
+        pair_matches = [MATCHING_PAIR_PATTERN.match(part) for part in blanks]
+        if all(pair_matches):
+            pairs = [(m.group(1), m.group(2)) for m in pair_matches]
+            return cls(question_id, raw, kind="matching", blanks=blanks, pairs=pairs)
+        
+        if len(blanks) > 1:
+            return cls(question_id, raw, kind="blanks", blanks=blanks)
+        
+        return cls(question_id, raw, kind="text")
+    
+    def value_for(self, question_type: str) -> Any:
+        """The pre-parsed form the evaluator expects for a question type"""
+        if question_type == "multiple_choice":
+            if self.kind == "choice":
+                return self.value
+            match = CHOICE_PATTERN.match(self.raw.strip()) if self.kind == "true_false" else None
+            if match:
+                return match.group(1).upper()
+        if question_type == "true_false" and self.kind == "true_false":
+            return self.value
+        if question_type == "fill_in_blank":
+            return self.blanks
+        if question_type == "matching" and self.pairs is not None:
+            return self.pairs
+        return self.raw
+    
+    def to_dict(self) -> Dict:
+        return {
+            "question_id": self.question_id,
+            "raw": self.raw,
+            "kind": self.kind,
+            "value": self.value,
+            "blanks": self.blanks,
+            "pairs": self.pairs,
+            "tokens": self.tokens
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AnswerEntry":
+        return cls(**data)
+
+class AnswerKey:
+    """
+    Index of an answer key by normalized question id.
+    
+    Built once from the processed key PDF (or a plain {question id: answer}
+    dict), it holds every answer in raw and typed form plus its preprocessed
+    tokens, so grading a submission is a dict lookup per question. The
+    version is a hash of the parsed answers; content_hash is the hash of the
+    key file it was built from, under which it is persisted.
+    """
+    
+    # Bump whenever parsing or the stored layout changes, so stale saved keys are rebuilt
+    FORMAT_VERSION = 3
+    
+    def __init__(self, entries: Optional[Dict[str, AnswerEntry]] = None,
+                 content_hash: Optional[str] = None, tokenizer: Optional[str] = None):
+        self.entries = entries or {}
+        self.content_hash = content_hash
+        self.tokenizer = tokenizer
+        self.version = self._compute_version()
+    
+    def _compute_version(self) -> str:
+        digest = hashlib.sha256(str(self.FORMAT_VERSION).encode("utf-8"))
+        for question_id in sorted(self.entries):
+            digest.update(b"\0")
+            digest.update(question_id.encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(json.dumps(self.entries[question_id].raw, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()[:16]
+    
+    @classmethod
+    def from_answers(cls, answers: Dict[str, Any], content_hash: Optional[str] = None) -> "AnswerKey":
+        """Build from a {question id: answer} mapping"""
+        entries = {}
+        for question_id, answer in answers.items():
+            question_id = normalize_question_id(question_id)
+            entries[question_id] = AnswerEntry.parse(question_id, answer)
+        return cls(entries, content_hash=content_hash)
+    
+    @classmethod
+    def from_pdf_content(cls, pdf_content: Union[Dict, Document], content_hash: Optional[str] = None) -> "AnswerKey":
+        """
+        Build from a processed answer-key PDF, as pdf_content or a compact
+        Document; text-block answers override table answers
+        """
+        answers = {}
+        
+        if isinstance(pdf_content, Document):
+            cell_texts = (text for table in pdf_content.tables() for row in table.cell_texts for text in row)
+            block_texts = (text for page in pdf_content.pages for text in page.text_blocks.texts)
+        else:
+            cell_texts = (
+                cell.get("text", "")
+                for table in pdf_content.get("tables", [])
+                for row in table.get("cells", [])
+                for cell in row
+            )
+            block_texts = (
+                block.get("text", "")
+                for page in pdf_content.get("pages", [])
+                for block in page.get("text_blocks", [])
+            )
+        
+        # Check for tables containing answers
+        for text in cell_texts:
+            match = TABLE_ANSWER_PATTERN.search(text.strip())
+            if match:
+                answers[normalize_question_id(match.group(1))] = match.group(2).strip()
+        
+        # Look for answers in text blocks
+        for text in block_texts:
+            for match in LINE_ANSWER_PATTERN.finditer(text):
+                answers[normalize_question_id(match.group(1))] = match.group(2).strip()
+        
+        logger.info(f"Indexed {len(answers)} answers from the answer key")
+        return cls.from_answers(answers, content_hash=content_hash)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+    
+    def __contains__(self, question_id: str) -> bool:
+        return self.entry(question_id) is not None
+    
+    def entry(self, question_id: str) -> Optional[AnswerEntry]:
+        """Look up an answer by question id in any of the accepted spellings"""
+        entry = self.entries.get(question_id)
+        if entry is None:
+            entry = self.entries.get(normalize_question_id(question_id))
+        return entry
+    
+    def get(self, question_id: str, default: Any = None) -> Any:
+        """The raw answer text for a question, like dict.get on the old answers dict"""
+        entry = self.entry(question_id)
+        return entry.raw if entry is not None else default
+    
+    def changed_questions(self, other: "AnswerKey") -> Set[str]:
+        """Normalized ids of the questions whose answer differs in another key, or is only in one of them"""
+        return {
+            question_id for question_id in set(self.entries) | set(other.entries)
+            if self.get(question_id) != other.get(question_id)
+        }
+    
+    def references(self) -> Dict[str, str]:
+        """Text answers by question id, the corpus for the similarity model"""
+        return {question_id: entry.raw for question_id, entry in self.entries.items() if isinstance(entry.raw, str)}
+    
+    def precompute_tokens(self, tokenize: Callable[[str], List[str]], tokenizer: str):
+        """
+        Store the preprocessed tokens of every text answer
+        
+        Args:
+            tokenize: The evaluator's preprocessing function
+            tokenizer: Name of the tokenizer mode, so tokens are only reused by a matching evaluator
+        """
+        for entry in self.entries.values():
+            if isinstance(entry.raw, str):
+                entry.tokens = list(tokenize(entry.raw))
+        self.tokenizer = tokenizer
+    
+    def reference_tokens(self, tokenizer: str) -> Optional[Dict[str, List[str]]]:
+        """Precomputed tokens by question id, if they were made with the given tokenizer mode"""
+        if tokenizer != self.tokenizer:
+            return None
+        return {question_id: entry.tokens for question_id, entry in self.entries.items() if entry.tokens is not None}
+    
+    def to_dict(self) -> Dict:
+        return {
+            "format_version": self.FORMAT_VERSION,
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "tokenizer": self.tokenizer,
+            "entries": [entry.to_dict() for entry in self.entries.values()]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AnswerKey":
+        if data.get("format_version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported answer key format version: {data.get('format_version')}")
+        
+        entries = {}
+        for entry_data in data["entries"]:
+            entry = AnswerEntry.from_dict(entry_data)
+            entries[entry.question_id] = entry
+        return cls(entries, content_hash=data.get("content_hash"), tokenizer=data.get("tokenizer"))
+    
+    def save(self, path: str):
+        """Write the key as compressed JSON, atomically"""
+        data = zlib.compress(json.dumps(self.to_dict(), separators=(",", ":"), default=str).encode("utf-8"))
+        
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    
+    @classmethod
+    def load(cls, path: str) -> "AnswerKey":
+        """Read a key written by save"""
+        with open(path, "rb") as f:
+            return cls.from_dict(json.loads(zlib.decompress(f.read()).decode("utf-8")))
+
+class AnswerKeyStore:
+    """Saved answer keys, named after the hash of the key file they were built from"""
+    
+    def __init__(self, directory: str = "cache/answer_keys"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, content_hash: str) -> str:
+        # The key is derived from extracted PDF content, so it goes stale with either version
+        return os.path.join(
+            self.directory, f"{content_hash}-v{EXTRACTOR_VERSION}.{AnswerKey.FORMAT_VERSION}.json.z"
+        )
+    
+    def get(self, content_hash: str) -> Optional[AnswerKey]:
+        """Get the saved key for a key file hash, or None on a miss"""
+        path = self._path(content_hash)
+        try:
+            return AnswerKey.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable answer key {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+    
+    def put(self, answer_key: AnswerKey):
+        """Save a key under its content hash"""
+        if not answer_key.content_hash:
+            raise ValueError("Only answer keys built from a hashed file can be stored")
+        answer_key.save(self._path(answer_key.content_hash))
+
+def create_answer_key_store() -> Optional[AnswerKeyStore]:
+    """
+    Create the store configured by ANSWER_KEY_DIR.
+    Setting ANSWER_KEY_DIR to an empty string disables saving keys.
+    """
+    directory = os.environ.get("ANSWER_KEY_DIR", "cache/answer_keys")
+    if not directory:
+        return None
+    
+    return AnswerKeyStore(directory)
@@ -0,0 +1,495 @@
+# benchmarks/run.py
+"""
+Benchmark Runner
+Times the pipeline stages and end-to-end API runs on synthetic exams, and compares results with a saved baseline
+"""
+import os
+import sys
+import copy
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.synthetic_exam import TOPICS, generate_exam, generate_answer_key
+
+RESULTS_FORMAT_VERSION = 1
+
+# A benchmark whose median time grows by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.15
+
+# Seconds an end-to-end evaluation may take before the run is abandoned
+END_TO_END_TIMEOUT = 600
+
+def time_call(func: Callable, repeat: int = 5, warmup: int = 1,
+              setup: Optional[Callable] = None) -> Dict:
+    """
+    Time func over several runs
+    
+    Args:
+        func: Function to time; called with setup()'s result when setup is given
+        repeat: Number of timed runs
+        warmup: Number of untimed runs first
+        setup: Optional untimed function preparing fresh arguments for every run
+               (e.g. a deep copy of a structure func modifies)
+    
+    Returns:
+        {"median", "min", "mean", "runs"} in seconds
+    """
+    def call():
+        if setup is None:
+            start = time.perf_counter()
+            func()
+        else:
+            argument = setup()
+            start = time.perf_counter()
+            func(argument)
+        return time.perf_counter() - start
+    
+    for _ in range(warmup):
+        call()
+    timings = [call() for _ in range(repeat)]
+    
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "mean": statistics.fmean(timings),
+        "runs": repeat
+    }
+
+def benchmark_stages(work_dir: str, pages: int, repeat: int) -> Dict[str, Dict]:
+    """Time each pipeline stage on its own, on a synthetic exam of the given length"""
+    from modules.pdf_processor import PDFProcessor
+    from modules.document_understanding import DocumentUnderstandingEngine
+    from modules.question_classifier import QuestionClassifier
+    from modules.answer_evaluator import AnswerEvaluationEngine
+    
+    test_path = os.path.join(work_dir, f"stages-{pages}p-test.pdf")
+    key_path = os.path.join(work_dir, f"stages-{pages}p-key.pdf")
+    exam = generate_exam(test_path, pages, seed=pages)
+    generate_answer_key(key_path, exam)
+    
+    pdf_processor = PDFProcessor()
+    doc_engine = DocumentUnderstandingEngine()
+    question_classifier = QuestionClassifier()
+    answer_evaluator = AnswerEvaluationEngine(tokenizer="regex")
+    
+    results = {}
+    suffix = f"{pages}p"
+    
+    results[f"process/{suffix}"] = time_call(lambda: pdf_processor.process(test_path), repeat)
+    pdf_content = pdf_processor.process(test_path)
+    
+    # Later stages modify their input in place, so each run gets a fresh copy
+    results[f"analyze/{suffix}"] = time_call(
+        doc_engine.analyze, repeat, setup=lambda: copy.deepcopy(pdf_content)
+    )
+    document_structure = doc_engine.analyze(copy.deepcopy(pdf_content))
+    
+    results[f"classify/{suffix}"] = time_call(
+        question_classifier.classify, repeat, setup=lambda: copy.deepcopy(document_structure)
+    )
+    questions = question_classifier.classify(copy.deepcopy(document_structure))
+    
+    answer_key = answer_evaluator.extract_answers(pdf_processor.process(key_path))
+    results[f"evaluate/{suffix}"] = time_call(
+        lambda q: answer_evaluator.evaluate(q, answers=answer_key), repeat,
+        setup=lambda: copy.deepcopy(questions)
+    )
+    
+    for result in results.values():
+        result["pages"] = pages
+        result["questions"] = len(questions)
+    
+    return results
+
+def _student_answers(count: int, seed: int = 0, unique: bool = False) -> List[str]:
+    """
+    Answer-like texts: answer-key sentences with words dropped and shuffled.
+    Phrasings repeat, as in a real class, unless unique is set.
+    """
+    rng = random.Random(seed)
+    answers = []
+    seen = set()
+    while len(answers) < count:
+        words = rng.choice(TOPICS)[1].split()
+        kept = [word for word in words if rng.random() > 0.2]
+        if rng.random() < 0.3:
+            rng.shuffle(kept)
+        answer = " ".join(kept)
+        if unique:
+            if answer in seen:
+                continue
+            seen.add(answer)
+        answers.append(answer)
+    return answers
+
+def benchmark_preprocessing(repeat: int, count: int = 2000) -> Dict[str, Dict]:
+    """
+    Tokens per second of answer preprocessing, per tokenizer: without the
+    caches (what every text cost before preprocessing was memoized), with
+    cleared caches and with warm caches. The texts are all distinct, so
+    the cold runs get no text cache hits; only words repeat.
+    """
+    from modules.answer_evaluator import AnswerEvaluationEngine
+    
+    corpus = _student_answers(count, unique=True)
+    results = {}
+    
+    for tokenizer in ("nltk", "regex"):
+        try:
+            # Cache sizes of 0 call the tokenizer and the lemmatizer for every text and word
+            uncached = AnswerEvaluationEngine(tokenizer=tokenizer, token_cache_size=0, lemma_cache_size=0)
+            answer_evaluator = AnswerEvaluationEngine(tokenizer=tokenizer)
+            tokens = sum(len(uncached._preprocess_text(text)) for text in corpus)
+        except LookupError as e:
+            # The NLTK models aren't downloaded (e.g. offline)
+            logging.warning(f"Skipping {tokenizer} preprocessing benchmark: {str(e).splitlines()[0]}")
+            continue
+        
+        def clear_caches():
+            answer_evaluator._preprocess_normalized.cache_clear()
+            answer_evaluator._lemmatize.cache_clear()
+        
+        for cache, engine, setup in (
+            ("uncached", uncached, None),
+            ("cold", answer_evaluator, clear_caches),
+            ("warm", answer_evaluator, lambda: None)
+        ):
+            preprocess = engine._preprocess_text
+            result = time_call(lambda *_: [preprocess(text) for text in corpus], repeat, setup=setup)
+            result["texts"] = count
+            result["tokens_per_second"] = tokens / result["median"]
+            # Before/after memoization, for the same tokenizer
+            result["speedup"] = result["tokens_per_second"] / results.get(
+                f"preprocess/{tokenizer}/uncached", result
+            )["tokens_per_second"]
+            results[f"preprocess/{tokenizer}/{cache}"] = result
+    
+    return results
+
+def benchmark_question_rules(repeat: int, count: int = 10000) -> Dict[str, Dict]:
+    """
+    Matching a bank of question texts with the compiled rule table vs. one
+    re.search per pattern and vs. the rules merged into one alternation
+    """
+    import re
+    from modules.rule_engine import QuestionRuleEngine, DEFAULT_RULES_PATH
+    
+    rng = random.Random(0)
+    templates = [
+        "True or False: {topic} is a renewable resource.",
+        "Discuss the impact of {topic} on modern society and give examples.",
+        "A. {topic} 1. definition\nB. process 2. outcome",
+        "Calculate the speed of the {topic} if it travels $d = 120$ km in $t = 2$ h. Express in km/h",
+        "What is the main function of the {topic}?",
+        "Compare and contrast {topic} with its alternatives.",
+        "Mark T or F: the {topic} always moves clockwise."
+    ]
+    topics = [topic for topic, _ in TOPICS]
+    bank = [rng.choice(templates).format(topic=rng.choice(topics)) for _ in range(count)]
+    
+    engine = QuestionRuleEngine.from_file()
+    with open(DEFAULT_RULES_PATH, "r", encoding="utf-8") as f:
+        categories = json.load(f)["categories"]
+    
+    # The per-pattern loops the rule engine replaced
+    def search_each(text):
+        fired = {}
+        lowered = text.lower()
+        for category, rules in categories.items():
+            for rule_name, rule in rules.items():
+                subject = lowered if "i" in rule.get("flags", "") else text
+                if re.search(rule["pattern"], subject):
+                    fired.setdefault(category, []).append(rule_name)
+        return fired
+    
+    # The rules merged into one alternation of named groups per text case
+    merged = {}
+    rule_names = {}
+    for i, (category, rule_name, compiled, lowercase) in enumerate(engine.rules):
+        merged.setdefault(lowercase, []).append(f"(?P<r{i}>{compiled.pattern})")
+        rule_names[f"r{i}"] = (category, rule_name)
+    merged = {lowercase: re.compile("|".join(parts)) for lowercase, parts in merged.items()}
+    
+    def search_merged(text):
+        fired = {}
+        lowered = text.lower()
+        for lowercase, pattern in merged.items():
+            for match in pattern.finditer(lowered if lowercase else text):
+                category, rule_name = rule_names[match.lastgroup]
+                fired.setdefault(category, []).append(rule_name)
+        return fired
+    
+    results = {
+        "rules/re_search": time_call(lambda: [search_each(text) for text in bank], repeat),
+        "rules/merged_alternation": time_call(lambda: [search_merged(text) for text in bank], repeat),
+        "rules/compiled": time_call(lambda: engine.match_all(bank), repeat)
+    }
+    for result in results.values():
+        result["questions"] = count
+    
+    return results
+
+def _essays(per_question: int, seed: int = 0) -> List[Tuple[str, str, str]]:
+    """A class of (question, reference, answer) essays, where many answers repeat"""
+    rng = random.Random(seed)
+    phrasings = [
+        "Plants use sunlight to turn water and carbon dioxide into glucose and oxygen.",
+        "Photosynthesis converts light energy into chemical energy stored in glucose.",
+        "Chlorophyll absorbs light and the plant makes sugar, releasing oxygen.",
+        "Plants eat soil to grow.",
+        "The sun gives plants energy to make food from CO2 and water."
+    ]
+    questions = [
+        ("Explain photosynthesis.", "Light energy is converted into chemical energy in glucose, releasing oxygen."),
+        ("Describe the water cycle.", "Evaporation, condensation, precipitation and collection repeat continuously."),
+        ("Discuss the causes of World War I.", "Militarism, alliances, imperialism and nationalism, triggered by an assassination.")
+    ]
+    return [
+        (question, reference, rng.choice(phrasings) + (" " if rng.random() < 0.5 else ""))
+        for _ in range(per_question) for question, reference in questions
+    ]
+
+def benchmark_essay_scoring(repeat: int, per_question: int = 10) -> Dict[str, Dict]:
+    """
+    Essays per second of the essay scoring service against the local LLM stub,
+    scoring one essay per request vs. batched, concurrent and cached
+    """
+    import asyncio
+    from modules.essay_scoring import EssayScoringService, HTTPLLMClient
+    from modules.llm_stub import start_stub_server
+    
+    essays = _essays(per_question)
+    server = start_stub_server(latency=0.05)
+    results = {}
+    
+    async def score_all(service):
+        await asyncio.gather(*(
+            service.score(question, {"criteria": "Accuracy"}, reference, answer, 5.0)
+            for question, reference, answer in essays
+        ))
+    
+    try:
+        for name, options in (
+            ("one_per_request", {"concurrency": 1, "batch_size": 1, "cache_size": 0}),
+            ("batched", {})
+        ):
+            # Every run gets a fresh service, so its cache starts empty
+            services = []
+            
+            def new_service():
+                services.append(EssayScoringService(HTTPLLMClient(server.url), **options))
+                return services[-1]
+            
+            result = time_call(lambda service: asyncio.run(score_all(service)), repeat, setup=new_service)
+            result["essays"] = len(essays)
+            result["essays_per_second"] = len(essays) / result["median"]
+            result["requests"] = services[-1].stats["requests"]
+            result["hit_rate"] = services[-1].hit_rate()
+            results[f"essay_scoring/{name}"] = result
+    finally:
+        server.shutdown()
+    
+    return results
+
+def benchmark_end_to_end(work_dir: str, pages: int, repeat: int) -> Dict[str, Dict]:
+    """
+    Time whole evaluations through the FastAPI app: upload, processing and
+    the finished result. Every run uploads freshly generated bytes, so the
+    content caches and duplicate-submission detection never short-cut it.
+    """
+    from fastapi.testclient import TestClient
+    import main as evaluation_api
+    
+    counter = iter(range(1_000_000))
+    
+    def prepare():
+        run = next(counter)
+        test_path = os.path.join(work_dir, f"e2e-{pages}p-{run}-test.pdf")
+        key_path = os.path.join(work_dir, f"e2e-{pages}p-{run}-key.pdf")
+        exam = generate_exam(test_path, pages, seed=pages, nonce=f"run-{run}")
+        generate_answer_key(key_path, exam, nonce=f"run-{run}")
+        return test_path, key_path
+    
+    with TestClient(evaluation_api.app) as client:
+        def evaluate(paths):
+            test_path, key_path = paths
+            with open(test_path, "rb") as test_file, open(key_path, "rb") as key_file:
+                response = client.post("/evaluate-test/", files={
+                    "test_file": ("test.pdf", test_file, "application/pdf"),
+                    "answer_key_file": ("answer_key.pdf", key_file, "application/pdf")
+                })
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+            
+            # The job runs on the app's job queue workers, so poll until it finishes
+            deadline = time.monotonic() + END_TO_END_TIMEOUT
+            while True:
+                status = client.get(f"/evaluation-status/{job_id}").json()
+                if status["status"] in ("completed", "failed", "cancelled"):
+                    break
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"End-to-end evaluation did not finish within {END_TO_END_TIMEOUT} seconds")
+                time.sleep(0.01)
+            
+            if status["status"] != "completed":
+                raise RuntimeError(f"End-to-end evaluation {status['status']}: {status.get('message')}")
+        
+        result = time_call(evaluate, repeat, setup=prepare)
+    
+    result["pages"] = pages
+    return {f"end_to_end/{pages}p": result}
+
+def run_benchmarks(pages: List[int], repeat: int, end_to_end: bool = True,
+                   workers: Optional[int] = None) -> Dict:
+    """Run the whole suite in a scratch directory and return the results document"""
+    project_dir = os.getcwd()
+    if project_dir not in sys.path:
+        sys.path.insert(0, project_dir)
+    
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="evaluation-benchmark-") as work_dir:
+        # Uploads, caches and the job store of the app all go to the scratch directory
+        os.chdir(work_dir)
+        os.environ["JOB_STORE_BACKEND"] = "memory"
+        if workers is not None:
+            os.environ["EVALUATION_WORKERS"] = str(workers)
+        
+        try:
+            results.update(benchmark_preprocessing(repeat))
+            results.update(benchmark_question_rules(repeat))
+            results.update(benchmark_essay_scoring(repeat))
+            for page_count in pages:
+                results.update(benchmark_stages(work_dir, page_count, repeat))
+            if end_to_end:
+                for page_count in pages:
+                    results.update(benchmark_end_to_end(work_dir, page_count, repeat))
+        finally:
+            os.chdir(project_dir)
+    
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {"pages": pages, "repeat": repeat, "end_to_end": end_to_end, "workers": workers},
+        "results": results
+    }
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    Compare the median times of two results documents
+    
+    Returns:
+        One row per benchmark with its status: "regression" (slower by more
+        than threshold), "improvement" (faster by more than threshold), "ok",
+        "new" (not in the baseline) or "missing" (not in the current run)
+    """
+    rows = []
+    current_results = current["results"]
+    baseline_results = baseline["results"]
+    
+    for name in sorted(set(current_results) | set(baseline_results)):
+        if name not in baseline_results:
+            rows.append({"name": name, "status": "new", "current": current_results[name]["median"]})
+            continue
+        if name not in current_results:
+            rows.append({"name": name, "status": "missing", "baseline": baseline_results[name]["median"]})
+            continue
+        
+        before = baseline_results[name]["median"]
+        after = current_results[name]["median"]
+        change = (after - before) / before if before > 0 else 0.0
+        
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        
+        rows.append({"name": name, "status": status, "baseline": before, "current": after, "change": change})
+    
+    return rows
+
+def format_comparison(rows: List[Dict]) -> str:
+    lines = [f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>9}  status"]
+    for row in rows:
+        baseline = f"{row['baseline'] * 1000:.2f} ms" if "baseline" in row else "-"
+        current = f"{row['current'] * 1000:.2f} ms" if "current" in row else "-"
+        change = f"{row['change']:+.1%}" if "change" in row else "-"
+        lines.append(f"{row['name']:<32} {baseline:>12} {current:>12} {change:>9}  {row['status']}")
+    return "\n".join(lines)
+
+def format_results(document: Dict) -> str:
+    lines = [f"{'benchmark':<32} {'median':>12} {'min':>12}  extra"]
+    for name, result in sorted(document["results"].items()):
+        extra = []
+        if "questions" in result:
+            extra.append(f"{result['questions']} questions")
+        if "tokens_per_second" in result:
+            extra.append(f"{result['tokens_per_second']:,.0f} tokens/s")
+        if "speedup" in result:
+            extra.append(f"{result['speedup']:.1f}x uncached")
+        if "essays_per_second" in result:
+            extra.append(f"{result['essays_per_second']:.1f} essays/s, {result['requests']} requests, "
+                         f"hit rate {result['hit_rate']:.0%}")
+        extra = ", ".join(extra)
+        lines.append(f"{name:<32} {result['median'] * 1000:9.2f} ms {result['min'] * 1000:9.2f} ms  {extra}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipeline on synthetic exams")
+    parser.add_argument("--pages", type=int, nargs="+", default=[4, 20], help="Exam lengths to benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--skip-end-to-end", action="store_true", help="Only time the individual stages")
+    parser.add_argument("--workers", type=int, help="EVALUATION_WORKERS for the end-to-end runs")
+    parser.add_argument("--output", help="Save the results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="Compare with a saved results file")
+    parser.add_argument("--results", help="Compare this saved results file instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown of the median that counts as a regression")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    if args.results:
+        with open(args.results, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    else:
+        document = run_benchmarks(args.pages, args.repeat, not args.skip_end_to_end, args.workers)
+        print(format_results(document))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        
+        rows = compare_results(document, baseline, args.threshold)
+        print()
+        print(format_comparison(rows))
+        
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%}")
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
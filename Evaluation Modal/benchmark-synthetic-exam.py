@@ -0,0 +1,251 @@
+# benchmarks/synthetic_exam.py
+"""
+Synthetic Exam Generator
+Generates test and answer-key PDFs with PyMuPDF for benchmarking the evaluation pipeline
+"""
+import random
+import textwrap
+from typing import Dict, List, Optional
+
+import fitz
+
+QUESTION_TYPES = (
+    "multiple_choice", "true_false", "essay", "matching",
+    "mathematical", "short_answer", "fill_in_blank"
+)
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter
+MARGIN = 54
+FONT_SIZE = 10
+LINE_HEIGHT = 14
+WRAP_WIDTH = 95
+
+TOPICS = [
+    ("photosynthesis", "Plants convert light energy, water and carbon dioxide into glucose and oxygen."),
+    ("the water cycle", "Water evaporates, condenses into clouds, falls as precipitation and collects again."),
+    ("plate tectonics", "The lithosphere is split into plates that move over the mantle, causing earthquakes."),
+    ("the French Revolution", "Fiscal crisis and Enlightenment ideas led to the overthrow of the monarchy in 1789."),
+    ("natural selection", "Individuals with heritable traits suited to their environment reproduce more."),
+    ("supply and demand", "Prices rise when demand exceeds supply and fall when supply exceeds demand.")
+]
+CAPITALS = [("France", "Paris"), ("Japan", "Tokyo"), ("Kenya", "Nairobi"), ("Peru", "Lima"), ("Canada", "Ottawa")]
+STATEMENTS = [
+    ("Water boils at 100 degrees Celsius at sea level.", "True"),
+    ("The Sun orbits the Earth.", "False"),
+    ("Sound travels faster than light.", "False"),
+    ("DNA is found in the nucleus of eukaryotic cells.", "True")
+]
+TERMS = [("Mitochondria", "Energy production"), ("Ribosome", "Protein synthesis"),
+         ("Nucleus", "Genetic material"), ("Chloroplast", "Photosynthesis")]
+ESSAY_PROMPTS = ["Discuss {topic} and its wider consequences.", "Explain in detail how {topic} works.",
+                 "Compare and contrast two explanations of {topic}."]
+
+def _make_question(number: int, question_type: str, rng: random.Random) -> Dict:
+    """Build the lines of one question and its correct answer"""
+    if question_type == "multiple_choice":
+        topic, fact = rng.choice(TOPICS)
+        correct = rng.randrange(4)
+        options = [fact if i == correct else f"An unrelated claim about {rng.choice(TOPICS)[0]}." for i in range(4)]
+        lines = [f"{number}. Which statement best describes {topic}?"]
+        lines += [f"   {'ABCD'[i]}) {option}" for i, option in enumerate(options)]
+        answer = "ABCD"[correct]
+    elif question_type == "true_false":
+        statement, answer = rng.choice(STATEMENTS)
+        lines = [f"{number}. True or False: {statement}", "   Answer: ________"]
+    elif question_type == "essay":
+        topic, answer = rng.choice(TOPICS)
+        lines = [f"{number}. {rng.choice(ESSAY_PROMPTS).format(topic=topic)}"] + ["   " + "_" * 80] * 4
+    elif question_type == "matching":
+        terms = rng.sample(TERMS, 3)
+        definitions = rng.sample(range(3), 3)
+        lines = [f"{number}. Match each term to its function."]
+        # Row i shows term i on the left and the definition of term definitions[i] on the right
+        lines += [
+            f"   {'ABC'[i]}. {term}    {i + 1}. {terms[definitions[i]][1]}"
+            for i, (term, _) in enumerate(terms)
+        ]
+        answer = ", ".join(f"{'ABC'[i]}-{definitions.index(i) + 1}" for i in range(3))
+    elif question_type == "mathematical":
+        distance, hours = rng.choice([(120, 2), (300, 4), (90, 1.5), (450, 5)])
+        lines = [f"{number}. Calculate the speed of a train that travels $d = {distance}$ km in "
+                 f"$t = {hours:g}$ h. Express in km/h", "   Answer: ________"]
+        answer = f"{distance / hours:g} km/h"
+    elif question_type == "short_answer":
+        country, answer = rng.choice(CAPITALS)
+        lines = [f"{number}. What is the capital of {country}?", "   Answer: ________"]
+    elif question_type == "fill_in_blank":
+        (first, _), (second, _) = rng.sample(CAPITALS, 2)
+        lines = [f"{number}. The capital of {first} is ________ and the capital of {second} is ________."]
+        answer = f"{dict(CAPITALS)[first]}, {dict(CAPITALS)[second]}"
+    else:
+        raise ValueError(f"Unknown question type: {question_type}")
+    
+    wrapped = []
+    for line in lines:
+        indent = " " * (len(line) - len(line.lstrip()))
+        wrapped += textwrap.wrap(line, WRAP_WIDTH, subsequent_indent=indent + "   ") or [""]
+    return {"id": f"question-{number}", "type": question_type, "answer": answer, "lines": wrapped}
+
+def _draw_ruled_table(page, top: float, rows: List[List[str]]) -> float:
+    """Draw a ruled grid with text in each cell, returning the y below it"""
+    columns = len(rows[0])
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    cell_height = LINE_HEIGHT + 6
+    bottom = top + cell_height * len(rows)
+    
+    for i in range(len(rows) + 1):
+        y = top + i * cell_height
+        page.draw_line(fitz.Point(MARGIN, y), fitz.Point(PAGE_WIDTH - MARGIN, y), width=0.8)
+    for j in range(columns + 1):
+        x = MARGIN + j * cell_width
+        page.draw_line(fitz.Point(x, top), fitz.Point(x, bottom), width=0.8)
+    
+    for i, row in enumerate(rows):
+        for j, text in enumerate(row):
+            page.insert_text(
+                (MARGIN + j * cell_width + 4, top + i * cell_height + LINE_HEIGHT),
+                text, fontsize=FONT_SIZE - 1, fontname="helv"
+            )
+    return bottom
+
+def _make_image(rng: random.Random, width: int = 160, height: int = 100) -> "fitz.Pixmap":
+    """A simple bar chart bitmap, different for every call"""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pixmap.clear_with(255)
+    step = width // 7
+    for i in range(6):
+        bar_height = rng.randint(height // 10, height - height // 10)
+        color = tuple(rng.randint(0, 200) for _ in range(3))
+        x = step // 2 + i * step
+        pixmap.set_rect(fitz.IRect(x, height - bar_height, x + step * 3 // 4, height), color)
+    return pixmap
+
+def generate_exam(path: str, pages: int = 4, mix: Optional[Dict[str, float]] = None,
+                  answer_tables: bool = True, images: bool = True,
+                  seed: int = 0, nonce: Optional[str] = None) -> Dict:
+    """
+    Generate a test PDF
+    
+    Args:
+        path: Where to write the PDF
+        pages: Number of pages to fill with questions
+        mix: Relative weight of each question type (default: all types equally)
+        answer_tables: Add a ruled answer grid to every page
+        images: Add a repeated header logo and a figure to every page
+        seed: Random seed; the same arguments always produce the same exam
+        nonce: Optional text stored in the metadata, so otherwise identical
+               exams get different bytes (and miss content-hash caches)
+    
+    Returns:
+        {"pages": n, "questions": [{"id", "type", "answer"}]}
+    """
+    rng = random.Random(seed)
+    mix = mix or {question_type: 1.0 for question_type in QUESTION_TYPES}
+    types, weights = zip(*[(t, w) for t, w in mix.items() if w > 0])
+    
+    doc = fitz.open()
+    questions = []
+    logo_xref = 0
+    
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN
+        
+        # The same logo image on every page, as on real exam templates
+        if images:
+            logo_rect = fitz.Rect(PAGE_WIDTH - MARGIN - 60, MARGIN - 30, PAGE_WIDTH - MARGIN, MARGIN)
+            if logo_xref:
+                page.insert_image(logo_rect, xref=logo_xref)
+            else:
+                logo_xref = page.insert_image(logo_rect, pixmap=_make_image(rng, 60, 30))
+        
+        page.insert_text((MARGIN, y), f"Synthetic Examination - Page {page_num + 1}", fontsize=14, fontname="helv")
+        y += 2 * LINE_HEIGHT
+        
+        page_questions = []
+        reserved = (5 * (LINE_HEIGHT + 6) if answer_tables else 0) + (110 if images else 0)
+        while True:
+            question = _make_question(len(questions) + 1, rng.choices(types, weights)[0], rng)
+            height = (len(question["lines"]) + 1) * LINE_HEIGHT
+            if y + height > PAGE_HEIGHT - MARGIN - reserved:
+                break
+            for line in question["lines"]:
+                page.insert_text((MARGIN, y), line, fontsize=FONT_SIZE, fontname="helv")
+                y += LINE_HEIGHT
+            y += LINE_HEIGHT
+            questions.append(question)
+            page_questions.append(question)
+        
+        if images:
+            page.insert_image(fitz.Rect(MARGIN, y, MARGIN + 160, y + 100), pixmap=_make_image(rng))
+            y += 110
+        
+        # Ruled grid where students write their multiple-choice letters
+        if answer_tables and page_questions:
+            rows = [["Question", "Answer"]] + [[q["id"], ""] for q in page_questions[:4]]
+            _draw_ruled_table(page, y, rows)
+    
+    doc.set_metadata({"title": "Synthetic Examination", "subject": nonce or ""})
+    doc.save(path, deflate=True)
+    doc.close()
+    
+    return {
+        "pages": pages,
+        "questions": [{"id": q["id"], "type": q["type"], "answer": q["answer"]} for q in questions]
+    }
+
+def generate_answer_key(path: str, exam: Dict, as_table: bool = False, nonce: Optional[str] = None):
+    """
+    Generate the answer-key PDF of an exam made by generate_exam
+    
+    Args:
+        path: Where to write the PDF
+        exam: The spec returned by generate_exam
+        as_table: Put the answers in ruled table cells instead of text lines
+        nonce: Optional text stored in the metadata, as for generate_exam
+    """
+    doc = fitz.open()
+    entries = [f"Q{q['id'].split('-')[1]}: {q['answer']}" for q in exam["questions"]]
+    
+    per_page = (PAGE_HEIGHT - 3 * MARGIN) // (LINE_HEIGHT + 6)
+    for start in range(0, max(1, len(entries)), per_page):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((MARGIN, MARGIN), "Answer Key", fontsize=14, fontname="helv")
+        chunk = entries[start:start + per_page]
+        
+        if as_table:
+            _draw_ruled_table(page, MARGIN + LINE_HEIGHT, [[entry[:WRAP_WIDTH]] for entry in chunk])
+        else:
+            y = MARGIN + 2 * LINE_HEIGHT
+            for entry in chunk:
+                page.insert_text((MARGIN, y), entry[:WRAP_WIDTH], fontsize=FONT_SIZE, fontname="helv")
+                y += LINE_HEIGHT + 6
+    
+    doc.set_metadata({"title": "Answer Key", "subject": nonce or ""})
+    doc.save(path, deflate=True)
+    doc.close()
+
+if __name__ == "__main__":
+    import os
+    import json
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate a synthetic exam and its answer key")
+    parser.add_argument("output_dir")
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tables", action="store_true", help="Leave out the ruled answer grids")
+    parser.add_argument("--no-images", action="store_true", help="Leave out logos and figures")
+    parser.add_argument("--key-as-table", action="store_true", help="Put the answer key in a table")
+    args = parser.parse_args()
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    exam = generate_exam(
+        os.path.join(args.output_dir, "test.pdf"), args.pages,
+        answer_tables=not args.no_tables, images=not args.no_images, seed=args.seed
+    )
+    generate_answer_key(os.path.join(args.output_dir, "answer_key.pdf"), exam, as_table=args.key_as_table)
+    with open(os.path.join(args.output_dir, "exam.json"), "w") as f:
+        json.dump(exam, f, indent=2)
+    
+    print(f"Wrote {len(exam['questions'])} questions on {exam['pages']} pages to {args.output_dir}")
@@ -0,0 +1,125 @@
+# modules/checkpoints.py
+"""
+Stage Checkpoints
+Per-job stage outputs on disk, so a job can resume or be re-graded without rerunning the stages before evaluation
+"""
+import os
+import json
+import time
+import zlib
+import shutil
+import logging
+import tempfile
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stages whose output is kept for every job:
+#   questions   - classified questions, everything extracted from the test PDF
+#   answer_key  - the AnswerKey the job was graded against
+#   evaluation  - evaluated questions, after essay scoring
+STAGES = ("questions", "answer_key", "evaluation")
+
+class CheckpointStore:
+    """
+    Stores stage outputs as compressed JSON files in a directory per job.
+    Job directories untouched for max_age_seconds are removed, checked at
+    most every eviction_interval seconds when a checkpoint is saved.
+    """
+    
+    def __init__(self, directory: str = "data/checkpoints", max_age_seconds: Optional[float] = None,
+                 eviction_interval: float = 3600.0):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.eviction_interval = eviction_interval
+        self._last_eviction = 0.0
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, job_id: str, stage: str) -> str:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown checkpoint stage: {stage}")
+        return os.path.join(self.directory, job_id, f"{stage}.json.z")
+    
+    def save(self, job_id: str, stage: str, data: Any):
+        """Store the output of a stage, replacing any earlier checkpoint of it"""
+        path = self._path(job_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(json.dumps(data, separators=(",", ":"), default=str).encode("utf-8"))
+        
+        # Write to a temp file and rename, so a crash never leaves a partial checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        
+        self._maybe_evict()
+    
+    def load(self, job_id: str, stage: str) -> Optional[Any]:
+        """Get the checkpointed output of a stage, or None if there is none"""
+        path = self._path(job_id, stage)
+        try:
+            with open(path, "rb") as f:
+                return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable checkpoint {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+    
+    def has(self, job_id: str, stage: str) -> bool:
+        return os.path.exists(self._path(job_id, stage))
+    
+    def delete(self, job_id: str):
+        shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+    
+    def _maybe_evict(self):
+        now = time.time()
+        if self.max_age_seconds is None or now - self._last_eviction < self.eviction_interval:
+            return
+        self._last_eviction = now
+        self.evict()
+    
+    def evict(self) -> int:
+        """Remove the checkpoints of jobs older than max_age_seconds"""
+        if self.max_age_seconds is None:
+            return 0
+        
+        cutoff = time.time() - self.max_age_seconds
+        removed = 0
+        for job_id in os.listdir(self.directory):
+            path = os.path.join(self.directory, job_id)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        
+        if removed:
+            logger.info(f"Removed the checkpoints of {removed} old jobs")
+        return removed
+
+def create_checkpoint_store() -> Optional[CheckpointStore]:
+    """
+    Create the checkpoint store configured by CHECKPOINT_DIR (empty disables it;
+    spool workers and the API must share it) and CHECKPOINT_TTL_SECONDS
+    (default: JOB_TTL_SECONDS)
+    """
+    directory = os.environ.get("CHECKPOINT_DIR", "data/checkpoints")
+    if not directory:
+        return None
+    
+    max_age = os.environ.get("CHECKPOINT_TTL_SECONDS") or os.environ.get("JOB_TTL_SECONDS") or 7 * 24 * 3600
+    return CheckpointStore(directory, max_age_seconds=float(max_age))
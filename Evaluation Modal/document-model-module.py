@@ -0,0 +1,187 @@
+# modules/document_model.py
+"""
+Document Model
+Compact slot-based form of processed PDF content, with the bounding boxes of each page in NumPy arrays
+"""
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Coordinates are kept as float64 so converting back to dicts gives the exact values PyMuPDF reported
+BBOX_DTYPE = np.float64
+
+def _bbox_array(bboxes, shape) -> np.ndarray:
+    """Bounding boxes as an array of the given shape (an empty list gives an empty array)"""
+    array = np.asarray(bboxes, dtype=BBOX_DTYPE)
+    return array.reshape(shape) if array.size else np.zeros(shape, dtype=BBOX_DTYPE)
+
+class TextBlocks:
+    """
+    The text blocks of one page as columns: their texts, an (n, 4) array of
+    [x0, y0, x1, y1] bounding boxes and an array of PyMuPDF block numbers,
+    instead of one dict (and one bbox list) per block
+    """
+    __slots__ = ("texts", "bboxes", "block_nos")
+    
+    def __init__(self, texts: List[str], bboxes, block_nos):
+        self.texts = texts
+        self.bboxes = _bbox_array(bboxes, (len(texts), 4))
+        self.block_nos = np.asarray(block_nos, dtype=np.int32)
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def block(self, i: int) -> Dict:
+        """Block i in the text block dict shape"""
+        return {
+            "text": self.texts[i],
+            "bbox": self.bboxes[i].tolist(),
+            "block_no": int(self.block_nos[i])
+        }
+    
+    @classmethod
+    def from_dicts(cls, text_blocks: List[Dict]) -> "TextBlocks":
+        return cls(
+            [block["text"] for block in text_blocks],
+            [block["bbox"][:4] for block in text_blocks],
+            [block.get("block_no", i) for i, block in enumerate(text_blocks)]
+        )
+    
+    def to_dicts(self) -> List[Dict]:
+        bboxes = self.bboxes.tolist()
+        block_nos = self.block_nos.tolist()
+        return [
+            {"text": text, "bbox": bbox, "block_no": block_no}
+            for text, bbox, block_no in zip(self.texts, bboxes, block_nos)
+        ]
+
+class Table:
+    """A detected table with its cell texts and a (rows, columns, 4) array of cell bounding boxes"""
+    __slots__ = ("bbox", "rows", "columns", "cell_texts", "cell_bboxes")
+    
+    def __init__(self, bbox, rows: int, columns: int, cell_texts: List[List[str]], cell_bboxes):
+        self.bbox = np.asarray(bbox, dtype=BBOX_DTYPE)
+        self.rows = rows
+        self.columns = columns
+        self.cell_texts = cell_texts
+        shape = (len(cell_texts), len(cell_texts[0]) if cell_texts else 0, 4)
+        self.cell_bboxes = _bbox_array(cell_bboxes, shape)
+    
+    @classmethod
+    def from_dict(cls, table: Dict) -> "Table":
+        cells = table.get("cells", [])
+        return cls(
+            table["bbox"],
+            table["rows"],
+            table["columns"],
+            [[cell["text"] for cell in row] for row in cells],
+            [[cell["bbox"] for cell in row] for row in cells]
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "bbox": self.bbox.tolist(),
+            "rows": self.rows,
+            "columns": self.columns,
+            "cells": [
+                [{"text": text, "bbox": bbox} for text, bbox in zip(texts, bboxes)]
+                for texts, bboxes in zip(self.cell_texts, self.cell_bboxes.tolist())
+            ]
+        }
+
+class Page:
+    """
+    One extracted page. Text blocks and tables are compact; forms and
+    figures are rare enough to stay in their dict shape.
+    """
+    __slots__ = ("page_num", "width", "height", "text_blocks", "tables", "forms", "figures", "extraction_time")
+    
+    def __init__(self, page_num: int, width: float, height: float, text_blocks: TextBlocks,
+                 tables: List[Table], forms: List[Dict], figures: List[Dict],
+                 extraction_time: Optional[float] = None):
+        self.page_num = page_num
+        self.width = width
+        self.height = height
+        self.text_blocks = text_blocks
+        self.tables = tables
+        self.forms = forms
+        self.figures = figures
+        self.extraction_time = extraction_time
+    
+    def stats(self) -> Dict:
+        """Extraction time, table and figure counts, as recorded for streamed pages"""
+        return {
+            "extraction_time": self.extraction_time,
+            "tables": len(self.tables),
+            "figures": len(self.figures)
+        }
+    
+    @classmethod
+    def from_dict(cls, page: Dict) -> "Page":
+        return cls(
+            page["page_num"],
+            page["width"],
+            page["height"],
+            TextBlocks.from_dicts(page.get("text_blocks", [])),
+            [Table.from_dict(table) for table in page.get("tables", [])],
+            page.get("forms", []),
+            page.get("figures", []),
+            page.get("extraction_time")
+        )
+    
+    def to_dict(self) -> Dict:
+        page = {
+            "page_num": self.page_num,
+            "width": self.width,
+            "height": self.height,
+            "text_blocks": self.text_blocks.to_dicts(),
+            "tables": [table.to_dict() for table in self.tables],
+            "forms": self.forms,
+            "figures": self.figures
+        }
+        if self.extraction_time is not None:
+            page["extraction_time"] = self.extraction_time
+        return page
+
+class Document:
+    """
+    Processed PDF content in compact form. It is what extracted documents are
+    passed between the pipeline processes as; to_pdf_content gives the
+    pdf_content dict shape the analysis stages, the content cache and the API use.
+    """
+    __slots__ = ("metadata", "page_count", "pages", "from_cache")
+    
+    def __init__(self, metadata: Optional[Dict], page_count: int, pages: List[Page], from_cache: bool = False):
+        self.metadata = metadata or {}
+        self.page_count = page_count
+        self.pages = pages
+        self.from_cache = from_cache
+    
+    def tables(self) -> Iterator[Table]:
+        """Tables of every page, in page order"""
+        for page in self.pages:
+            yield from page.tables
+    
+    def page_stats(self) -> List[Dict]:
+        return [page.stats() for page in self.pages]
+    
+    @classmethod
+    def from_pdf_content(cls, pdf_content: Dict) -> "Document":
+        return cls(
+            pdf_content.get("metadata"),
+            pdf_content.get("page_count", len(pdf_content.get("pages", []))),
+            [Page.from_dict(page) for page in pdf_content.get("pages", [])],
+            from_cache=bool(pdf_content.get("from_cache"))
+        )
+    
+    def to_pdf_content(self) -> Dict:
+        pages = [page.to_dict() for page in self.pages]
+        pdf_content = {
+            "metadata": self.metadata,
+            "page_count": self.page_count,
+            "pages": pages,
+            "tables": [table for page in pages for table in page["tables"]]
+        }
+        if self.from_cache:
+            pdf_content["from_cache"] = True
+        return pdf_content
@@ -1,5 +1,24 @@
 def _analyze_questions(self, document_structure: Dict, pdf_content: Dict):
         """Analyze identified questions to determine their types and details"""
+        # Spatial index of each page's text blocks, shared by all questions of this document
+        self._begin_region_lookups(pdf_content)
+        
+        try:
+            self._analyze_each_question(document_structure, pdf_content)
+        finally:
+            self._end_region_lookups()
+    
+    def _analyze_each_question(self, document_structure: Dict, pdf_content: Dict):
+        """Determine the type and details of every identified question"""
+        from modules.rule_engine import get_rule_engine
+        
+        # Run the question-type rules over the whole question list in one go;
+        # the fired rules stay on each question for the classifier and for debugging
+        get_rule_engine().annotate([
+            question for question in document_structure["questions"]
+            if "fired_rules" not in question
+        ])
+        
         for question in document_structure["questions"]:
             # Skip questions already classified
             if question["type"] != "unknown":
@@ -44,45 +63,25 @@ def _analyze_questions(self, document_structure: Dict, pdf_content: Dict):
         # Default to "other" if we can't classify
         return "other"
     
+    def _fired_rules(self, question: Dict) -> Dict:
+        """Get the question-type rules (from question_rules.json) that fired for a question"""
+        from modules.rule_engine import get_rule_engine
+        
+        return get_rule_engine().fired_rules(question)
+    
     def _is_true_false_question(self, question: Dict) -> bool:
         """Determine if a question is a true/false question"""
-        text = question["text"].lower()
-        
         # Check for true/false keywords
-        true_false_patterns = [
-            r'true or false',
-            r'mark (t|true) or (f|false)',
-            r'(t|true)/(f|false)'
-        ]
-        
-        for pattern in true_false_patterns:
-            if re.search(pattern, text):
-                return True
-        
-        return False
+        return "true_false" in self._fired_rules(question)
     
     def _is_essay_question(self, question: Dict) -> bool:
         """Determine if a question is an essay question"""
-        text = question["text"].lower()
-        
-        # Check for essay question indicators
-        essay_indicators = [
-            r'discuss',
-            r'explain in detail',
-            r'analyze',
-            r'compare and contrast',
-            r'evaluate',
-            r'describe',
-            r'elaborate on'
-        ]
-        
         # Check for essay keywords
-        for indicator in essay_indicators:
-            if re.search(indicator, text):
-                return True
+        if "essay" in self._fired_rules(question):
+            return True
         
         # Check if question is long (likely requires long answer)
-        if len(text.split()) > 15:
+        if len(question["text"].split()) > 15:
             return True
         
         return False
@@ -90,21 +89,46 @@ def _analyze_questions(self, document_structure: Dict, pdf_content: Dict):
     def _is_short_answer_question(self, question: Dict, pdf_content: Dict) -> bool:
         """Determine if a question is a short answer question"""
         # Check if there's a blank line or space after the question
-        page_num = question["page"]
-        bbox = question["bbox"]
-        
-        # Get the page content
-        page = pdf_content["pages"][page_num]
-        
-        # Look for blank lines or underscores after the question
-        for block in page["text_blocks"]:
-            if block["bbox"][1] > bbox[3]:  # Block is below the question
-                if "_" * 5 in block["text"] or "__" in block["text"]:
-                    return True
+        if self._find_answer_space(question, pdf_content) is not None:
+            return True
         
         # Default to short answer if it's not multiple choice or essay
         return True
     
+    def _begin_region_lookups(self, pdf_content: Dict):
+        """Set up the per-page text block indexes for a document"""
+        from modules.spatial_index import PageIndexes
+        
+        self._page_indexes = PageIndexes(pdf_content)
+        self._answer_spaces = {}
+    
+    def _end_region_lookups(self):
+        """Release the indexes so the engine doesn't hold on to the document"""
+        self._page_indexes = None
+        self._answer_spaces = {}
+    
+    def _find_answer_space(self, question: Dict, pdf_content: Dict):
+        """
+        Find the nearest block below a question that looks like an answer
+        space (blank lines, underscores). The lookup uses the page's spatial
+        index and is cached, since classification and processing both need it.
+        """
+        page_indexes = getattr(self, "_page_indexes", None)
+        if page_indexes is None or page_indexes.pdf_content is not pdf_content:
+            self._begin_region_lookups(pdf_content)
+            page_indexes = self._page_indexes
+        
+        key = (question["page"], tuple(question["bbox"]))
+        if key not in self._answer_spaces:
+            answer_space = None
+            for block in page_indexes[question["page"]].blocks_below(question["bbox"]):
+                if "__" in block["text"]:
+                    answer_space = block["bbox"]
+                    break
+            self._answer_spaces[key] = answer_space
+        
+        return self._answer_spaces[key]
+    
     def _process_true_false_question(self, question: Dict):
         """Process a true/false question to extract its structure"""
         # Add standard options
@@ -115,20 +139,8 @@ def _analyze_questions(self, document_structure: Dict, pdf_content: Dict):
     
     def _process_short_answer_question(self, question: Dict, pdf_content: Dict):
         """Process a short answer question to identify answer space"""
-        # Identify the answer area if possible
-        page_num = question["page"]
-        bbox = question["bbox"]
-        
-        # Get the page content
-        page = pdf_content["pages"][page_num]
-        
-        # Look for answer spaces (blank lines, underscores, boxes)
-        answer_space = None
-        for block in page["text_blocks"]:
-            if block["bbox"][1] > bbox[3]:  # Block is below the question
-                if "_" * 3 in block["text"] or "__" in block["text"]:
-                    answer_space = block["bbox"]
-                    break
+        # Identify the answer area if possible (blank lines, underscores, boxes)
+        answer_space = self._find_answer_space(question, pdf_content)
         
         if answer_space:
             question["answer_space"] = answer_space
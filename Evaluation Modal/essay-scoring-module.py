@@ -0,0 +1,332 @@
+# modules/essay_scoring.py
+"""
+Essay Scoring Service
+Concurrent, batched and cached essay scoring against an LLM scoring service
+"""
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import urllib.request
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def rubric_hash(rubric: Dict) -> str:
+    """Hash of everything the score depends on besides the answer"""
+    return hashlib.sha256(json.dumps(rubric, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def answer_hash(answer: str) -> str:
+    """Hash of an answer with case and whitespace differences removed"""
+    normalized = WHITESPACE_PATTERN.sub(" ", str(answer)).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class EssayScoringError(Exception):
+    """Raised when an essay could not be scored after all retries"""
+    pass
+
+class EssayScoreCache:
+    """LRU cache of scoring responses keyed by (rubric hash, normalized answer hash)"""
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+    
+    def put(self, key: Tuple[str, str], result: Dict):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class HTTPLLMClient:
+    """
+    Client for an essay scoring endpoint: POST {url}/score with
+    {"model": ..., "essays": [{"id", "question", "rubric", "reference", "answer", "max_score"}]}
+    answered by {"results": [{"id", "score", "feedback"}]}
+    """
+    
+    def __init__(self, url: str, model: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+    
+    async def score_batch(self, essays: List[Dict]) -> List[Dict]:
+        """Score a batch of essays, returning the results in request order"""
+        # urllib blocks, so the request runs in the event loop's thread pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._post, essays)
+    
+    def _post(self, essays: List[Dict]) -> List[Dict]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        request = urllib.request.Request(
+            f"{self.url}/score",
+            data=json.dumps({"model": self.model, "essays": essays}).encode("utf-8"),
+            headers=headers,
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        
+        results = {result["id"]: result for result in data["results"]}
+        return [results[essay["id"]] for essay in essays]
+
+class EssayScoringService:
+    """
+    Scores essays through an LLM client from the API process's event loop.
+    
+    Requests from every job running at the same time are queued and sent in
+    batches of up to batch_size (or whatever arrived within batch_window
+    seconds), so the essays of a class share requests. At most concurrency
+    batches are in flight, each with a timeout and retries with exponential
+    backoff. Responses are cached by (rubric hash, normalized answer hash),
+    and identical essays already in flight wait for the same response.
+    """
+    
+    def __init__(self, client, concurrency: int = 4, batch_size: int = 8, batch_window: float = 0.05,
+                 timeout: float = 30.0, retries: int = 2, backoff: float = 0.5, cache_size: int = 10000):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = EssayScoreCache(cache_size)
+        
+        self._semaphore = None
+        self._pending = []
+        self._in_flight = {}
+        self._flush_handle = None
+        self._tasks = set()
+        self._next_id = 0
+        self.stats = {
+            "essays": 0,
+            "cache_hits": 0,
+            "deduplicated": 0,
+            "requests": 0,
+            "retries": 0,
+            "failures": 0
+        }
+    
+    async def score(self, question: str, rubric, reference, answer: str, max_score: float) -> Dict:
+        """
+        Score one essay
+        
+        Returns:
+            {"score": float, "feedback": str}
+        
+        Raises:
+            EssayScoringError: If the service failed on every attempt
+        """
+        self.stats["essays"] += 1
+        
+        scoring_rubric = {"question": question, "rubric": rubric, "reference": reference, "max_score": max_score}
+        key = (rubric_hash(scoring_rubric), answer_hash(answer))
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(future)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._in_flight[key] = future
+        
+        self._next_id += 1
+        self._pending.append((key, dict(scoring_rubric, id=str(self._next_id), answer=answer), future))
+        
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        
+        return await asyncio.shield(future)
+    
+    def _flush(self):
+        """Send everything queued so far, in batches of batch_size"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.batch_size):
+            task = asyncio.ensure_future(self._send(pending[start:start + self.batch_size]))
+            # Keep a reference so the task isn't garbage collected mid-request
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _send(self, batch: List):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        
+        results = None
+        error = None
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                
+                self.stats["requests"] += 1
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.score_batch([essay for _, essay, _ in batch]),
+                        self.timeout
+                    )
+                    # A malformed response is retried like a failed request
+                    results = self._parse_results(response, len(batch))
+                    break
+                except Exception as e:
+                    error = e
+                    logger.warning(f"Essay scoring request failed (attempt {attempt + 1}): {str(e) or type(e).__name__}")
+        
+        if results is None:
+            self.stats["failures"] += len(batch)
+        
+        try:
+            for i, (key, _, future) in enumerate(batch):
+                self._in_flight.pop(key, None)
+                if future.done():
+                    continue
+                if results is None:
+                    future.set_exception(EssayScoringError(f"Essay scoring failed: {str(error) or type(error).__name__}"))
+                else:
+                    self.cache.put(key, results[i])
+                    future.set_result(results[i])
+        except Exception as e:
+            # Never leave a waiting job hanging on an unresolved future
+            logger.error(f"Resolving essay scores failed: {str(e)}", exc_info=True)
+            for key, _, future in batch:
+                self._in_flight.pop(key, None)
+                if not future.done():
+                    future.set_exception(EssayScoringError(f"Essay scoring failed: {str(e)}"))
+    
+    @staticmethod
+    def _parse_results(response: List[Dict], count: int) -> List[Dict]:
+        """
+        Validate a scoring response and convert it to {"score", "feedback"} results
+        
+        Raises:
+            ValueError: If the response doesn't hold a numeric score for every essay
+        """
+        if not isinstance(response, list) or len(response) != count:
+            raise ValueError(f"Expected {count} essay scoring results")
+        
+        results = []
+        for result in response:
+            try:
+                score = float(result["score"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Invalid essay score in scoring response: {result!r}")
+            if score != score:
+                raise ValueError("Essay score is NaN")
+            results.append({"score": score, "feedback": result.get("feedback") or ""})
+        return results
+    
+    async def score_questions(self, questions: List[Dict],
+                              on_progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """
+        Score the evaluated essay questions of a submission that have a
+        student answer, updating their evaluation in place.
+        on_progress(essays scored, essay count) is called as each essay finishes.
+        
+        The pipeline doesn't extract student answers yet (the answer evaluator
+        leaves student_answer as None), so until it does this scores nothing
+        for real submissions and their essays stay marked for manual review.
+        """
+        essays = [
+            question for question in questions
+            if question.get("type") == "essay"
+            and (question.get("evaluation", {}).get("student_answer") or question.get("student_answer"))
+        ]
+        if not essays:
+            return questions
+        scored = 0
+        
+        async def score_question(question):
+            nonlocal scored
+            try:
+                await score_essay(question)
+            finally:
+                scored += 1
+                if on_progress is not None:
+                    on_progress(scored, len(essays))
+        
+        async def score_essay(question):
+            evaluation = question["evaluation"]
+            try:
+                result = await self.score(
+                    question.get("text", ""),
+                    evaluation.get("rubric"),
+                    question.get("answer_key"),
+                    evaluation.get("student_answer") or question.get("student_answer"),
+                    evaluation.get("max_score", 5.0)
+                )
+            except EssayScoringError as e:
+                evaluation["message"] = f"{str(e)}; manual review required."
+                return
+            
+            evaluation.update({
+                "status": "partially_evaluated",
+                "score": min(result["score"], evaluation.get("max_score", 5.0)),
+                "feedback": result["feedback"],
+                "confidence": 0.6,
+                "message": "Essay evaluated with AI assistance, but human review recommended."
+            })
+        
+        await asyncio.gather(*(score_question(question) for question in essays))
+        return questions
+    
+    def hit_rate(self) -> float:
+        """Share of essays answered from the cache or an identical in-flight request"""
+        if not self.stats["essays"]:
+            return 0.0
+        return (self.stats["cache_hits"] + self.stats["deduplicated"]) / self.stats["essays"]
+
+def create_essay_scorer() -> Optional[EssayScoringService]:
+    """
+    Create the essay scorer configured by LLM_SERVICE_URL (unset disables it),
+    LLM_MODEL, LLM_API_KEY, LLM_CONCURRENCY, LLM_BATCH_SIZE, LLM_BATCH_WINDOW,
+    LLM_TIMEOUT_SECONDS, LLM_RETRIES and ESSAY_CACHE_SIZE
+    """
+    url = os.environ.get("LLM_SERVICE_URL")
+    if not url:
+        return None
+    
+    timeout = float(os.environ.get("LLM_TIMEOUT_SECONDS", 30))
+    client = HTTPLLMClient(url, os.environ.get("LLM_MODEL"), os.environ.get("LLM_API_KEY"), timeout)
+    return EssayScoringService(
+        client,
+        concurrency=int(os.environ.get("LLM_CONCURRENCY", 4)),
+        batch_size=int(os.environ.get("LLM_BATCH_SIZE", 8)),
+        batch_window=float(os.environ.get("LLM_BATCH_WINDOW", 0.05)),
+        timeout=timeout,
+        retries=int(os.environ.get("LLM_RETRIES", 2)),
+        cache_size=int(os.environ.get("ESSAY_CACHE_SIZE", 10000))
+    )
@@ -0,0 +1,226 @@
+# modules/job_queue.py
+"""
+Job Queue
+Bounded in-process queue running evaluation jobs on a fixed number of workers, with priority lanes and cancellation
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lanes in the order they are served; within a lane jobs run first come, first served
+PRIORITIES = {
+    "high": 0,    # Single submissions and re-grades someone is waiting for
+    "normal": 1,
+    "bulk": 2     # Class batches
+}
+
+# Assumed job duration until enough jobs have finished to estimate it
+DEFAULT_JOB_SECONDS = 30.0
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a queue at its maximum depth"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+class JobCancelledError(Exception):
+    """Raised at a stage boundary of a job that was cancelled while running"""
+    pass
+
+class JobQueue:
+    """
+    Runs job coroutines on a fixed number of worker tasks.
+    
+    At most max_depth jobs wait in the queue; submitting more raises
+    QueueFullError with an estimate of when to retry. Room can be reserved
+    ahead of submitting, for requests that queue their jobs only after
+    their uploads have been written out. Waiting jobs are taken
+    by priority lane, then in submission order. Cancelling a waiting job
+    drops it; a running job is cancelled cooperatively, by raising
+    JobCancelledError from check_cancelled at its next stage boundary.
+    """
+    
+    def __init__(self, workers: int = 4, max_depth: int = 100):
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        
+        self._queue = None
+        self._worker_tasks = []
+        self._sequence = itertools.count()
+        self._queued = {}
+        self._running = set()
+        self._cancelled = set()
+        self._reserved = 0
+        self._durations = deque(maxlen=50)
+    
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self._worker_tasks:
+            return
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._worker_tasks = [
+            asyncio.ensure_future(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Job queue started with {self.workers} workers and a depth of {self.max_depth}")
+    
+    async def shutdown(self):
+        """Stop the workers; waiting jobs are cancelled"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        
+        for future in self._queued.values():
+            future.cancel()
+        self._queued.clear()
+        
+        # An asyncio queue is bound to the loop that first waited on it; the
+        # next start() may be on another loop (e.g. a new TestClient)
+        self._queue = None
+    
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return len(self._queued)
+    
+    @property
+    def reserved(self) -> int:
+        """Room held by reserve() for jobs not submitted yet"""
+        return self._reserved
+    
+    def has_room(self, count: int = 1) -> bool:
+        return self.depth + self._reserved + count <= self.max_depth
+    
+    def retry_after(self, depth: Optional[int] = None) -> int:
+        """
+        Seconds until the queue has probably drained enough to take another job
+        
+        Args:
+            depth: Jobs waiting, if they wait somewhere else than this queue (a spool)
+        """
+        depth = self.depth if depth is None else depth
+        mean = sum(self._durations) / len(self._durations) if self._durations else DEFAULT_JOB_SECONDS
+        return max(1, math.ceil((depth + self._reserved - self.max_depth + 1) * mean / self.workers))
+    
+    def reserve(self, count: int, depth: Optional[int] = None):
+        """
+        Hold room for count jobs until release(), so requests admitted at the
+        same time can't together push the queue past max_depth. Jobs queued
+        under a reservation are submitted with force=True before it is released.
+        
+        Args:
+            count: Number of jobs
+            depth: Jobs waiting, if they wait somewhere else than this queue (a spool)
+        
+        Raises:
+            QueueFullError: If there isn't room for count more jobs
+        """
+        waiting = self.depth if depth is None else depth
+        if waiting + self._reserved + count > self.max_depth:
+            raise QueueFullError(self.retry_after(depth))
+        self._reserved += count
+    
+    def release(self, count: int):
+        """Give back room taken with reserve()"""
+        self._reserved = max(0, self._reserved - count)
+    
+    def submit(self, job_id: str, func: Callable, *args, priority: str = "normal",
+               force: bool = False, **kwargs) -> asyncio.Future:
+        """
+        Queue a job
+        
+        Args:
+            job_id: Id used to cancel the job
+            func: Coroutine function running the job
+            priority: Lane of the job, one of PRIORITIES
+            force: Queue the job even when the queue is full, for the
+                   parts of work that was admitted as a whole
+        
+        Returns:
+            Future resolved with the job's result; cancelled if the job
+            is cancelled before it starts
+        
+        Raises:
+            QueueFullError: If the queue is at its maximum depth
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if not force and not self.has_room():
+            raise QueueFullError(self.retry_after())
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queued[job_id] = future
+        self._cancelled.discard(job_id)
+        self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), job_id, func, args, kwargs, future))
+        return future
+    
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job
+        
+        Returns:
+            "queued" if the job was waiting and won't run, "running" if it
+            will stop at its next stage boundary, None if the queue doesn't know it
+        """
+        future = self._queued.pop(job_id, None)
+        if future is not None:
+            future.cancel()
+            return "queued"
+        if job_id in self._running:
+            self._cancelled.add(job_id)
+            return "running"
+        return None
+    
+    def is_cancelled(self, job_id: str) -> bool:
+        return job_id in self._cancelled
+    
+    def check_cancelled(self, job_id: str):
+        """Called by a running job between its stages"""
+        if job_id in self._cancelled:
+            raise JobCancelledError(f"Job {job_id} was cancelled")
+    
+    async def _worker(self, number: int):
+        while True:
+            _, _, job_id, func, args, kwargs, future = await self._queue.get()
+            try:
+                # Cancelled while waiting
+                if future.done() or self._queued.get(job_id) is not future:
+                    continue
+                del self._queued[job_id]
+                
+                self._running.add(job_id)
+                start = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except JobCancelledError as e:
+                    logger.info(f"Job {job_id} was cancelled while running")
+                    future.set_exception(e)
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed in queue worker {number}: {str(e)}")
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                self._durations.append(time.perf_counter() - start)
+            finally:
+                self._running.discard(job_id)
+                self._cancelled.discard(job_id)
+                self._queue.task_done()
+
+def create_job_queue(workers: Optional[int] = None) -> JobQueue:
+    """
+    Create the job queue configured by JOB_QUEUE_WORKERS (default: the given
+    number of workers, else 4) and JOB_QUEUE_MAX_DEPTH
+    """
+    workers = int(os.environ.get("JOB_QUEUE_WORKERS", 0)) or workers or 4
+    return JobQueue(workers=workers, max_depth=int(os.environ.get("JOB_QUEUE_MAX_DEPTH", 100)))
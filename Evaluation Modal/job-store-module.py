@@ -0,0 +1,360 @@
+# modules/job_store.py
+"""
+Job Store
+Persistent storage for evaluation job state, with TTL and size-based eviction
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Jobs in these states are finished and can be evicted
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+class JobStore:
+    """Base interface for job stores"""
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, max_jobs: Optional[int] = None,
+                 eviction_interval: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.eviction_interval = eviction_interval
+        self._last_eviction = 0.0
+        self._listeners = []
+    
+    def create(self, job_id: str, status: str, message: Optional[str] = None, **fields):
+        """Create a new job record"""
+        raise NotImplementedError
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job record, or None if it doesn't exist"""
+        raise NotImplementedError
+    
+    def update(self, job_id: str, **fields):
+        """Update fields (status, message, result, ...) of an existing job"""
+        raise NotImplementedError
+    
+    def delete(self, job_id: str):
+        """Delete a job record"""
+        raise NotImplementedError
+    
+    def evict(self) -> int:
+        """Remove expired and excess finished jobs, returning how many were removed"""
+        raise NotImplementedError
+    
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        """Get the id of the newest job that wasn't failed or cancelled for a submission hash"""
+        raise NotImplementedError
+    
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+    
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """Call listener(job_id, changed fields) after every create and update"""
+        self._listeners.append(listener)
+    
+    def _notify(self, job_id: str, fields: Dict):
+        for listener in self._listeners:
+            try:
+                listener(job_id, fields)
+            except Exception as e:
+                logger.warning(f"Job store listener failed for job {job_id}: {str(e)}")
+    
+    def _maybe_evict(self):
+        """Run eviction if the eviction interval has passed"""
+        now = time.time()
+        if now - self._last_eviction < self.eviction_interval:
+            return
+        
+        self._last_eviction = now
+        removed = self.evict()
+        if removed:
+            logger.info(f"Evicted {removed} finished jobs from the job store")
+
+class MemoryJobStore(JobStore):
+    """In-process job store, only suitable for a single worker"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs = OrderedDict()
+        self._by_content_hash = {}
+        self._lock = threading.Lock()
+    
+    def create(self, job_id: str, status: str, message: Optional[str] = None, **fields):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "status": status,
+                "message": message,
+                "result": None,
+                "created_at": now,
+                "updated_at": now,
+                **fields
+            }
+            if fields.get("content_hash"):
+                self._by_content_hash[fields["content_hash"]] = job_id
+        self._notify(job_id, dict(fields, status=status, message=message))
+        self._maybe_evict()
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+    
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id not in self._jobs:
+                raise KeyError(job_id)
+            self._jobs[job_id].update(fields, updated_at=time.time())
+        self._notify(job_id, fields)
+    
+    def delete(self, job_id: str):
+        with self._lock:
+            self._remove(job_id)
+    
+    def _remove(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        if job and self._by_content_hash.get(job.get("content_hash")) == job_id:
+            del self._by_content_hash[job["content_hash"]]
+    
+    def evict(self) -> int:
+        with self._lock:
+            finished = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES
+            ]
+            expired = set()
+            
+            # Drop finished jobs past their TTL
+            if self.ttl_seconds is not None:
+                cutoff = time.time() - self.ttl_seconds
+                expired.update(job_id for job_id in finished if self._jobs[job_id]["created_at"] < cutoff)
+            
+            # Drop the oldest finished jobs beyond the size limit (insertion order is creation order)
+            if self.max_jobs is not None:
+                excess = len(self._jobs) - len(expired) - self.max_jobs
+                for job_id in finished:
+                    if excess <= 0:
+                        break
+                    if job_id not in expired:
+                        expired.add(job_id)
+                        excess -= 1
+            
+            for job_id in expired:
+                self._remove(job_id)
+            
+            return len(expired)
+    
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            job_id = self._by_content_hash.get(content_hash)
+            if job_id is None or self._jobs[job_id]["status"] in ("failed", "cancelled"):
+                return None
+            # The job may have been re-graded under another hash since
+            if self._jobs[job_id].get("content_hash") != content_hash:
+                return None
+            return job_id
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite-backed job store.
+    The database file can be shared by several uvicorn workers on the same host.
+    Results are stored as zlib-compressed JSON.
+    """
+    
+    def __init__(self, path: str = "jobs.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+    
+    def _init_schema(self):
+        """Create the jobs table and its indexes"""
+        with self._lock, self._conn:
+            # WAL lets readers in other workers proceed while a job is being written
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    content_hash TEXT,
+                    extra BLOB,
+                    result BLOB
+                )
+            """)
+            
+            # Databases created before content hashing was added lack the column
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if "content_hash" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+            
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON jobs (content_hash)")
+    
+    @staticmethod
+    def _serialize(value: Any) -> Optional[bytes]:
+        """Serialize a value to compact, compressed JSON"""
+        if value is None:
+            return None
+        if hasattr(value, "dict"):
+            value = value.dict()
+        data = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        return zlib.compress(data)
+    
+    @staticmethod
+    def _deserialize(data: Optional[bytes]) -> Any:
+        """Inverse of _serialize"""
+        if data is None:
+            return None
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+    
+    def create(self, job_id: str, status: str, message: Optional[str] = None, **fields):
+        now = time.time()
+        result = fields.pop("result", None)
+        content_hash = fields.pop("content_hash", None)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(job_id, status, message, created_at, updated_at, content_hash, extra, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, message, now, now, content_hash,
+                 self._serialize(fields) if fields else None, self._serialize(result))
+            )
+        self._notify(job_id, dict(fields, status=status, message=message, content_hash=content_hash))
+        self._maybe_evict()
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, message, created_at, updated_at, content_hash, extra, result "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        
+        job = self._deserialize(row["extra"]) or {}
+        job.update({
+            "status": row["status"],
+            "message": row["message"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "content_hash": row["content_hash"],
+            "result": self._deserialize(row["result"])
+        })
+        return job
+    
+    def update(self, job_id: str, **fields):
+        changes = dict(fields)
+        columns = {"updated_at": time.time()}
+        if "status" in fields:
+            columns["status"] = fields.pop("status")
+        if "message" in fields:
+            columns["message"] = fields.pop("message")
+        if "content_hash" in fields:
+            columns["content_hash"] = fields.pop("content_hash")
+        if "result" in fields:
+            columns["result"] = self._serialize(fields.pop("result"))
+        
+        with self._lock, self._conn:
+            # Any other fields are merged into the extra column
+            if fields:
+                row = self._conn.execute("SELECT extra FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is None:
+                    raise KeyError(job_id)
+                extra = self._deserialize(row["extra"]) or {}
+                extra.update(fields)
+                columns["extra"] = self._serialize(extra)
+            
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                (*columns.values(), job_id)
+            )
+            if cursor.rowcount == 0:
+                raise KeyError(job_id)
+        self._notify(job_id, changes)
+    
+    def delete(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+    
+    def evict(self) -> int:
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        removed = 0
+        
+        with self._lock, self._conn:
+            # Drop finished jobs past their TTL
+            if self.ttl_seconds is not None:
+                cursor = self._conn.execute(
+                    f"DELETE FROM jobs WHERE status IN ({placeholders}) AND created_at < ?",
+                    (*FINISHED_STATUSES, time.time() - self.ttl_seconds)
+                )
+                removed += cursor.rowcount
+            
+            # Drop the oldest finished jobs beyond the size limit
+            if self.max_jobs is not None:
+                total = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                excess = total - self.max_jobs
+                if excess > 0:
+                    cursor = self._conn.execute(
+                        f"DELETE FROM jobs WHERE job_id IN ("
+                        f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) "
+                        f"ORDER BY created_at LIMIT ?)",
+                        (*FINISHED_STATUSES, excess)
+                    )
+                    removed += cursor.rowcount
+        
+        return removed
+    
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE content_hash = ? AND status NOT IN ('failed', 'cancelled') "
+                "ORDER BY created_at DESC LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+        return row["job_id"] if row else None
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+def create_job_store(backend: Optional[str] = None, **kwargs) -> JobStore:
+    """
+    Create the configured job store.
+    The backend defaults to JOB_STORE_BACKEND ("sqlite" or "memory"); the SQLite
+    path, TTL and size limit default to JOB_STORE_PATH, JOB_TTL_SECONDS and JOB_MAX_ENTRIES.
+    """
+    backend = backend or os.environ.get("JOB_STORE_BACKEND", "sqlite")
+    kwargs.setdefault("ttl_seconds", float(os.environ.get("JOB_TTL_SECONDS", 7 * 24 * 3600)))
+    kwargs.setdefault("max_jobs", int(os.environ.get("JOB_MAX_ENTRIES", 50000)))
+    
+    if backend == "memory":
+        return MemoryJobStore(**kwargs)
+    if backend == "sqlite":
+        kwargs.setdefault("path", os.environ.get("JOB_STORE_PATH", "data/jobs.db"))
+        return SQLiteJobStore(**kwargs)
+    
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,127 @@
+# modules/llm_stub.py
+"""
+Stub LLM Scoring Server
+Deterministic local stand-in for the essay scoring service, for tests and offline measurements
+"""
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+def score_essay(essay: Dict) -> Dict:
+    """
+    Score an essay by the share of the reference answer's words it uses.
+    The same essay always gets the same score.
+    """
+    reference = set(WORD_PATTERN.findall(str(essay.get("reference") or "").lower()))
+    answer = set(WORD_PATTERN.findall(str(essay.get("answer") or "").lower()))
+    max_score = float(essay.get("max_score") or 5.0)
+    
+    coverage = len(reference & answer) / len(reference) if reference else 0.0
+    score = round(max_score * coverage, 2)
+    return {
+        "id": essay["id"],
+        "score": score,
+        "feedback": f"Covers {coverage:.0%} of the expected key points."
+    }
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """POST /score scores a batch of essays; GET /stats reports the request counts"""
+    
+    def do_POST(self):
+        server = self.server
+        if self.path != "/score":
+            self.send_error(404)
+            return
+        
+        with server.lock:
+            server.stats["requests"] += 1
+            request_number = server.stats["requests"]
+        
+        # Fail every fail_every-th request, to exercise client retries
+        if server.fail_every and request_number % server.fail_every == 0:
+            self.send_error(503, "Simulated failure")
+            return
+        
+        length = int(self.headers.get("Content-Length", 0))
+        essays = json.loads(self.rfile.read(length).decode("utf-8")).get("essays", [])
+        
+        # Simulated model latency: a fixed cost per request plus a cost per essay
+        time.sleep(server.latency + server.latency_per_essay * len(essays))
+        
+        with server.lock:
+            server.stats["essays"] += len(essays)
+        
+        self._send_json({"results": [score_essay(essay) for essay in essays]})
+    
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self._send_json(dict(self.server.stats))
+    
+    def _send_json(self, data: Dict):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                      latency_per_essay: float = 0.0, fail_every: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread
+    
+    Args:
+        host: Interface to listen on
+        port: Port to listen on, 0 for any free port
+        latency: Seconds added to every request
+        latency_per_essay: Seconds added per essay in a request
+        fail_every: Answer every n-th request with a 503 (0 never fails)
+    
+    Returns:
+        The running server; its url attribute is the base URL to give the client
+    """
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.latency_per_essay = latency_per_essay
+    server.fail_every = fail_every
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "essays": 0}
+    server.url = f"http://{host}:{server.server_address[1]}"
+    
+    thread = threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True)
+    thread.start()
+    
+    logger.info(f"Stub LLM scoring server listening on {server.url}")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stub LLM essay scoring server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--latency-per-essay", type=float, default=0.0, help="Seconds added per essay")
+    parser.add_argument("--fail-every", type=int, default=0, help="Fail every n-th request with a 503")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    server = start_stub_server(args.host, args.port, args.latency, args.latency_per_essay, args.fail_every)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,223 @@
+# modules/metrics.py
+"""
+Pipeline Metrics
+Latency histograms and counters for the evaluation pipeline, rendered in the Prometheus text format
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Upper bounds in seconds, from single pages up to whole long documents
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Metric:
+    """Base class for a metric family with a fixed set of label names"""
+    
+    type_name = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            for key in sorted(self._values):
+                lines.extend(self._render_value(list(zip(self.labelnames, key)), self._values[key]))
+        return lines
+    
+    def _render_value(self, labels: List[Tuple[str, str]], value) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """Monotonically increasing count, named with the _total suffix its samples carry"""
+    
+    type_name = "counter"
+    
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def _render_value(self, labels, value) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+class Histogram(Metric):
+    """Distribution of observed values over cumulative buckets"""
+    
+    type_name = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != math.inf:
+            self.buckets += (math.inf,)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+    
+    def _render_value(self, labels, state) -> List[str]:
+        bucket_counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            bucket_labels = labels + [("le", _format_value(bound))]
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """The metrics exposed on /metrics"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "evaluation_stage_seconds", "Time spent in each stage of a test evaluation", ["stage"]
+)
+PAGE_SECONDS = REGISTRY.histogram(
+    "evaluation_page_extraction_seconds", "Time spent extracting a single PDF page",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+JOBS = REGISTRY.counter("evaluation_jobs_total", "Test evaluations finished, by outcome", ["status"])
+PAGES = REGISTRY.counter("evaluation_pages_total", "Test pages processed")
+QUESTIONS = REGISTRY.counter("evaluation_questions_total", "Questions evaluated, by question type", ["type"])
+TABLES = REGISTRY.counter("evaluation_tables_total", "Tables found in test pages")
+IMAGES = REGISTRY.counter("evaluation_images_total", "Images found in test pages")
+
+class JobMetrics:
+    """
+    Timings and counts of one test evaluation. Every measurement is also
+    recorded in the process-wide metrics, and breakdown() gives the
+    per-job view stored with the result.
+    """
+    
+    def __init__(self):
+        self.stage_seconds = {}
+        self.page_seconds = []
+        self.counts = {"pages": 0, "tables": 0, "images": 0, "questions": {}}
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as a pipeline stage; repeated stages add up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, stage=name)
+    
+    def record_pages(self, pages: List[Dict], extracted: bool = True):
+        """
+        Count the pages, tables and images of a document
+        
+        Args:
+            pages: Page dicts of pdf_content, or per-page stats (of a streamed
+                   document, or Document.page_stats())
+            extracted: Whether the pages were extracted now; cached pages are
+                       counted but their stored extraction times are not observed
+        """
+        tables = images = 0
+        for page in pages:
+            page_tables = page.get("tables", [])
+            page_figures = page.get("figures", [])
+            tables += page_tables if isinstance(page_tables, int) else len(page_tables)
+            images += page_figures if isinstance(page_figures, int) else len(page_figures)
+            
+            extraction_time = page.get("extraction_time")
+            if extracted and extraction_time is not None:
+                self.page_seconds.append(extraction_time)
+                PAGE_SECONDS.observe(extraction_time)
+        
+        self.counts["pages"] += len(pages)
+        self.counts["tables"] += tables
+        self.counts["images"] += images
+        PAGES.inc(len(pages))
+        TABLES.inc(tables)
+        IMAGES.inc(images)
+    
+    def record_questions(self, questions: List[Dict]):
+        """Count the evaluated questions by type"""
+        for question in questions:
+            question_type = question.get("type", "unknown")
+            self.counts["questions"][question_type] = self.counts["questions"].get(question_type, 0) + 1
+            QUESTIONS.inc(type=question_type)
+    
+    def breakdown(self) -> Dict:
+        """Per-job timings and counts, for the job result"""
+        breakdown = {
+            "stages": {name: round(seconds, 4) for name, seconds in self.stage_seconds.items()},
+            "counts": self.counts
+        }
+        if self.page_seconds:
+            ordered = sorted(self.page_seconds)
+            breakdown["pages"] = {
+                "count": len(ordered),
+                "mean": round(sum(ordered) / len(ordered), 4),
+                "p50": round(ordered[len(ordered) // 2], 4),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+                "max": round(ordered[-1], 4)
+            }
+        return breakdown
@@ -0,0 +1,409 @@
+# modules/numeric_grading.py
+"""
+Numeric Grading
+Parses numbers with units and grades a whole class's answers to a mathematical question in one pass
+"""
+import re
+import math
+import functools
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Base dimensions; a unit's dimension is its exponent of each
+BASE_DIMENSIONS = ("length", "mass", "time", "current", "temperature", "amount", "angle")
+
+def _dimension(**exponents) -> Tuple[int, ...]:
+    return tuple(exponents.get(name, 0) for name in BASE_DIMENSIONS)
+
+class Unit:
+    """A unit as its conversion to SI: si = value * scale + offset"""
+    __slots__ = ("scale", "dimension", "offset")
+    
+    def __init__(self, scale: float, dimension: Tuple[int, ...], offset: float = 0.0):
+        self.scale = scale
+        self.dimension = dimension
+        self.offset = offset
+    
+    def scaled(self, factor: float) -> "Unit":
+        return Unit(self.scale * factor, self.dimension)
+
+LENGTH = _dimension(length=1)
+MASS = _dimension(mass=1)
+TIME = _dimension(time=1)
+TEMPERATURE = _dimension(temperature=1)
+ANGLE = _dimension(angle=1)
+VOLUME = _dimension(length=3)
+SPEED = _dimension(length=1, time=-1)
+ENERGY = _dimension(mass=1, length=2, time=-2)
+PRESSURE = _dimension(mass=1, length=-1, time=-2)
+DIMENSIONLESS = _dimension()
+
+# Units that take SI prefixes, by symbol
+PREFIXABLE_UNITS = {
+    "m": Unit(1.0, LENGTH),
+    "g": Unit(1e-3, MASS),
+    "s": Unit(1.0, TIME),
+    "A": Unit(1.0, _dimension(current=1)),
+    "K": Unit(1.0, TEMPERATURE),
+    "mol": Unit(1.0, _dimension(amount=1)),
+    "rad": Unit(1.0, ANGLE),
+    "L": Unit(1e-3, VOLUME),
+    "l": Unit(1e-3, VOLUME),
+    "N": Unit(1.0, _dimension(mass=1, length=1, time=-2)),
+    "J": Unit(1.0, ENERGY),
+    "W": Unit(1.0, _dimension(mass=1, length=2, time=-3)),
+    "Pa": Unit(1.0, PRESSURE),
+    "Hz": Unit(1.0, _dimension(time=-1)),
+    "C": Unit(1.0, _dimension(time=1, current=1)),
+    "V": Unit(1.0, _dimension(mass=1, length=2, time=-3, current=-1)),
+    "Ω": Unit(1.0, _dimension(mass=1, length=2, time=-3, current=-2)),
+    "eV": Unit(1.602176634e-19, ENERGY)
+}
+
+PREFIXES = {
+    "G": 1e9, "M": 1e6, "k": 1e3, "h": 1e2, "d": 1e-1, "c": 1e-2,
+    "m": 1e-3, "µ": 1e-6, "u": 1e-6, "n": 1e-9, "p": 1e-12
+}
+
+OTHER_UNITS = {
+    "min": Unit(60.0, TIME),
+    "h": Unit(3600.0, TIME),
+    "hr": Unit(3600.0, TIME),
+    "day": Unit(86400.0, TIME),
+    "deg": Unit(math.pi / 180, ANGLE),
+    "°": Unit(math.pi / 180, ANGLE),
+    "°C": Unit(1.0, TEMPERATURE, 273.15),
+    "degC": Unit(1.0, TEMPERATURE, 273.15),
+    "°F": Unit(5 / 9, TEMPERATURE, 273.15 - 32 * 5 / 9),
+    "degF": Unit(5 / 9, TEMPERATURE, 273.15 - 32 * 5 / 9),
+    "%": Unit(0.01, DIMENSIONLESS),
+    "in": Unit(0.0254, LENGTH),
+    "ft": Unit(0.3048, LENGTH),
+    "yd": Unit(0.9144, LENGTH),
+    "mi": Unit(1609.344, LENGTH),
+    "mph": Unit(0.44704, SPEED),
+    "lb": Unit(0.45359237, MASS),
+    "atm": Unit(101325.0, PRESSURE),
+    "bar": Unit(1e5, PRESSURE),
+    "cal": Unit(4.184, ENERGY),
+    "kcal": Unit(4184.0, ENERGY)
+}
+
+# Spelled-out names ("kilometers", "Newtons"), matched case-insensitively, singular or plural
+UNIT_NAMES = {
+    "meter": "m", "metre": "m", "gram": "g", "second": "s", "ampere": "A", "amp": "A",
+    "kelvin": "K", "mole": "mol", "radian": "rad", "liter": "L", "litre": "L",
+    "newton": "N", "joule": "J", "watt": "W", "pascal": "Pa", "hertz": "Hz",
+    "coulomb": "C", "volt": "V", "ohm": "Ω", "minute": "min", "hour": "h", "day": "day",
+    "degree": "deg", "inch": "in", "foot": "ft", "feet": "ft", "yard": "yd", "mile": "mi",
+    "pound": "lb", "calorie": "cal", "celsius": "°C", "fahrenheit": "°F", "percent": "%"
+}
+PREFIX_NAMES = {
+    "giga": "G", "mega": "M", "kilo": "k", "hecto": "h", "deci": "d", "centi": "c",
+    "milli": "m", "micro": "µ", "nano": "n", "pico": "p"
+}
+
+def _build_unit_table() -> Dict[str, Unit]:
+    """Every unit spelling, prefixed symbols and names included, mapped to its conversion"""
+    table = dict(OTHER_UNITS)
+    for symbol, unit in PREFIXABLE_UNITS.items():
+        table[symbol] = unit
+        for prefix, factor in PREFIXES.items():
+            table.setdefault(prefix + symbol, unit.scaled(factor))
+    
+    for name, symbol in UNIT_NAMES.items():
+        forms = {name: table[symbol]}
+        if symbol in PREFIXABLE_UNITS:
+            for prefix_name, prefix in PREFIX_NAMES.items():
+                forms[prefix_name + name] = table[prefix + symbol]
+        for form, unit in forms.items():
+            table.setdefault(form, unit)
+            table.setdefault(form + ("es" if form.endswith("ch") else "s"), unit)
+    return table
+
+UNITS = _build_unit_table()
+
+SUPERSCRIPTS = {"¹": "1", "²": "2", "³": "3"}
+UNIT_FACTOR_PATTERN = re.compile(r'^([^\d^\-]+?)\^?(-?\d+)?$')
+
+# Units outside the table are still accepted, and then only match when spelled the same
+UNIT_TEXT_PATTERN = re.compile(r'^[A-Za-z°%µΩ][\w°%µΩ/^·*\-]*$')
+
+DECIMAL = r'(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?|\.\d+'
+QUANTITY_PATTERN = re.compile(
+    r'^(?P<sign>[-+]?)\s*(?:'
+    r'(?P<whole>\d+)\s+(?P<numerator>\d+)\s*/\s*(?P<denominator>\d+)'          # 1 1/2
+    r'|(?P<fraction_numerator>\d+)\s*/\s*(?P<fraction_denominator>\d+)'      # 3/4
+    r'|(?P<mantissa>' + DECIMAL + r')'                                        # 1,250.5
+    r'(?:\s*(?:[eE](?P<exponent>[-+]?\d+)|[x×*·]\s*10\s*\^\s*\(?(?P<power>[-+]?\d+)\)?))?'  # 6.02e23, 6.02 x 10^23
+    r')\s*(?P<unit>.*?)\s*$'
+)
+
+# "9.8 ± 0.1 m/s^2", "120 N +/- 5%": a tolerance written into the answer key
+TOLERANCE_PATTERN = re.compile(r'\s*(?:±|\+/-|\+-)\s*(' + DECIMAL + r')\s*(%)?')
+
+# Significant figures of exact values (fractions), which any rounding satisfies
+EXACT_SIGNIFICANT_FIGURES = (1, 64)
+
+class Quantity:
+    """A parsed numeric answer: its value, its unit as written and the significant figures it was given with"""
+    __slots__ = ("value", "unit", "significant_figures")
+    
+    def __init__(self, value: float, unit: Optional[str] = None,
+                 significant_figures: Tuple[int, int] = EXACT_SIGNIFICANT_FIGURES):
+        self.value = value
+        self.unit = unit
+        # (fewest, most): trailing zeros of an integer ("1200") may or may not be significant
+        self.significant_figures = significant_figures
+
+def _normalize_unit_text(text: str) -> str:
+    text = text.strip().replace("μ", "µ").replace("·", "*").replace("⋅", "*")
+    text = re.sub(r'(⁻?)([¹²³])', lambda m: "^" + ("-" if m.group(1) else "") + SUPERSCRIPTS[m.group(2)], text)
+    text = re.sub(r'\s+per\s+', '/', text)
+    text = text.replace("(", "").replace(")", "")
+    return re.sub(r'\s*([/^*])\s*', r'\1', text)
+
+def _lookup_unit(symbol: str) -> Optional[Unit]:
+    unit = UNITS.get(symbol)
+    if unit is None and len(symbol) > 3:
+        # Names may be capitalized; short symbols are case-sensitive (ms vs Ms)
+        unit = UNITS.get(symbol.lower())
+    return unit
+
+@functools.lru_cache(maxsize=1024)
+def parse_unit(text: str) -> Optional[Unit]:
+    """
+    Resolve a unit: a symbol or name from the conversion table, or a compound
+    of them such as "m/s^2", "kg*m/s²" or "kilometers per hour". Everything
+    after the first "/" is in the denominator. Returns None for unknown units.
+    """
+    text = _normalize_unit_text(text)
+    if not text:
+        return None
+    
+    unit = _lookup_unit(text)
+    if unit is not None:
+        return unit
+    
+    scale = 1.0
+    dimension = [0] * len(BASE_DIMENSIONS)
+    for i, part in enumerate(text.split("/")):
+        sign = 1 if i == 0 else -1
+        for factor in re.split(r'[*\s]+', part):
+            match = UNIT_FACTOR_PATTERN.match(factor)
+            unit = _lookup_unit(match.group(1)) if match else None
+            if unit is None:
+                return None
+            
+            # Offsets don't apply inside compounds: °C/min is a rate of temperature difference
+            power = sign * int(match.group(2) or 1)
+            scale *= unit.scale ** power
+            dimension = [total + exponent * power for total, exponent in zip(dimension, unit.dimension)]
+    
+    return Unit(scale, tuple(dimension))
+
+def _significant_figures(mantissa: str) -> Tuple[int, int]:
+    digits = mantissa.replace(",", "")
+    if "." in digits:
+        significant = digits.replace(".", "").lstrip("0")
+        count = max(1, len(significant))
+        return count, count
+    
+    significant = digits.lstrip("0")
+    if not significant:
+        return 1, 1
+    return max(1, len(significant.rstrip("0"))), len(significant)
+
+@functools.lru_cache(maxsize=65536)
+def parse_quantity(text: str) -> Optional[Quantity]:
+    """
+    Parse a numeric answer: decimals with thousands separators, scientific
+    notation ("6.02e23", "6.02 x 10^23"), fractions ("3/4", "1 1/2"), each
+    optionally followed by a unit. Returns None if text isn't a number.
+    """
+    match = QUANTITY_PATTERN.match(text.strip().replace("−", "-"))
+    if match is None:
+        return None
+    
+    if match.group("mantissa") is not None:
+        mantissa = match.group("mantissa")
+        exponent = match.group("exponent") or match.group("power") or "0"
+        value = float(f"{mantissa.replace(',', '')}e{exponent}")
+        significant_figures = _significant_figures(mantissa)
+    else:
+        if match.group("whole") is not None:
+            whole, numerator, denominator = (int(match.group(name)) for name in ("whole", "numerator", "denominator"))
+        else:
+            whole = 0
+            numerator, denominator = int(match.group("fraction_numerator")), int(match.group("fraction_denominator"))
+        if denominator == 0:
+            return None
+        value = whole + numerator / denominator
+        significant_figures = EXACT_SIGNIFICANT_FIGURES
+    
+    if not math.isfinite(value):
+        return None
+    if match.group("sign") == "-":
+        value = -value
+    
+    unit = match.group("unit") or None
+    if unit is not None and parse_unit(unit) is None and not UNIT_TEXT_PATTERN.match(unit):
+        return None
+    
+    return Quantity(value, unit, significant_figures)
+
+@functools.lru_cache(maxsize=4096)
+def parse_reference(text: str) -> Optional[Tuple[Quantity, Optional[float], Optional[float]]]:
+    """
+    Parse an answer-key value, which may carry its own tolerance
+    
+    Returns:
+        (quantity, absolute tolerance or None, relative tolerance or None),
+        or None if the key answer isn't numeric
+    """
+    absolute = relative = None
+    match = TOLERANCE_PATTERN.search(text)
+    if match:
+        tolerance = float(match.group(1).replace(",", ""))
+        if match.group(2):
+            relative = tolerance / 100
+        else:
+            absolute = tolerance
+        text = text[:match.start()] + " " + text[match.end():]
+    
+    quantity = parse_quantity(text)
+    if quantity is None:
+        return None
+    return quantity, absolute, relative
+
+def _same_unit_text(a: str, b: str) -> bool:
+    return _normalize_unit_text(a).lower() == _normalize_unit_text(b).lower()
+
+class NumericGrader:
+    """
+    Grades numeric answers against a key value after converting both to SI
+    units through the unit table.
+    
+    An answer is correct when its value is within the tolerance of the key's
+    (the larger of the absolute and relative tolerance), its unit has the
+    right dimension (and is present if the question asks for units) and,
+    if significant figures are asked for, it is given with that many. An
+    answer with the right value that fails only the unit or significant
+    figure rules gets partial_credit.
+    """
+    
+    def __init__(self, relative_tolerance: float = 0.01, absolute_tolerance: float = 1e-9,
+                 partial_credit: float = 0.5):
+        self.relative_tolerance = relative_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.partial_credit = partial_credit
+    
+    def tolerances(self, key_relative: Optional[float] = None, key_absolute: Optional[float] = None,
+                   relative_tolerance: Optional[float] = None,
+                   absolute_tolerance: Optional[float] = None) -> Tuple[float, float]:
+        """(relative, absolute) tolerance: the given ones, else the key's, else the grader's"""
+        relative = next(t for t in (relative_tolerance, key_relative, self.relative_tolerance) if t is not None)
+        absolute = next(t for t in (absolute_tolerance, key_absolute, self.absolute_tolerance) if t is not None)
+        return relative, absolute
+    
+    def grade(self, reference: str, answers: Sequence[Optional[str]], required_units: Optional[str] = None,
+              relative_tolerance: Optional[float] = None, absolute_tolerance: Optional[float] = None,
+              significant_figures: Optional[int] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Grade every student's answer to one question at once
+        
+        Args:
+            reference: The answer-key value, e.g. "9.81 m/s^2" or "1/3"
+            answers: One answer per student (None for no answer)
+            required_units: Units the question asks for (required_units of the
+                            classified question); answers must then carry a unit
+            relative_tolerance: Overrides the key's and the grader's relative tolerance
+            absolute_tolerance: Overrides the key's and the grader's absolute
+                                tolerance, in the unit of the key
+            significant_figures: Significant figures the answer must be given with
+        
+        Returns:
+            Arrays over the students: parsed, value (in the key's unit),
+            value_correct, units_correct, significant_figures_correct,
+            is_correct and score (0 to 1); None if the key isn't numeric
+        """
+        parsed_reference = parse_reference(str(reference))
+        if parsed_reference is None:
+            return None
+        quantity, key_absolute, key_relative = parsed_reference
+        
+        relative, absolute = self.tolerances(key_relative, key_absolute, relative_tolerance, absolute_tolerance)
+        
+        # A unit the table doesn't know can't be converted to; grade the value alone
+        if not quantity.unit and required_units and parse_unit(required_units) is None:
+            required_units = None
+        
+        # Answers are converted to the key's unit, or the unit the question asks for
+        expected_text = quantity.unit or required_units
+        expected = parse_unit(expected_text) if expected_text else None
+        expected_scale = expected.scale if expected is not None else 1.0
+        expected_offset = expected.offset if expected is not None else 0.0
+        
+        n = len(answers)
+        quantities = [parse_quantity(answer) if isinstance(answer, str) else None for answer in answers]
+        parsed = np.fromiter((q is not None for q in quantities), dtype=bool, count=n)
+        values = np.fromiter((q.value if q is not None else np.nan for q in quantities), dtype=np.float64, count=n)
+        fewest = np.fromiter((q.significant_figures[0] if q is not None else 0 for q in quantities), dtype=np.int64, count=n)
+        most = np.fromiter((q.significant_figures[1] if q is not None else 0 for q in quantities), dtype=np.int64, count=n)
+        
+        # Resolve each distinct unit spelling once, then gather per student
+        unit_codes = {}
+        codes = np.fromiter(
+            (unit_codes.setdefault(q.unit if q is not None else None, len(unit_codes)) for q in quantities),
+            dtype=np.intp, count=n
+        )
+        scales = np.full(len(unit_codes), expected_scale)
+        offsets = np.full(len(unit_codes), expected_offset)
+        compatible = np.ones(len(unit_codes), dtype=bool)
+        has_unit = np.zeros(len(unit_codes), dtype=bool)
+        
+        for unit_text, code in unit_codes.items():
+            # A bare number is read in the expected unit
+            if unit_text is None:
+                continue
+            has_unit[code] = True
+            if expected_text is None:
+                continue
+            
+            unit = parse_unit(unit_text)
+            if expected is None or unit is None:
+                compatible[code] = _same_unit_text(unit_text, expected_text)
+            elif unit.dimension != expected.dimension:
+                compatible[code] = False
+            else:
+                scales[code] = unit.scale
+                offsets[code] = unit.offset
+        
+        si_values = values * scales[codes] + offsets[codes]
+        reference_si = quantity.value * expected_scale + expected_offset
+        tolerance = max(absolute, relative * abs(quantity.value)) * expected_scale
+        
+        if significant_figures:
+            # Rounding to the asked precision is never marked wrong
+            if quantity.value:
+                precision = 0.5 * 10.0 ** (math.floor(math.log10(abs(quantity.value))) - significant_figures + 1)
+                tolerance = max(tolerance, precision * expected_scale)
+            significant_figures_correct = parsed & (fewest <= significant_figures) & (significant_figures <= most)
+        else:
+            significant_figures_correct = parsed.copy()
+        
+        student_compatible = compatible[codes]
+        value_correct = parsed & student_compatible & (np.abs(si_values - reference_si) <= tolerance)
+        units_correct = parsed & student_compatible & (has_unit[codes] | (not required_units))
+        is_correct = value_correct & units_correct & significant_figures_correct
+        
+        return {
+            "parsed": parsed,
+            "value": (si_values - expected_offset) / expected_scale,
+            "value_correct": value_correct,
+            "units_correct": units_correct,
+            "significant_figures_correct": significant_figures_correct,
+            "is_correct": is_correct,
+            "score": np.where(is_correct, 1.0, np.where(value_correct, self.partial_credit, 0.0))
+        }
@@ -0,0 +1,126 @@
+# modules/pdf_cache.py
+"""
+PDF Content Cache
+Content-addressed on-disk cache for PDFProcessor output with size-bounded LRU eviction
+"""
+import os
+import json
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the structure or content of PDFProcessor.process output changes,
+# so stale cache entries are never served
+EXTRACTOR_VERSION = "5"
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PDFContentCache:
+    """
+    Stores processed pdf_content as compressed JSON files named after the
+    hash of the PDF bytes and the extractor version. Reads refresh a file's
+    modification time, and the least recently used files are removed once
+    the cache grows past max_bytes.
+    """
+    
+    def __init__(self, directory: str = "cache/pdf", max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}-v{EXTRACTOR_VERSION}.json.z")
+    
+    def get(self, content_hash: str) -> Optional[Dict]:
+        """Get cached pdf_content for a PDF hash, or None on a miss"""
+        path = self._path(content_hash)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark as recently used
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        
+        try:
+            return json.loads(zlib.decompress(data).decode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            return None
+    
+    def put(self, content_hash: str, pdf_content: Dict):
+        """Store pdf_content for a PDF hash"""
+        data = zlib.compress(json.dumps(pdf_content, separators=(",", ":"), default=str).encode("utf-8"))
+        
+        # Write to a temp file and rename, so concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(content_hash))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        
+        self.evict()
+    
+    def discard(self, content_hash: str):
+        """Remove the entry of a PDF hash, e.g. one that turned out to be unusable"""
+        self._remove(self._path(content_hash))
+    
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            
+            if total <= self.max_bytes:
+                return 0
+            
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+            
+            logger.info(f"Evicted {removed} entries from the PDF content cache")
+            return removed
+    
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def create_pdf_cache() -> Optional[PDFContentCache]:
+    """
+    Create the cache configured by PDF_CACHE_DIR and PDF_CACHE_MAX_BYTES.
+    Setting PDF_CACHE_MAX_BYTES to 0 disables caching.
+    """
+    max_bytes = int(os.environ.get("PDF_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+    if max_bytes <= 0:
+        return None
+    
+    return PDFContentCache(os.environ.get("PDF_CACHE_DIR", "cache/pdf"), max_bytes)
@@ -21,34 +21,160 @@ def _extract_tables(self, page) -> List[Dict]:
                     elif abs(x1 - x0) < 2:  # Vertical line
                         v_lines.append((x0, min(y0, y1), x1, max(y0, y1)))
         
+        # Snap overlapping strokes and split segments of the same rule into single lines
+        h_lines = self._merge_collinear_lines(h_lines, horizontal=True)
+        v_lines = self._merge_collinear_lines(v_lines, horizontal=False)
+        
         # Simple table detection: Find intersections of horizontal and vertical lines
         if len(h_lines) > 2 and len(v_lines) > 2:
             # Find grid cells
-            intersections = self._find_line_intersections(h_lines, v_lines)
+            crossings = self._sweep_line_crossings(h_lines, v_lines)
             
-            if len(intersections) > 4:  # At least a 2x2 grid
-                # Extract table structure
-                table = {
-                    "bbox": self._calculate_table_bbox(h_lines, v_lines),
-                    "rows": len(set(y for _, y in intersections)),
-                    "columns": len(set(x for x, _ in intersections)),
-                    "cells": self._extract_table_cells(page, intersections)
-                }
-                tables.append(table)
+            # Page words are extracted once and shared by every table's cells
+            words = None
+            
+            # Each connected group of crossing lines is a separate table
+            for h_indices, v_indices, group in self._group_table_crossings(crossings):
+                intersections = [(v_lines[j][0], h_lines[i][1]) for i, j in group]
+                
+                if len(intersections) > 4:  # At least a 2x2 grid
+                    if words is None:
+                        words = page.get_text("words")
+                    
+                    # Extract table structure
+                    table = {
+                        "bbox": self._calculate_table_bbox(
+                            [h_lines[i] for i in h_indices],
+                            [v_lines[j] for j in v_indices]
+                        ),
+                        "rows": len(set(y for _, y in intersections)),
+                        "columns": len(set(x for x, _ in intersections)),
+                        "cells": self._extract_table_cells(page, intersections, words)
+                    }
+                    tables.append(table)
+        
+        # Order tables top to bottom, then left to right
+        tables.sort(key=lambda table: (table["bbox"][1], table["bbox"][0]))
         
         return tables
     
+    def _merge_collinear_lines(self, lines, horizontal: bool, tolerance: float = 2.0):
+        """
+        Snap lines lying within tolerance of each other onto one coordinate and
+        merge collinear segments that overlap or touch into a single line
+        """
+        # Normalize to (position, start, end) along the line direction
+        if horizontal:
+            segments = sorted((y0, x0, x1) for x0, y0, x1, _ in lines)
+        else:
+            segments = sorted((x0, y0, y1) for x0, y0, _, y1 in lines)
+        
+        # Cluster segments whose positions are within tolerance of each other
+        clusters = []
+        for segment in segments:
+            if clusters and segment[0] - clusters[-1][-1][0] <= tolerance:
+                clusters[-1].append(segment)
+            else:
+                clusters.append([segment])
+        
+        merged = []
+        for cluster in clusters:
+            position = sum(segment[0] for segment in cluster) / len(cluster)
+            
+            # Merge overlapping or touching spans along the line
+            spans = sorted((start, end) for _, start, end in cluster)
+            current_start, current_end = spans[0]
+            for start, end in spans[1:]:
+                if start <= current_end + tolerance:
+                    current_end = max(current_end, end)
+                else:
+                    merged.append((position, current_start, current_end))
+                    current_start, current_end = start, end
+            merged.append((position, current_start, current_end))
+        
+        if horizontal:
+            return [(start, position, end, position) for position, start, end in merged]
+        return [(position, start, position, end) for position, start, end in merged]
+    
+    def _sweep_line_crossings(self, h_lines, v_lines, tolerance: float = 2.0):
+        """
+        Find (horizontal index, vertical index) pairs of crossing lines.
+        Sweeps left to right keeping the horizontal lines that span the current
+        x sorted by y, so each vertical line only looks at the lines in its y range.
+        
+        Sorting the events is O((H+V) log(H+V)) and each vertical line's lookup
+        is O(log H + its crossings), but inserting into and deleting from the
+        sorted list shifts it, O(H) per line: O(H^2 + V log H + K) in all. The
+        shifts are memmoves over at most a few hundred lines per page, far
+        cheaper than the O(H*V) pairwise check this replaced.
+        """
+        import bisect
+        
+        # Event order at equal x: open horizontals, query verticals, then close horizontals
+        events = []
+        for i, (h_x0, _, h_x1, _) in enumerate(h_lines):
+            events.append((h_x0 - tolerance, 0, i))
+            events.append((h_x1 + tolerance, 2, i))
+        for j, (v_x0, _, _, _) in enumerate(v_lines):
+            events.append((v_x0, 1, j))
+        events.sort()
+        
+        active = []  # (y, horizontal index), sorted
+        crossings = []
+        
+        for _, kind, index in events:
+            if kind == 0:
+                bisect.insort(active, (h_lines[index][1], index))
+            elif kind == 2:
+                del active[bisect.bisect_left(active, (h_lines[index][1], index))]
+            else:
+                _, v_y0, _, v_y1 = v_lines[index]
+                lo = bisect.bisect_left(active, (v_y0 - tolerance, -1))
+                hi = bisect.bisect_right(active, (v_y1 + tolerance, len(h_lines)))
+                crossings.extend((i, index) for _, i in active[lo:hi])
+        
+        return crossings
+    
     def _find_line_intersections(self, h_lines, v_lines):
         """Find intersections between horizontal and vertical lines"""
-        intersections = []
+        return [
+            (v_lines[j][0], h_lines[i][1])
+            for i, j in self._sweep_line_crossings(h_lines, v_lines)
+        ]
+    
+    def _group_table_crossings(self, crossings):
+        """
+        Split crossings into connected groups of lines (one group per table)
         
-        for h_x0, h_y0, h_x1, h_y1 in h_lines:
-            for v_x0, v_y0, v_x1, v_y1 in v_lines:
-                # Check if lines intersect
-                if h_x0 <= v_x0 <= h_x1 and v_y0 <= h_y0 <= v_y1:
-                    intersections.append((v_x0, h_y0))
+        Returns:
+            List of (horizontal indices, vertical indices, crossings) per group
+        """
+        # Union-find over lines; horizontal i is node ("h", i), vertical j is ("v", j)
+        parent = {}
         
-        return intersections
+        def find(node):
+            parent.setdefault(node, node)
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+        
+        for i, j in crossings:
+            root_h, root_v = find(("h", i)), find(("v", j))
+            if root_h != root_v:
+                parent[root_v] = root_h
+        
+        groups = {}
+        for i, j in crossings:
+            h_indices, v_indices, group = groups.setdefault(find(("h", i)), (set(), set(), []))
+            h_indices.add(i)
+            v_indices.add(j)
+            group.append((i, j))
+        
+        return [
+            (sorted(h_indices), sorted(v_indices), group)
+            for h_indices, v_indices, group in groups.values()
+        ]
     
     def _calculate_table_bbox(self, h_lines, v_lines):
         """Calculate the bounding box of the table"""
@@ -59,8 +185,14 @@ def _extract_tables(self, page) -> List[Dict]:
         
         return [h_x0, v_y0, h_x1, v_y1]
     
-    def _extract_table_cells(self, page, intersections):
-        """Extract cell content from a table structure"""
+    def _extract_table_cells(self, page, intersections, words=None):
+        """
+        Extract cell content from a table structure.
+        The page's words are extracted once (or passed in) and binned into
+        cells by their centre point, instead of one clipped extraction per cell.
+        """
+        import bisect
+        
         # Sort intersections by row then column
         intersections.sort(key=lambda p: (p[1], p[0]))
         
@@ -68,6 +200,20 @@ def _extract_tables(self, page) -> List[Dict]:
         x_coords = sorted(set(x for x, _ in intersections))
         y_coords = sorted(set(y for _, y in intersections))
         
+        if words is None:
+            words = page.get_text("words")
+        
+        # Bin words into cells: (row, column) -> (block, line) -> [(word number, word)]
+        cell_words = {}
+        for word in words:
+            x0, y0, x1, y1, text, block_no, line_no, word_no = word[:8]
+            column = bisect.bisect_right(x_coords, (x0 + x1) / 2) - 1
+            row = bisect.bisect_right(y_coords, (y0 + y1) / 2) - 1
+            
+            if 0 <= row < len(y_coords) - 1 and 0 <= column < len(x_coords) - 1:
+                lines = cell_words.setdefault((row, column), {})
+                lines.setdefault((block_no, line_no), []).append((word_no, text))
+        
         # Extract cell content
         cells = []
         
@@ -78,8 +224,12 @@ def _extract_tables(self, page) -> List[Dict]:
                 cell_x0, cell_y0 = x_coords[j], y_coords[i]
                 cell_x1, cell_y1 = x_coords[j+1], y_coords[i+1]
                 
-                # Extract text within cell boundaries
-                cell_text = page.get_text("text", clip=[cell_x0, cell_y0, cell_x1, cell_y1])
+                # Rebuild the cell text line by line, in reading order
+                lines = cell_words.get((i, j), {})
+                cell_text = "\n".join(
+                    " ".join(text for _, text in sorted(lines[line]))
+                    for line in sorted(lines)
+                )
                 
                 row.append({
                     "text": cell_text.strip(),
@@ -102,37 +252,269 @@ def _extract_tables(self, page) -> List[Dict]:
                     "type": widget.field_type_string,
                     "name": widget.field_name,
                     "value": widget.field_value,
-                    "bbox": widget.rect
+                    "bbox": list(widget.rect)
                 }
                 forms.append(form_field)
         
         return forms
     
-    def _extract_figures(self, page) -> List[Dict]:
-        """Extract images and figures from the page"""
+    def _extract_figures(self, page, metadata_only: bool = True) -> List[Dict]:
+        """
+        Extract images and figures from the page.
+        By default only the image dictionary is read (no pixel data is decoded);
+        pass metadata_only=False to decode each image as before.
+        """
         figures = []
         
         # Extract images
         image_list = page.get_images(full=True)
+        seen = set()
         
         for img_index, img in enumerate(image_list):
             xref = img[0]
             
+            # One image can be listed under several resource names, but
+            # get_image_rects already returns all of its placements
+            if xref in seen:
+                continue
+            seen.add(xref)
+            
             try:
                 # Get image properties
-                base_image = page.parent.extract_image(xref)
-                if base_image:
-                    # Get position data from page
-                    for img_bbox in page.get_image_bbox(xref):
+                image_info = self._get_image_info(page.parent, img, metadata_only)
+                if image_info:
+                    # Get position data from page (one rect per placement)
+                    for img_bbox in page.get_image_rects(xref):
                         figure = {
                             "image_index": img_index,
+                            "xref": xref,
                             "bbox": list(img_bbox),
-                            "width": base_image["width"],
-                            "height": base_image["height"],
-                            "format": base_image["ext"]
+                            "width": image_info["width"],
+                            "height": image_info["height"],
+                            "format": image_info["ext"]
                         }
                         figures.append(figure)
             except Exception as e:
                 logger.warning(f"Could not extract image {xref}: {str(e)}")
         
         return figures
+    
+    def _get_image_info(self, doc, img, metadata_only: bool = True) -> Dict:
+        """
+        Get width, height and format of an image, cached per document and xref
+        so logos and headers repeated on every page are only looked at once
+        
+        Args:
+            doc: The fitz document
+            img: Entry from page.get_images(full=True):
+                 (xref, smask, width, height, bpc, colorspace, alt colorspace, name, filter, ...)
+            metadata_only: Read the image dictionary instead of decoding the image
+        """
+        xref = img[0]
+        
+        # Reset the cache when a different document is processed
+        doc_key = (id(doc), doc.name)
+        if getattr(self, "_image_info_doc", None) != doc_key:
+            self._image_info_doc = doc_key
+            self._image_info_cache = {}
+        
+        cache_key = (xref, metadata_only)
+        if cache_key not in self._image_info_cache:
+            if metadata_only:
+                # Map the stream filter to the extension extract_image would report
+                image_filter = img[8] if len(img) > 8 else ""
+                formats = {
+                    "DCTDecode": "jpeg",
+                    "JPXDecode": "jpx",
+                    "JBIG2Decode": "jb2",
+                    "CCITTFaxDecode": "tiff"
+                }
+                info = {"width": img[2], "height": img[3], "ext": formats.get(image_filter, "png")}
+            else:
+                base_image = doc.extract_image(xref)
+                info = {
+                    "width": base_image["width"],
+                    "height": base_image["height"],
+                    "ext": base_image["ext"]
+                } if base_image else None
+            self._image_info_cache[cache_key] = info
+        
+        return self._image_info_cache[cache_key]
+    
+    def save_figure_thumbnail(self, pdf_path: str, xref: int, output_path: str, max_size: int = 256) -> str:
+        """
+        Decode a single figure on demand and write a PNG thumbnail of it
+        
+        Args:
+            pdf_path: Path of the PDF containing the figure
+            xref: The figure's xref (as reported in the figure dict)
+            output_path: Where to write the PNG
+            max_size: Longest side of the thumbnail in pixels
+            
+        Returns:
+            The output path
+        """
+        import fitz
+        
+        with fitz.open(pdf_path) as doc:
+            pixmap = fitz.Pixmap(doc, xref)
+            
+            # PNG only supports gray and RGB; convert CMYK and other colorspaces
+            if pixmap.n - pixmap.alpha >= 4:
+                pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+            
+            # Halve the resolution until the longest side fits
+            while max(pixmap.width, pixmap.height) > max_size and min(pixmap.width, pixmap.height) > 1:
+                pixmap.shrink(1)
+            
+            pixmap.save(output_path)
+        
+        return output_path
+    
+    def _extract_page(self, page, compact: bool = False):
+        """
+        Extract the text blocks, tables, forms and figures of a single page.
+        The time the extraction took is recorded as extraction_time, in seconds.
+        With compact=True a document_model.Page is returned instead of a dict.
+        """
+        import time
+        
+        start_time = time.perf_counter()
+        
+        if compact:
+            return self._extract_compact_page(page, start_time)
+        
+        text_blocks = []
+        for block in page.get_text("blocks"):
+            x0, y0, x1, y1, text, block_no, block_type = block[:7]
+            if block_type != 0:  # Skip image blocks
+                continue
+            text_blocks.append({
+                "text": text.strip(),
+                "bbox": [x0, y0, x1, y1],
+                "block_no": block_no
+            })
+        
+        page_content = {
+            "page_num": page.number,
+            "width": page.rect.width,
+            "height": page.rect.height,
+            "text_blocks": text_blocks,
+            "tables": self._extract_tables(page),
+            "forms": self._extract_forms(page),
+            "figures": self._extract_figures(page)
+        }
+        page_content["extraction_time"] = time.perf_counter() - start_time
+        
+        return page_content
+    
+    def _extract_compact_page(self, page, start_time: float):
+        """Extract a page straight into a Page, with no per-block dicts"""
+        import time
+        from modules.document_model import Page, Table, TextBlocks
+        
+        texts, bboxes, block_nos = [], [], []
+        for block in page.get_text("blocks"):
+            x0, y0, x1, y1, text, block_no, block_type = block[:7]
+            if block_type != 0:  # Skip image blocks
+                continue
+            texts.append(text.strip())
+            bboxes.append((x0, y0, x1, y1))
+            block_nos.append(block_no)
+        
+        compact_page = Page(
+            page.number,
+            page.rect.width,
+            page.rect.height,
+            TextBlocks(texts, bboxes, block_nos),
+            [Table.from_dict(table) for table in self._extract_tables(page)],
+            self._extract_forms(page),
+            self._extract_figures(page)
+        )
+        compact_page.extraction_time = time.perf_counter() - start_time
+        
+        return compact_page
+    
+    def page_count(self, pdf_path: str) -> int:
+        """Get the number of pages of a PDF without extracting anything"""
+        import fitz
+        
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    
+    def iter_pages(self, pdf_path: str, start: int = 0):
+        """
+        Yield extracted pages one at a time, so callers can stream through a
+        document without holding every page in memory
+        """
+        import fitz
+        
+        with fitz.open(pdf_path) as doc:
+            for page_num in range(start, doc.page_count):
+                yield self._extract_page(doc[page_num])
+    
+    def process_pages(self, pdf_path: str, start: int = 0, end: int = None,
+                      compact: bool = False) -> Dict:
+        """
+        Extract pages [start, end) of a PDF (end=None: to the last page).
+        Each parallel worker opens the document by path and handles one range;
+        with compact=True the pages are document_model.Page objects, which are
+        much cheaper to send back from a worker process than page dicts.
+        """
+        import fitz
+        
+        with fitz.open(pdf_path) as doc:
+            end = doc.page_count if end is None else min(end, doc.page_count)
+            pages = [self._extract_page(doc[page_num], compact) for page_num in range(start, end)]
+            
+            return {
+                "start": start,
+                "page_count": doc.page_count,
+                "metadata": doc.metadata if start == 0 else None,
+                "pages": pages
+            }
+    
+    @staticmethod
+    def merge_page_ranges(parts: List[Dict], compact: bool = False):
+        """
+        Merge page-range results back into a single pdf_content in page order,
+        or into a document_model.Document for ranges extracted with compact=True
+        """
+        parts = sorted(parts, key=lambda part: part["start"])
+        
+        pages = []
+        for part in parts:
+            pages.extend(part["pages"])
+        
+        metadata = next((part["metadata"] for part in parts if part.get("metadata") is not None), {})
+        
+        if compact:
+            from modules.document_model import Document
+            
+            return Document(metadata, parts[0]["page_count"] if parts else 0, pages)
+        
+        return {
+            "metadata": metadata,
+            "page_count": parts[0]["page_count"] if parts else 0,
+            "pages": pages,
+            "tables": [table for page in pages for table in page["tables"]]
+        }
+    
+    def process_parallel(self, pdf_path: str, max_workers=None, pages_per_task: int = 8) -> Dict:
+        """
+        Extract a PDF with page ranges spread over a process pool.
+        Pages are independent, so latency on long documents scales down with cores.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        page_count = self.page_count(pdf_path)
+        ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+        
+        if len(ranges) <= 1:
+            return self.merge_page_ranges([self.process_pages(pdf_path, 0, page_count)])
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(self.process_pages, pdf_path, start, end) for start, end in ranges]
+            parts = [future.result() for future in futures]
+        
+        return self.merge_page_ranges(parts)
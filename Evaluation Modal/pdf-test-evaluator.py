@@ -4,18 +4,38 @@ AI-Driven PDF Test Evaluation System
 Main application file that ties together all components
 """
 import os
+import json
+import shutil
+import hashlib
 import logging
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException
-from typing import Dict, List, Optional
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Any, Dict, List, Optional
 import uvicorn
 from pydantic import BaseModel
 
-from modules.pdf_processor import PDFProcessor
-from modules.document_understanding import DocumentUnderstandingEngine
-from modules.question_classifier import QuestionClassifier
-from modules.answer_evaluator import AnswerEvaluationEngine
 from modules.scoring import ScoringEngine
 from modules.report_generator import ReportGenerator
+from modules.job_store import create_job_store, FINISHED_STATUSES
+from modules.job_queue import create_job_queue, PRIORITIES, JobCancelledError, QueueFullError
+from modules.spool import create_spool
+from modules.progress import ProgressBroker, event_stream, job_event
+from modules.uploads import save_upload, UploadTooLargeError, MAX_REQUEST_BYTES
+from modules.answer_key import AnswerKey
+from modules.essay_scoring import create_essay_scorer
+from modules.metrics import REGISTRY, JOBS, JobMetrics
+from modules.pipeline_executor import (
+    PipelineExecutor,
+    analyze_document,
+    classify_questions,
+    count_pdf_pages,
+    stream_questions,
+    load_answer_key,
+    evaluate_answers,
+    save_checkpoint,
+    has_checkpoints,
+    regrade_answers
+)
 
 # Set up logging
 logging.basicConfig(
@@ -35,6 +55,7 @@ class EvaluationStatus(BaseModel):
     job_id: str
     status: str
     message: Optional[str] = None
+    progress: Optional[float] = None
 
 class QuestionScore(BaseModel):
     question_id: str
@@ -54,177 +75,1071 @@ class TestEvaluationResult(BaseModel):
     question_scores: List[QuestionScore]
     evaluation_summary: str
     processing_time: float
+    metrics: Optional[Dict[str, Any]] = None
+
+class SubmissionStatus(BaseModel):
+    job_id: str
+    filename: Optional[str] = None
+    status: str
+    message: Optional[str] = None
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    status: str
+    message: Optional[str] = None
+    total: int
+    completed: int
+    failed: int
+    progress: float
+    submissions: List[SubmissionStatus]
+
+class BatchEvaluationResult(BaseModel):
+    batch_id: str
+    total: int
+    evaluated: int
+    failed: int
+    average_percentage: Optional[float] = None
+    highest_percentage: Optional[float] = None
+    lowest_percentage: Optional[float] = None
+    results: List[TestEvaluationResult]
+
+# Persistent job tracking (backend configured via JOB_STORE_BACKEND / JOB_STORE_PATH)
+job_store = create_job_store()
+
+# Job status changes are pushed to /evaluation-events and /batch-events subscribers
+progress_broker = ProgressBroker()
+job_store.add_listener(progress_broker.on_job_update)
+
+# Seconds without events before an SSE stream sends a keep-alive comment
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+
+# Process pool for the CPU-bound pipeline stages (sized by EVALUATION_WORKERS)
+pipeline_executor = PipelineExecutor()
+
+# Bounded queue admitting jobs to a fixed number of concurrent evaluations
+# (sized by JOB_QUEUE_WORKERS / JOB_QUEUE_MAX_DEPTH)
+job_queue = create_job_queue(pipeline_executor.max_workers)
+
+# With SPOOL_DIR set, jobs are handed to worker.py processes through a shared
+# spool directory instead of running here; their records are collected every
+# SPOOL_POLL_SECONDS
+spool = create_spool()
+SPOOL_POLL_SECONDS = float(os.environ.get("SPOOL_POLL_SECONDS", 1.0))
+spool_collector = None
 
-# In-memory job tracking (replace with database in production)
-evaluation_jobs = {}
+# Tests longer than this are streamed page by page instead of extracted whole
+STREAMING_PAGE_THRESHOLD = int(os.environ.get("STREAMING_PAGE_THRESHOLD", 50))
+
+# Lightweight stages run in the API process and are shared by all jobs
+scoring_engine = ScoringEngine()
+report_generator = ReportGenerator()
+
+# LLM essay scoring (enabled by LLM_SERVICE_URL), batched across all running jobs
+essay_scorer = create_essay_scorer()
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the pipeline worker processes and the job queue, or the spool collector"""
+    global spool_collector
+    import asyncio
+    
+    pipeline_executor.start()
+    job_queue.start()
+    if spool is not None:
+        spool_collector = asyncio.ensure_future(_collect_spool())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job queue and the pipeline worker processes"""
+    if spool_collector is not None:
+        spool_collector.cancel()
+    await job_queue.shutdown()
+    pipeline_executor.shutdown()
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Reject oversized uploads from their Content-Length before reading the body"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds the limit of {MAX_REQUEST_BYTES} bytes"}
+        )
+    
+    return await call_next(request)
+
+async def _save_upload(upload: UploadFile, path: str) -> str:
+    """Stream an upload to disk and return its content hash"""
+    try:
+        content_hash, _ = await save_upload(upload, path)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return content_hash
+
+def _admit(count: int, priority: str) -> int:
+    """
+    Reserve queue room for a request's jobs, or reject the request if there
+    isn't any. It runs once the request body is parsed, before the uploads
+    are hashed and moved into place or any job is created.
+    
+    Returns:
+        The number of jobs reserved, to give back with job_queue.release once
+        they are queued
+    """
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+    
+    # Spooled jobs wait in the spool, not in this process's queue
+    depth = spool.pending_count() if spool is not None else None
+    try:
+        job_queue.reserve(count, depth=depth)
+    except QueueFullError as e:
+        retry_after = e.retry_after
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many evaluations queued, retry in {retry_after} seconds",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
+    return count
 
 @app.post("/evaluate-test/", response_model=EvaluationStatus)
 async def evaluate_test(
-    background_tasks: BackgroundTasks,
     test_file: UploadFile = File(...),
     answer_key_file: Optional[UploadFile] = File(None),
-    config: Optional[Dict] = None
+    config: Optional[Dict] = None,
+    priority: str = "normal"
 ):
     """
     Upload a test PDF for evaluation.
     Optionally provide an answer key file and configuration parameters.
+    priority ("high", "normal" or "bulk") picks the queue lane.
     """
-    # Generate a unique job ID
-    import uuid
-    job_id = str(uuid.uuid4())
-    
-    # Save uploaded files
-    test_path = f"uploads/{job_id}/test.pdf"
-    answer_key_path = None
-    
-    os.makedirs(f"uploads/{job_id}", exist_ok=True)
-    
-    # Save test file
-    with open(test_path, "wb") as f:
-        f.write(await test_file.read())
-    
-    # Save answer key if provided
-    if answer_key_file:
-        answer_key_path = f"uploads/{job_id}/answer_key.pdf"
-        with open(answer_key_path, "wb") as f:
-            f.write(await answer_key_file.read())
-    
-    # Update job status
-    evaluation_jobs[job_id] = {"status": "queued", "result": None}
-    
-    # Add evaluation task to background processing
-    background_tasks.add_task(
-        process_test_evaluation,
-        job_id,
-        test_path,
-        answer_key_path,
-        config
-    )
+    reserved = _admit(1, priority)
     
-    return EvaluationStatus(job_id=job_id, status="queued", message="Test evaluation has been queued")
+    try:
+        # Generate a unique job ID
+        import uuid
+        job_id = str(uuid.uuid4())
+        
+        # Save uploaded files
+        test_path = f"uploads/{job_id}/test.pdf"
+        answer_key_path = None
+        answer_key_hash = None
+        
+        os.makedirs(f"uploads/{job_id}", exist_ok=True)
+        
+        try:
+            # Save test file, hashing it while it streams to disk
+            test_hash = await _save_upload(test_file, test_path)
+            
+            # Save answer key if provided
+            if answer_key_file:
+                answer_key_path = f"uploads/{job_id}/answer_key.pdf"
+                answer_key_hash = await _save_upload(answer_key_file, answer_key_path)
+        except HTTPException:
+            shutil.rmtree(f"uploads/{job_id}", ignore_errors=True)
+            raise
+        
+        # A byte-identical submission attaches to the job that already evaluated it
+        content_hash = _submission_hash(test_hash, answer_key_hash, config)
+        existing_job_id = job_store.find_by_content_hash(content_hash)
+        if existing_job_id is not None:
+            existing_job = job_store.get(existing_job_id)
+            if existing_job is not None:
+                logger.info(f"Identical submission, attaching to job {existing_job_id}")
+                shutil.rmtree(f"uploads/{job_id}", ignore_errors=True)
+                return EvaluationStatus(
+                    job_id=existing_job_id,
+                    status=existing_job["status"],
+                    message=existing_job.get("message", None)
+                )
+        
+        # Update job status
+        job_store.create(
+            job_id,
+            status="queued",
+            message="Test evaluation has been queued",
+            content_hash=content_hash
+        )
+        
+        # Hand the evaluation to the spool workers
+        if spool is not None:
+            files = {"test.pdf": test_path}
+            if answer_key_path:
+                files["answer_key.pdf"] = answer_key_path
+            spool.submit(
+                job_id,
+                {
+                    "test_file": "test.pdf",
+                    "answer_key_file": "answer_key.pdf" if answer_key_path else None,
+                    "config": config,
+                    "test_hash": test_hash,
+                    "answer_key_hash": answer_key_hash
+                },
+                files,
+                priority=priority
+            )
+            shutil.rmtree(f"uploads/{job_id}", ignore_errors=True)
+            return EvaluationStatus(job_id=job_id, status="queued", message="Test evaluation has been queued")
+        
+        # Queue the evaluation in the room reserved for it on admission
+        job_queue.submit(
+            job_id,
+            process_test_evaluation,
+            job_id,
+            test_path,
+            answer_key_path,
+            config,
+            test_hash=test_hash,
+            answer_key_hash=answer_key_hash,
+            priority=priority,
+            force=True
+        )
+        
+        return EvaluationStatus(job_id=job_id, status="queued", message="Test evaluation has been queued")
+    finally:
+        job_queue.release(reserved)
+
+def _submission_hash(test_hash: str, answer_key_hash: Optional[str], config: Optional[Dict]) -> str:
+    """Identify a submission by its test bytes, answer key bytes and configuration"""
+    key = json.dumps([test_hash, answer_key_hash, config], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
 @app.get("/evaluation-status/{job_id}", response_model=EvaluationStatus)
 async def get_evaluation_status(job_id: str):
     """Get the status of a test evaluation job"""
-    if job_id not in evaluation_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = evaluation_jobs[job_id]
     return EvaluationStatus(
         job_id=job_id,
         status=job["status"],
-        message=job.get("message", None)
+        message=job.get("message", None),
+        progress=job_event(job_id, job).get("progress")
     )
 
+@app.get("/evaluation-events/{job_id}")
+async def stream_evaluation_events(job_id: str, request: Request):
+    """
+    Server-Sent Events for a test evaluation job: the current status first, then
+    every stage transition and page/question progress until the job finishes
+    """
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return _event_response(request, [job_id])
+
 @app.get("/evaluation-result/{job_id}", response_model=TestEvaluationResult)
 async def get_evaluation_result(job_id: str):
     """Get the result of a completed test evaluation"""
-    if job_id not in evaluation_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = evaluation_jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail=f"Evaluation is not complete. Current status: {job['status']}")
     
     return job["result"]
 
+@app.post("/cancel/{job_id}", response_model=EvaluationStatus)
+async def cancel_evaluation(job_id: str):
+    """
+    Cancel a test evaluation or a whole batch.
+    Queued jobs are dropped; running jobs stop at their next stage boundary.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["status"] in FINISHED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Evaluation has already finished. Current status: {job['status']}")
+    
+    # A batch cancels its answer key stage and every submission
+    for cancel_id in [job_id] + job.get("job_ids", []):
+        state = job_queue.cancel(cancel_id)
+        if state is None and spool is not None:
+            state = spool.cancel(cancel_id)
+        
+        cancel_job = job_store.get(cancel_id)
+        if cancel_job is None or cancel_job["status"] in FINISHED_STATUSES:
+            continue
+        
+        # A running job records its cancellation at its next stage boundary. The
+        # answer key stage of a batch has none, so the batch is marked right away
+        # and its coordinator stops once the key is indexed
+        if state == "running" and "job_ids" not in cancel_job:
+            job_store.update(cancel_id, message="Cancelling after the current stage")
+            continue
+        if cancel_job.get("result") is not None or cancel_job.get("regrade"):
+            # A cancelled re-grade leaves the previous result in place
+            job_store.update(cancel_id, status="completed", message="Re-grade cancelled, the previous result stands")
+        else:
+            job_store.update(cancel_id, status="cancelled", message="Evaluation cancelled")
+    
+    job = job_store.get(job_id)
+    return EvaluationStatus(
+        job_id=job_id,
+        status=job["status"],
+        message=job.get("message", None),
+        progress=job_event(job_id, job).get("progress")
+    )
+
+@app.post("/evaluate-batch/", response_model=BatchStatus)
+async def evaluate_batch(
+    background_tasks: BackgroundTasks,
+    answer_key_file: UploadFile = File(...),
+    test_files: List[UploadFile] = File(...),
+    config: Optional[Dict] = None,
+    priority: str = "bulk"
+):
+    """
+    Upload one answer key and the test PDFs of a whole class.
+    The answer key is processed once and shared by every submission.
+    The whole batch is admitted to the queue at once, in the bulk lane by default.
+    """
+    reserved = _admit(len(test_files) + 1, priority)
+    
+    import uuid
+    try:
+        batch_id = str(uuid.uuid4())
+        
+        # Save answer key once for the whole batch
+        os.makedirs(f"uploads/{batch_id}", exist_ok=True)
+        answer_key_path = f"uploads/{batch_id}/answer_key.pdf"
+        
+        # Save all files before creating any jobs, so an oversized upload rejects the whole batch
+        uploads = []
+        try:
+            answer_key_hash = await _save_upload(answer_key_file, answer_key_path)
+            
+            for test_file in test_files:
+                job_id = str(uuid.uuid4())
+                test_path = f"uploads/{batch_id}/{job_id}/test.pdf"
+                os.makedirs(f"uploads/{batch_id}/{job_id}", exist_ok=True)
+                
+                test_hash = await _save_upload(test_file, test_path)
+                uploads.append((job_id, test_path, test_hash, test_file.filename))
+        except HTTPException:
+            shutil.rmtree(f"uploads/{batch_id}", ignore_errors=True)
+            raise
+        
+        # Track each submission as its own job
+        submissions = []
+        for job_id, test_path, test_hash, filename in uploads:
+            job_store.create(
+                job_id,
+                status="queued",
+                message="Test evaluation has been queued",
+                batch_id=batch_id,
+                filename=filename
+            )
+            submissions.append((job_id, test_path, test_hash))
+        
+        # Track the batch itself
+        job_ids = [job_id for job_id, _, _ in submissions]
+        job_store.create(
+            batch_id,
+            status="queued",
+            message=f"Batch of {len(job_ids)} submissions has been queued",
+            job_ids=job_ids
+        )
+        
+        # Spool workers evaluate the submissions, each with its own link to the answer key
+        if spool is not None:
+            for job_id, test_path, test_hash in submissions:
+                spool.submit(
+                    job_id,
+                    {
+                        "test_file": "test.pdf",
+                        "answer_key_file": "answer_key.pdf",
+                        "config": config,
+                        "test_hash": test_hash,
+                        "answer_key_hash": answer_key_hash
+                    },
+                    {"test.pdf": test_path},
+                    shared_files={"answer_key.pdf": answer_key_path},
+                    priority=priority
+                )
+            shutil.rmtree(f"uploads/{batch_id}", ignore_errors=True)
+            job_store.update(batch_id, status="evaluating", message="Submissions are being evaluated")
+            return _build_batch_status(batch_id, job_store.get(batch_id))
+        
+        background_tasks.add_task(
+            process_batch_evaluation,
+            batch_id,
+            submissions,
+            answer_key_path,
+            answer_key_hash,
+            config,
+            priority,
+            reserved
+        )
+        # The coordinator holds the reservation until it has queued the jobs
+        reserved = 0
+        
+        return _build_batch_status(batch_id, job_store.get(batch_id))
+    finally:
+        job_queue.release(reserved)
+
+@app.get("/batch-status/{batch_id}", response_model=BatchStatus)
+async def get_batch_status(batch_id: str):
+    """Get the status of a batch and the progress of each submission"""
+    batch = job_store.get(batch_id)
+    if batch is None or "job_ids" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return _build_batch_status(batch_id, batch)
+
+@app.get("/batch-events/{batch_id}")
+async def stream_batch_events(batch_id: str, request: Request):
+    """
+    Server-Sent Events for a batch and all of its submissions over one connection,
+    until the batch and every submission have finished
+    """
+    batch = job_store.get(batch_id)
+    if batch is None or "job_ids" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return _event_response(request, [batch_id] + batch["job_ids"])
+
+@app.get("/batch-result/{batch_id}", response_model=BatchEvaluationResult)
+async def get_batch_result(batch_id: str):
+    """Get the per-student results and class aggregate of a completed batch"""
+    batch = job_store.get(batch_id)
+    if batch is None or "job_ids" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    if batch["status"] != "completed":
+        raise HTTPException(status_code=400, detail=f"Batch is not complete. Current status: {batch['status']}")
+    
+    results = []
+    failed = 0
+    for job_id in batch["job_ids"]:
+        job = job_store.get(job_id)
+        if job is not None and job["status"] == "completed":
+            results.append(job["result"])
+        else:
+            failed += 1
+    
+    percentages = [result["percentage"] for result in results]
+    
+    return BatchEvaluationResult(
+        batch_id=batch_id,
+        total=len(batch["job_ids"]),
+        evaluated=len(results),
+        failed=failed,
+        average_percentage=sum(percentages) / len(percentages) if percentages else None,
+        highest_percentage=max(percentages) if percentages else None,
+        lowest_percentage=min(percentages) if percentages else None,
+        results=results
+    )
+
+@app.post("/regrade/{job_id}", response_model=EvaluationStatus)
+async def regrade_test(
+    job_id: str,
+    answer_key_file: UploadFile = File(...),
+    priority: str = "high"
+):
+    """
+    Re-grade a completed evaluation against a corrected answer key.
+    Extraction, analysis and classification are not rerun; only the questions
+    whose key entry changed are evaluated again before the test is rescored.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["status"] != "completed":
+        raise HTTPException(status_code=400, detail=f"Evaluation is not complete. Current status: {job['status']}")
+    
+    if not has_checkpoints(job_id):
+        raise HTTPException(status_code=400, detail="No checkpoints are left for this evaluation, submit the test again")
+    
+    reserved = _admit(1, priority)
+    try:
+        answer_key_path, answer_key_hash = await _save_regrade_key(answer_key_file, f"uploads/{job_id}")
+        
+        job_store.update(job_id, status="queued", message="Re-grade has been queued")
+        job_queue.submit(
+            job_id,
+            process_regrade,
+            job_id,
+            answer_key_path,
+            answer_key_hash,
+            priority=priority,
+            force=True
+        )
+    finally:
+        job_queue.release(reserved)
+    
+    return EvaluationStatus(job_id=job_id, status="queued", message="Re-grade has been queued")
+
+@app.post("/regrade-batch/{batch_id}", response_model=BatchStatus)
+async def regrade_batch(
+    batch_id: str,
+    background_tasks: BackgroundTasks,
+    answer_key_file: UploadFile = File(...),
+    priority: str = "normal"
+):
+    """
+    Re-grade every evaluated submission of a completed batch against a
+    corrected answer key, which is processed once for the whole batch
+    """
+    batch = job_store.get(batch_id)
+    if batch is None or "job_ids" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    if batch["status"] != "completed":
+        raise HTTPException(status_code=400, detail=f"Batch is not complete. Current status: {batch['status']}")
+    
+    # Submissions that failed have nothing to re-grade
+    job_ids = []
+    for job_id in batch["job_ids"]:
+        job = job_store.get(job_id)
+        if job is not None and job["status"] == "completed" and has_checkpoints(job_id):
+            job_ids.append(job_id)
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="No submission of this batch can be re-graded")
+    
+    reserved = _admit(len(job_ids) + 1, priority)
+    try:
+        answer_key_path, answer_key_hash = await _save_regrade_key(answer_key_file, f"uploads/{batch_id}")
+        
+        job_store.update(batch_id, status="queued", message="Batch re-grade has been queued", regrade=True)
+        for job_id in job_ids:
+            job_store.update(job_id, status="queued", message="Re-grade has been queued")
+        
+        background_tasks.add_task(
+            process_batch_regrade,
+            batch_id,
+            job_ids,
+            answer_key_path,
+            answer_key_hash,
+            priority,
+            reserved
+        )
+        # The coordinator holds the reservation until it has queued the jobs
+        reserved = 0
+    finally:
+        job_queue.release(reserved)
+    
+    return _build_batch_status(batch_id, job_store.get(batch_id))
+
+async def _save_regrade_key(answer_key_file: UploadFile, directory: str):
+    """Save a corrected answer key next to the job's uploads, returning (path, content hash)"""
+    import uuid
+    os.makedirs(directory, exist_ok=True)
+    answer_key_path = f"{directory}/answer_key-{uuid.uuid4().hex[:8]}.pdf"
+    
+    try:
+        return answer_key_path, await _save_upload(answer_key_file, answer_key_path)
+    except HTTPException:
+        if os.path.exists(answer_key_path):
+            os.remove(answer_key_path)
+        raise
+
+def _build_batch_status(batch_id: str, batch: Dict) -> BatchStatus:
+    """Collect the status of every submission in a batch"""
+    submissions = []
+    for job_id in batch["job_ids"]:
+        job = job_store.get(job_id) or {"status": "unknown"}
+        submissions.append(SubmissionStatus(
+            job_id=job_id,
+            filename=job.get("filename"),
+            status=job["status"],
+            message=job.get("message", None)
+        ))
+    
+    total = len(submissions)
+    completed = sum(1 for submission in submissions if submission.status == "completed")
+    failed = sum(1 for submission in submissions if submission.status == "failed")
+    
+    return BatchStatus(
+        batch_id=batch_id,
+        status=batch["status"],
+        message=batch.get("message", None),
+        total=total,
+        completed=completed,
+        failed=failed,
+        progress=(completed + failed) / total if total else 1.0,
+        submissions=submissions
+    )
+
+def _event_response(request: Request, job_ids: List[str]) -> StreamingResponse:
+    """Stream the progress events of the given jobs that still exist"""
+    job_ids = [job_id for job_id in job_ids if job_id in job_store]
+    
+    def snapshot() -> List[Dict]:
+        return [job_event(job_id, job_store.get(job_id) or {}) for job_id in job_ids]
+    
+    return StreamingResponse(
+        event_stream(progress_broker, job_ids, snapshot, request.is_disconnected, SSE_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _collect_spool():
+    """Copy the job records spool workers publish into the job store"""
+    import asyncio
+    
+    while True:
+        try:
+            _apply_spool_records()
+        except Exception as e:
+            logger.error(f"Error collecting spooled jobs: {str(e)}", exc_info=True)
+        await asyncio.sleep(SPOOL_POLL_SECONDS)
+
+def _apply_spool_records():
+    for record, finished, path in spool.collect():
+        job_id = record["job_id"]
+        job = job_store.get(job_id)
+        if job is None:
+            if finished:
+                spool.discard(path)
+            continue
+        
+        changes = {
+            name: record[name]
+            for name in ("status", "message", "result")
+            if record.get(name) is not None and record[name] != job.get(name)
+        }
+        if changes and job["status"] not in FINISHED_STATUSES:
+            job_store.update(job_id, **changes)
+        
+        if finished:
+            spool.discard(path)
+            if job.get("batch_id"):
+                _finish_spooled_batch(job["batch_id"])
+
+def _finish_spooled_batch(batch_id: str):
+    """Complete a spooled batch once all of its submissions have finished"""
+    batch = job_store.get(batch_id)
+    if batch is None or batch["status"] in FINISHED_STATUSES:
+        return
+    
+    jobs = [job_store.get(job_id) or {"status": "failed"} for job_id in batch["job_ids"]]
+    if any(job["status"] not in FINISHED_STATUSES for job in jobs):
+        return
+    
+    evaluated = sum(1 for job in jobs if job["status"] == "completed")
+    job_store.update(
+        batch_id,
+        status="completed",
+        message=f"{evaluated} of {len(jobs)} submissions evaluated successfully"
+    )
+    logger.info(f"Completed spooled batch {batch_id} with {len(jobs)} submissions")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Pipeline stage and page latencies and document counters, in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def process_batch_evaluation(
+    batch_id: str,
+    submissions: List,
+    answer_key_path: str,
+    answer_key_hash: Optional[str],
+    config: Optional[Dict],
+    priority: str = "bulk",
+    reserved: int = 0
+):
+    """
+    Coordinate a batch in the background: build (or load) the answer key index
+    once, then queue every submission. The work itself runs on the job queue
+    workers; this coroutine only waits for it. The queue room reserved for the
+    batch on admission is released once its jobs are queued.
+    """
+    import asyncio
+    
+    def batch_cancelled() -> bool:
+        return job_store.get(batch_id)["status"] == "cancelled"
+    
+    try:
+        # Cancelled before the coordinator got to run
+        if batch_cancelled():
+            return
+        job_store.update(batch_id, status="processing", message="Answer key processing started")
+        
+        # Index the shared answer key once
+        try:
+            answers = await job_queue.submit(
+                batch_id, pipeline_executor.run, load_answer_key, answer_key_path, answer_key_hash,
+                priority=priority, force=True
+            )
+        except asyncio.CancelledError:
+            if batch_cancelled():
+                return
+            raise
+        if batch_cancelled():
+            return
+        
+        job_store.update(batch_id, status="evaluating", message="Submissions are being evaluated")
+        
+        # Queue the submissions that weren't cancelled while the key was indexed
+        futures = [
+            job_queue.submit(
+                job_id, process_test_evaluation, job_id, test_path, None, config,
+                answers=answers, test_hash=test_hash,
+                priority=priority, force=True
+            )
+            for job_id, test_path, test_hash in submissions
+            if job_store.get(job_id)["status"] == "queued"
+        ]
+        job_queue.release(reserved)
+        reserved = 0
+        finished = 0
+        
+        def on_finished(future):
+            nonlocal finished
+            finished += 1
+            progress_broker.publish_progress(batch_id, "evaluating", "submissions", finished, len(futures))
+        
+        for future in futures:
+            future.add_done_callback(on_finished)
+        await asyncio.gather(*futures, return_exceptions=True)
+        
+        if batch_cancelled():
+            return
+        
+        evaluated = sum(1 for job_id, _, _ in submissions if job_store.get(job_id)["status"] == "completed")
+        job_store.update(
+            batch_id,
+            status="completed",
+            message=f"{evaluated} of {len(submissions)} submissions evaluated successfully"
+        )
+        
+        logger.info(f"Completed batch {batch_id} with {len(submissions)} submissions")
+    
+    except Exception as e:
+        logger.error(f"Error processing batch {batch_id}: {str(e)}", exc_info=True)
+        job_store.update(
+            batch_id,
+            status="failed",
+            message=f"Batch evaluation failed: {str(e)}"
+        )
+        
+        # Submissions that never started can't be evaluated without the key
+        for job_id, _, _ in submissions:
+            if job_store.get(job_id)["status"] == "queued":
+                job_store.update(job_id, status="failed", message=f"Evaluation failed: {str(e)}")
+    
+    finally:
+        job_queue.release(reserved)
+
 async def process_test_evaluation(
     job_id: str,
     test_path: str,
     answer_key_path: Optional[str],
-    config: Optional[Dict]
+    config: Optional[Dict],
+    answer_key: Optional[Dict] = None,
+    answers: Optional[AnswerKey] = None,
+    test_hash: Optional[str] = None,
+    answer_key_hash: Optional[str] = None
 ):
     """
-    Process the test evaluation in the background
+    Process the test evaluation in the background.
+    A batch passes the already built AnswerKey instead of a path.
+    Known content hashes of the uploads are passed on to the PDF content cache.
+    Every stage is timed into the /metrics histograms and the result's metrics breakdown.
+    A cancelled job stops at the next check_cancelled between stages.
     """
     try:
         import time
         start_time = time.time()
+        job_metrics = JobMetrics()
         
         # Update job status
-        evaluation_jobs[job_id] = {"status": "processing", "message": "PDF processing started"}
-        
-        # Initialize components
-        pdf_processor = PDFProcessor()
-        doc_engine = DocumentUnderstandingEngine()
-        question_classifier = QuestionClassifier()
-        answer_evaluator = AnswerEvaluationEngine()
-        scoring_engine = ScoringEngine()
-        report_generator = ReportGenerator()
-        
-        # Process PDF
-        logger.info(f"Processing PDF for job {job_id}")
-        pdf_content = pdf_processor.process(test_path)
-        
-        # Process answer key if provided
-        answer_key = None
+        job_store.update(job_id, status="processing", message="PDF processing started")
+        
+        # Index the answer key if provided (reusing the saved index of an identical key)
         if answer_key_path:
-            answer_key = pdf_processor.process(answer_key_path)
+            with job_metrics.stage("answer_key"):
+                answers = await pipeline_executor.run(load_answer_key, answer_key_path, answer_key_hash)
         
-        # Update status
-        evaluation_jobs[job_id]["status"] = "analyzing"
-        evaluation_jobs[job_id]["message"] = "Document analysis in progress"
+        job_queue.check_cancelled(job_id)
         
-        # Understand document structure
-        document_structure = doc_engine.analyze(pdf_content)
+        # Long documents stream through extraction, analysis and classification
+        # with a bounded page window; config {"streaming": true/false} overrides
+        streaming = (config or {}).get("streaming")
+        if streaming is None:
+            with job_metrics.stage("page_count"):
+                page_count = await pipeline_executor.run(count_pdf_pages, test_path)
+            streaming = page_count > STREAMING_PAGE_THRESHOLD
         
-        # Classify questions
-        questions = question_classifier.classify(document_structure)
+        if streaming:
+            logger.info(f"Streaming PDF for job {job_id}")
+            job_store.update(job_id, status="analyzing", message="Streaming document analysis in progress")
+            with job_metrics.stage("streaming"):
+                questions, page_stats = await pipeline_executor.run(stream_questions, test_path)
+            job_metrics.record_pages(page_stats)
+        else:
+            # Process PDF
+            logger.info(f"Processing PDF for job {job_id}")
+            with job_metrics.stage("extraction"):
+                pdf_content = await pipeline_executor.process_pdf(
+                    test_path, test_hash,
+                    on_progress=lambda done, total: progress_broker.publish_progress(
+                        job_id, "processing", "pages", done, total
+                    )
+                )
+            job_metrics.record_pages(pdf_content.page_stats(), extracted=not pdf_content.from_cache)
+            
+            # Update status
+            job_queue.check_cancelled(job_id)
+            job_store.update(job_id, status="analyzing", message="Document analysis in progress")
+            
+            # Understand document structure
+            with job_metrics.stage("analysis"):
+                document_structure = await pipeline_executor.run(analyze_document, pdf_content)
+            
+            # Classify questions
+            job_queue.check_cancelled(job_id)
+            with job_metrics.stage("classification"):
+                questions = await pipeline_executor.run(classify_questions, document_structure)
+        
+        # Checkpoint everything taken from the test PDF, so re-grades skip those stages
+        with job_metrics.stage("checkpoint"):
+            await pipeline_executor.run(save_checkpoint, job_id, "questions", questions)
         
         # Update status
-        evaluation_jobs[job_id]["status"] = "evaluating"
-        evaluation_jobs[job_id]["message"] = "Answer evaluation in progress"
+        job_queue.check_cancelled(job_id)
+        job_store.update(job_id, status="evaluating", message="Answer evaluation in progress")
         
         # Evaluate answers
-        evaluation_results = answer_evaluator.evaluate(questions, answer_key)
+        with job_metrics.stage("evaluation"):
+            evaluation_results = await pipeline_executor.run(evaluate_answers, questions, answer_key, answers)
+        job_metrics.record_questions(evaluation_results)
         
-        # Calculate scores
-        scoring_results = scoring_engine.calculate_scores(evaluation_results)
+        # Score essays with the LLM service; requests are shared with the other jobs in flight.
+        # Only essays with an extracted student answer are sent, which none have yet.
+        if essay_scorer is not None:
+            job_queue.check_cancelled(job_id)
+            with job_metrics.stage("essay_scoring"):
+                await essay_scorer.score_questions(
+                    evaluation_results,
+                    on_progress=lambda done, total: progress_broker.publish_progress(
+                        job_id, "evaluating", "questions", done, total
+                    )
+                )
+        
+        # Checkpoint the key and the evaluation, the starting point of a re-grade
+        with job_metrics.stage("checkpoint"):
+            answer_key_data = (answers if answers is not None else AnswerKey()).to_dict()
+            await pipeline_executor.run(save_checkpoint, job_id, "answer_key", answer_key_data)
+            await pipeline_executor.run(save_checkpoint, job_id, "evaluation", evaluation_results)
+        
+        # Calculate scores and generate the report
+        job_queue.check_cancelled(job_id)
+        result = _build_result(job_id, evaluation_results, job_metrics, start_time)
+        
+        # Update job status
+        job_store.update(
+            job_id,
+            status="completed",
+            message="Evaluation completed successfully",
+            result=result.dict()
+        )
         
-        # Generate report
+        JOBS.inc(status="completed")
+        logger.info(f"Completed evaluation for job {job_id} in {result.processing_time:.2f} seconds")
+    
+    except JobCancelledError:
+        JOBS.inc(status="cancelled")
+        logger.info(f"Cancelled evaluation for job {job_id}")
+        job_store.update(job_id, status="cancelled", message="Evaluation cancelled")
+    
+    except Exception as e:
+        JOBS.inc(status="failed")
+        logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
+        job_store.update(
+            job_id,
+            status="failed",
+            message=f"Evaluation failed: {str(e)}"
+        )
+
+def _build_result(job_id: str, evaluation_results: List[Dict], job_metrics: JobMetrics,
+                  start_time: float) -> TestEvaluationResult:
+    """Score the evaluated questions and build the job result"""
+    import time
+    
+    # Calculate scores
+    with job_metrics.stage("scoring"):
+        scoring_results = scoring_engine.calculate_scores(evaluation_results)
+    
+    # Generate report
+    with job_metrics.stage("report"):
         report = report_generator.generate(scoring_results)
+    
+    # Calculate processing time
+    processing_time = time.time() - start_time
+    
+    # Prepare result
+    return TestEvaluationResult(
+        job_id=job_id,
+        test_id=f"TEST-{job_id[:8]}",
+        total_score=scoring_results["total_score"],
+        max_possible_score=scoring_results["max_possible_score"],
+        percentage=scoring_results["percentage"],
+        question_scores=[
+            QuestionScore(
+                question_id=q["id"],
+                question_text=q["text"][:100] + "..." if len(q["text"]) > 100 else q["text"],
+                question_type=q["type"],
+                max_score=q["max_score"],
+                awarded_score=q["awarded_score"],
+                confidence=q["confidence"],
+                feedback=q.get("feedback", None)
+            )
+            for q in scoring_results["questions"]
+        ],
+        evaluation_summary=report["summary"],
+        processing_time=processing_time,
+        metrics=job_metrics.breakdown()
+    )
+
+async def process_regrade(
+    job_id: str,
+    answer_key_path: Optional[str] = None,
+    answer_key_hash: Optional[str] = None,
+    answers: Optional[AnswerKey] = None
+):
+    """
+    Re-grade a completed job from its checkpoints against a new answer key.
+    A batch passes the already built AnswerKey instead of a path.
+    Only questions whose answer changed are evaluated and essay-scored again;
+    scoring and the report are redone for the whole test. If the re-grade
+    fails or is cancelled, the previous result stands.
+    """
+    try:
+        import time
+        start_time = time.time()
+        job_metrics = JobMetrics()
         
-        # Calculate processing time
-        processing_time = time.time() - start_time
+        job_store.update(job_id, status="evaluating", message="Re-grading against the updated answer key")
         
-        # Prepare result
-        result = TestEvaluationResult(
-            job_id=job_id,
-            test_id=f"TEST-{job_id[:8]}",
-            total_score=scoring_results["total_score"],
-            max_possible_score=scoring_results["max_possible_score"],
-            percentage=scoring_results["percentage"],
-            question_scores=[
-                QuestionScore(
-                    question_id=q["id"],
-                    question_text=q["text"][:100] + "..." if len(q["text"]) > 100 else q["text"],
-                    question_type=q["type"],
-                    max_score=q["max_score"],
-                    awarded_score=q["awarded_score"],
-                    confidence=q["confidence"],
-                    feedback=q.get("feedback", None)
-                )
-                for q in scoring_results["questions"]
-            ],
-            evaluation_summary=report["summary"],
-            processing_time=processing_time
+        # Index the new answer key (reusing the saved index of an identical key)
+        if answer_key_path:
+            with job_metrics.stage("answer_key"):
+                answers = await pipeline_executor.run(load_answer_key, answer_key_path, answer_key_hash)
+        
+        # Evaluate the questions whose answer changed
+        job_queue.check_cancelled(job_id)
+        with job_metrics.stage("evaluation"):
+            evaluation_results, reevaluated_ids = await pipeline_executor.run(regrade_answers, job_id, answers)
+        reevaluated_ids = set(reevaluated_ids)
+        reevaluated = [question for question in evaluation_results if question["id"] in reevaluated_ids]
+        job_metrics.record_questions(reevaluated)
+        
+        if essay_scorer is not None and reevaluated:
+            job_queue.check_cancelled(job_id)
+            with job_metrics.stage("essay_scoring"):
+                await essay_scorer.score_questions(reevaluated)
+        
+        # The new key and evaluation are the starting point of the next re-grade
+        with job_metrics.stage("checkpoint"):
+            await pipeline_executor.run(save_checkpoint, job_id, "answer_key", answers.to_dict())
+            await pipeline_executor.run(save_checkpoint, job_id, "evaluation", evaluation_results)
+        
+        # Calculate scores and generate the report
+        job_queue.check_cancelled(job_id)
+        result = _build_result(job_id, evaluation_results, job_metrics, start_time)
+        
+        # The result no longer belongs to the originally uploaded key, so
+        # identical uploads must not attach to this job any more
+        job_store.update(
+            job_id,
+            status="completed",
+            message=f"Re-graded {len(reevaluated)} changed questions",
+            result=result.dict(),
+            content_hash=None
         )
         
-        # Update job status
-        evaluation_jobs[job_id] = {
-            "status": "completed",
-            "message": "Evaluation completed successfully",
-            "result": result
-        }
+        logger.info(f"Re-graded {len(reevaluated)} questions of job {job_id} in {result.processing_time:.2f} seconds")
+    
+    except JobCancelledError:
+        logger.info(f"Cancelled re-grade of job {job_id}")
+        job_store.update(job_id, status="completed", message="Re-grade cancelled, the previous result stands")
+    
+    except Exception as e:
+        logger.error(f"Error re-grading job {job_id}: {str(e)}", exc_info=True)
+        job_store.update(
+            job_id,
+            status="completed",
+            message=f"Re-grade failed, the previous result stands: {str(e)}"
+        )
+
+async def process_batch_regrade(
+    batch_id: str,
+    job_ids: List[str],
+    answer_key_path: str,
+    answer_key_hash: Optional[str],
+    priority: str = "normal",
+    reserved: int = 0
+):
+    """
+    Coordinate a batch re-grade: index the new key once, then queue a re-grade
+    per submission, releasing the queue room reserved for them on admission
+    """
+    import asyncio
+    
+    def regrade_cancelled() -> bool:
+        return job_store.get(batch_id)["status"] in FINISHED_STATUSES
+    
+    try:
+        if regrade_cancelled():
+            return
+        job_store.update(batch_id, status="processing", message="Updated answer key processing started")
+        
+        try:
+            answers = await job_queue.submit(
+                batch_id, pipeline_executor.run, load_answer_key, answer_key_path, answer_key_hash,
+                priority=priority, force=True
+            )
+        except asyncio.CancelledError:
+            if regrade_cancelled():
+                return
+            raise
+        if regrade_cancelled():
+            return
+        
+        job_store.update(batch_id, status="evaluating", message="Submissions are being re-graded")
+        
+        futures = [
+            job_queue.submit(job_id, process_regrade, job_id, answers=answers, priority=priority, force=True)
+            for job_id in job_ids
+            if job_store.get(job_id)["status"] == "queued"
+        ]
+        job_queue.release(reserved)
+        reserved = 0
+        await asyncio.gather(*futures, return_exceptions=True)
         
-        logger.info(f"Completed evaluation for job {job_id} in {processing_time:.2f} seconds")
+        if regrade_cancelled():
+            return
         
+        job_store.update(
+            batch_id,
+            status="completed",
+            message=f"{len(futures)} submissions re-graded against the updated answer key"
+        )
+    
     except Exception as e:
-        logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
-        evaluation_jobs[job_id] = {
-            "status": "failed",
-            "message": f"Evaluation failed: {str(e)}"
-        }
+        logger.error(f"Error re-grading batch {batch_id}: {str(e)}", exc_info=True)
+        job_store.update(
+            batch_id,
+            status="completed",
+            message=f"Batch re-grade failed, the previous results stand: {str(e)}"
+        )
+        
+        # Submissions that never started keep their previous results
+        for job_id in job_ids:
+            if job_store.get(job_id)["status"] == "queued":
+                job_store.update(job_id, status="completed", message="Re-grade failed, the previous result stands")
+    
+    finally:
+        job_queue.release(reserved)
 
 if __name__ == "__main__":
     # Create upload directory
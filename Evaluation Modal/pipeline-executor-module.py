@@ -0,0 +1,406 @@
+# modules/pipeline_executor.py
+"""
+Pipeline Executor
+Runs the CPU-bound evaluation stages in a process pool so the API event loop stays responsive
+"""
+import os
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from modules.pdf_processor import PDFProcessor
+from modules.document_understanding import DocumentUnderstandingEngine
+from modules.question_classifier import QuestionClassifier
+from modules.answer_evaluator import AnswerEvaluationEngine
+from modules.pdf_cache import create_pdf_cache, hash_file
+from modules.answer_key import AnswerKey, create_answer_key_store, normalize_question_id
+from modules.checkpoints import create_checkpoint_store
+from modules.document_model import Document
+from modules.streaming_pipeline import StreamingPipeline
+
+logger = logging.getLogger(__name__)
+
+def default_pages_per_task() -> int:
+    """
+    Pages per parallel extraction task, read from PDF_PAGES_PER_TASK.
+    Documents with at most this many pages are extracted by a single worker.
+    """
+    return max(1, int(os.environ.get("PDF_PAGES_PER_TASK", 8)))
+
+def default_worker_count() -> int:
+    """
+    Number of worker processes to use for the pipeline stages.
+    Read from EVALUATION_WORKERS, defaulting to one worker per CPU core.
+    A value of 0 runs the stages in the event loop's thread pool instead.
+    """
+    value = os.environ.get("EVALUATION_WORKERS")
+    if value is not None and value.strip() != "":
+        return max(0, int(value))
+    
+    return os.cpu_count() or 1
+
+# Per-process PDF content cache, created lazily inside each worker
+_pdf_cache = None
+_pdf_cache_initialized = False
+
+def _get_pdf_cache():
+    global _pdf_cache, _pdf_cache_initialized
+    if not _pdf_cache_initialized:
+        _pdf_cache = create_pdf_cache()
+        _pdf_cache_initialized = True
+    return _pdf_cache
+
+# Per-process store of built answer keys, created lazily inside each worker
+_answer_key_store = None
+_answer_key_store_initialized = False
+
+def _get_answer_key_store():
+    global _answer_key_store, _answer_key_store_initialized
+    if not _answer_key_store_initialized:
+        _answer_key_store = create_answer_key_store()
+        _answer_key_store_initialized = True
+    return _answer_key_store
+
+# Per-process store of job stage checkpoints, created lazily inside each worker
+_checkpoint_store = None
+_checkpoint_store_initialized = False
+
+def _get_checkpoint_store():
+    global _checkpoint_store, _checkpoint_store_initialized
+    if not _checkpoint_store_initialized:
+        _checkpoint_store = create_checkpoint_store()
+        _checkpoint_store_initialized = True
+    return _checkpoint_store
+
+class PipelineComponents:
+    """The pipeline engines, built once and reused for every job a worker runs"""
+    
+    def __init__(self):
+        self.pdf_processor = PDFProcessor()
+        self.doc_engine = DocumentUnderstandingEngine()
+        self.question_classifier = QuestionClassifier()
+        self.answer_evaluator = AnswerEvaluationEngine(
+            tokenizer=os.environ.get("ANSWER_TOKENIZER", "nltk")
+        )
+
+# Worker processes run one stage at a time, so one set of components per
+# process is safe; thread-local storage keeps the in-thread mode safe too
+_local = threading.local()
+
+def get_components() -> PipelineComponents:
+    """Get this worker's components, building them on first use"""
+    components = getattr(_local, "components", None)
+    if components is None:
+        components = PipelineComponents()
+        _local.components = components
+    return components
+
+def warm_up():
+    """
+    Build the components and push a tiny document through every stage, so
+    lazy model loading (punkt, WordNet, ...) happens before the first real job
+    """
+    components = get_components()
+    
+    try:
+        import fitz
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "warmup.pdf")
+            
+            document = fitz.open()
+            page = document.new_page()
+            page.insert_text((72, 72), "1. Explain the process of photosynthesis in plants.")
+            page.insert_text((72, 100), "2. True or False: Water boils at 100 degrees Celsius.")
+            document.save(pdf_path)
+            document.close()
+            
+            pdf_content = components.pdf_processor.process(pdf_path)
+            document_structure = components.doc_engine.analyze(pdf_content)
+            questions = components.question_classifier.classify(document_structure)
+            components.answer_evaluator.evaluate(questions, answers={
+                "question-1": "Plants convert light energy into chemical energy stored in glucose.",
+                "question-2": "true"
+            })
+    except Exception as e:
+        # Warm-up is best effort; real jobs will still load everything lazily
+        logger.warning(f"Pipeline warm-up failed: {str(e)}")
+    
+    logger.info(f"Pipeline worker {os.getpid()} is warm")
+
+def _ping() -> int:
+    """No-op task used to make the pool start its worker processes"""
+    return os.getpid()
+
+# Stage functions - these run inside the worker processes, so they must be
+# module-level (picklable) and only take/return plain data
+
+def extract_document(pdf_path: str, content_hash: Optional[str] = None) -> Document:
+    """
+    Extract the structured content of a PDF as a compact Document, the form
+    sent back from worker processes, reusing cached output for identical files
+    """
+    pdf_processor = get_components().pdf_processor
+    
+    cache = _get_pdf_cache()
+    if cache is not None:
+        content_hash = content_hash or hash_file(pdf_path)
+        document = _get_cached_document(cache, content_hash)
+        if document is not None:
+            logger.info(f"PDF content cache hit for {pdf_path}")
+            return document
+    
+    document = PDFProcessor.merge_page_ranges([pdf_processor.process_pages(pdf_path, compact=True)], compact=True)
+    if cache is not None:
+        cache.put(content_hash, document.to_pdf_content())
+    return document
+
+def get_cached_pdf_content(pdf_path: str, content_hash: Optional[str] = None) -> Tuple[str, Optional[Document]]:
+    """Look a PDF up in the content cache, returning (content hash, cached Document or None)"""
+    cache = _get_pdf_cache()
+    content_hash = content_hash or hash_file(pdf_path)
+    if cache is None:
+        return content_hash, None
+    
+    return content_hash, _get_cached_document(cache, content_hash)
+
+def _get_cached_document(cache, content_hash: str) -> Optional[Document]:
+    """
+    The cached content of a PDF hash as a Document, or None on a miss. An
+    entry that doesn't convert (e.g. one missing page fields) is discarded,
+    so the PDF is extracted again instead of failing on every submission.
+    """
+    pdf_content = cache.get(content_hash)
+    if pdf_content is None:
+        return None
+    
+    try:
+        document = Document.from_pdf_content(pdf_content)
+    except Exception as e:
+        logger.warning(f"Discarding PDF content cache entry {content_hash}: {str(e)}")
+        cache.discard(content_hash)
+        return None
+    document.from_cache = True
+    return document
+
+def store_pdf_content(content_hash: str, document: Document):
+    """Store an extracted Document in the content cache, in the pdf_content shape"""
+    cache = _get_pdf_cache()
+    if cache is not None:
+        cache.put(content_hash, document.to_pdf_content())
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Get the page count of a PDF"""
+    return get_components().pdf_processor.page_count(pdf_path)
+
+def process_pdf_pages(pdf_path: str, start: int, end: int) -> Dict:
+    """Extract one page range of a PDF into compact pages (the worker opens the document by path)"""
+    return get_components().pdf_processor.process_pages(pdf_path, start, end, compact=True)
+
+def stream_questions(pdf_path: str, window_size: int = 2) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Extract, detect and classify questions page by page, holding only a
+    small window of pages in memory (for very long documents)
+    
+    Returns:
+        (classified questions, per-page extraction stats)
+    """
+    components = get_components()
+    pipeline = StreamingPipeline(
+        components.pdf_processor,
+        components.doc_engine,
+        components.question_classifier,
+        window_size=window_size
+    )
+    return pipeline.run(pdf_path), pipeline.page_stats
+
+def analyze_document(pdf_content: Union[Dict, Document]) -> Dict:
+    """
+    Identify the document structure and questions. The engine's structure
+    detection reads the pdf_content dict shape, so a Document is expanded
+    here, inside the worker; only the compact form crosses the process boundary.
+    """
+    if isinstance(pdf_content, Document):
+        pdf_content = pdf_content.to_pdf_content()
+    return get_components().doc_engine.analyze(pdf_content)
+
+def classify_questions(document_structure: Dict) -> List[Dict]:
+    """Classify the identified questions"""
+    return get_components().question_classifier.classify(document_structure)
+
+def extract_answers(answer_key: Union[Dict, Document], content_hash: Optional[str] = None) -> AnswerKey:
+    """Build the AnswerKey of a processed answer key"""
+    return get_components().answer_evaluator.extract_answers(answer_key, content_hash)
+
+def load_answer_key(answer_key_path: str, content_hash: Optional[str] = None) -> AnswerKey:
+    """
+    Get the AnswerKey of an answer-key PDF, loading the saved one for an
+    identical file, or processing the PDF and saving the result otherwise
+    """
+    store = _get_answer_key_store()
+    content_hash = content_hash or hash_file(answer_key_path)
+    
+    if store is not None:
+        answer_key = store.get(content_hash)
+        if answer_key is not None:
+            logger.info(f"Answer key {answer_key.version} loaded for {answer_key_path}")
+            return answer_key
+    
+    answer_key = extract_answers(extract_document(answer_key_path, content_hash), content_hash)
+    if store is not None:
+        store.put(answer_key)
+    
+    logger.info(f"Answer key {answer_key.version} built for {answer_key_path}")
+    return answer_key
+
+def evaluate_answers(questions: List[Dict], answer_key: Optional[Dict],
+                     answers: Optional[AnswerKey] = None) -> List[Dict]:
+    """Evaluate the classified questions against the answer key"""
+    return get_components().answer_evaluator.evaluate(questions, answer_key, answers)
+
+def save_checkpoint(job_id: str, stage: str, data: Any):
+    """Checkpoint the output of a job stage (a no-op with checkpoints disabled)"""
+    store = _get_checkpoint_store()
+    if store is not None:
+        store.save(job_id, stage, data)
+
+def load_checkpoint(job_id: str, stage: str) -> Optional[Any]:
+    """Get the checkpointed output of a job stage, or None"""
+    store = _get_checkpoint_store()
+    return store.load(job_id, stage) if store is not None else None
+
+def has_checkpoints(job_id: str) -> bool:
+    """Whether a job has everything a re-grade needs"""
+    store = _get_checkpoint_store()
+    return store is not None and all(
+        store.has(job_id, stage) for stage in ("questions", "answer_key", "evaluation")
+    )
+
+def regrade_answers(job_id: str, answers: AnswerKey) -> Tuple[List[Dict], List[str]]:
+    """
+    Re-evaluate a job against a new answer key from its checkpoints,
+    rerunning the evaluation only for the questions whose answer changed.
+    A key checkpointed in an older answer key format can't be compared, so
+    every question is evaluated again.
+    
+    Returns:
+        (all evaluated questions, ids of the re-evaluated questions)
+    """
+    store = _get_checkpoint_store()
+    questions = store.load(job_id, "questions")
+    previous = store.load(job_id, "evaluation")
+    stored_key = store.load(job_id, "answer_key")
+    
+    if stored_key.get("format_version") == AnswerKey.FORMAT_VERSION:
+        changed = AnswerKey.from_dict(stored_key).changed_questions(answers)
+        to_evaluate = [question for question in questions if normalize_question_id(question["id"]) in changed]
+    else:
+        logger.info(f"Answer key checkpoint of job {job_id} has an old format, re-evaluating every question")
+        to_evaluate = questions
+    logger.info(f"Re-grading {len(to_evaluate)} of {len(questions)} questions of job {job_id}")
+    
+    reevaluated = {}
+    if to_evaluate:
+        for question in evaluate_answers(to_evaluate, None, answers):
+            reevaluated[question["id"]] = question
+    
+    return [reevaluated.get(question["id"], question) for question in previous], list(reevaluated)
+
+class PipelineExecutor:
+    def __init__(self, max_workers: Optional[int] = None, warm: bool = True,
+                 pages_per_task: Optional[int] = None):
+        self.max_workers = default_worker_count() if max_workers is None else max_workers
+        self.warm = warm
+        self.pages_per_task = pages_per_task or default_pages_per_task()
+        self._pool = None
+    
+    def start(self):
+        """Start the worker processes, warming each one as it starts"""
+        if self._pool is not None or self.max_workers == 0:
+            return
+        
+        logger.info(f"Starting pipeline executor with {self.max_workers} worker processes")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=warm_up if self.warm else None
+        )
+        
+        # Workers are spawned on demand; submit one no-op per worker so they
+        # all start (and warm up) now rather than on the first real request
+        for _ in range(self.max_workers):
+            self._pool.submit(_ping)
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes"""
+        if self._pool is None:
+            return
+        
+        logger.info("Shutting down pipeline executor")
+        self._pool.shutdown(wait=wait)
+        self._pool = None
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a pipeline stage without blocking the event loop
+        
+        Args:
+            func: Module-level stage function to execute
+            *args, **kwargs: Arguments passed to the stage
+        
+        Returns:
+            The stage result
+        """
+        if self._pool is None and self.max_workers > 0:
+            self.start()
+        
+        # With no pool (max_workers == 0) this falls back to the default thread pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(func, *args, **kwargs))
+    
+    async def process_pdf(self, pdf_path: str, content_hash: Optional[str] = None,
+                          on_progress: Optional[Callable[[int, int], None]] = None) -> Document:
+        """
+        Extract a PDF, spreading page ranges over the workers for long documents.
+        Each worker opens the document by path; the ranges are merged back in page order.
+        on_progress(pages done, page count) is called as each range finishes.
+        
+        The content comes back as a compact Document, which is what crosses the
+        process boundary; to_pdf_content gives the pdf_content dict.
+        """
+        if self.max_workers <= 1:
+            return await self.run(extract_document, pdf_path, content_hash)
+        
+        content_hash, document = await self.run(get_cached_pdf_content, pdf_path, content_hash)
+        if document is not None:
+            logger.info(f"PDF content cache hit for {pdf_path}")
+            return document
+        
+        page_count = await self.run(count_pdf_pages, pdf_path)
+        if page_count <= self.pages_per_task:
+            return await self.run(extract_document, pdf_path, content_hash)
+        
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        logger.info(f"Extracting {page_count} pages of {pdf_path} in {len(ranges)} parallel ranges")
+        
+        pages_done = 0
+        
+        async def extract_range(start: int, end: int) -> Dict:
+            nonlocal pages_done
+            part = await self.run(process_pdf_pages, pdf_path, start, end)
+            pages_done += end - start
+            if on_progress is not None:
+                on_progress(pages_done, page_count)
+            return part
+        
+        parts = await asyncio.gather(*(extract_range(start, end) for start, end in ranges))
+        document = PDFProcessor.merge_page_ranges(parts, compact=True)
+        
+        await self.run(store_pdf_content, content_hash, document)
+        return document
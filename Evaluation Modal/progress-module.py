@@ -0,0 +1,172 @@
+# modules/progress.py
+"""
+Job Progress Events
+Pushes job stage transitions and page/question progress to Server-Sent Events subscribers
+"""
+import json
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+from modules.job_store import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Overall progress at the start of each stage; a stage's own progress moves
+# the job from its value towards the next stage's value
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "processing": 0.05,
+    "analyzing": 0.4,
+    "evaluating": 0.7,
+    "completed": 1.0,
+    "failed": 1.0,
+    "cancelled": 1.0
+}
+STAGE_ORDER = ["queued", "processing", "analyzing", "evaluating", "completed"]
+
+def stage_progress(status: str, fraction: float = 0.0) -> Optional[float]:
+    """Overall progress of a job that is fraction of the way through a stage"""
+    start = STAGE_PROGRESS.get(status)
+    if start is None:
+        return None
+    if status not in STAGE_ORDER[:-1]:
+        return start
+    end = STAGE_PROGRESS[STAGE_ORDER[STAGE_ORDER.index(status) + 1]]
+    return round(start + (end - start) * min(max(fraction, 0.0), 1.0), 4)
+
+def job_event(job_id: str, fields: Dict) -> Dict:
+    """The progress event for a job record or a set of changed job fields"""
+    event = {"job_id": job_id}
+    for name in ("status", "message", "stage", "done", "total"):
+        if fields.get(name) is not None:
+            event[name] = fields[name]
+    
+    progress = fields.get("progress")
+    if progress is None and "status" in fields:
+        progress = stage_progress(fields["status"])
+    if progress is not None:
+        event["progress"] = progress
+    return event
+
+def format_sse(event: Dict, event_type: str = "progress") -> str:
+    """Encode an event as a Server-Sent Events message"""
+    return f"event: {event_type}\ndata: {json.dumps(event, default=str)}\n\n"
+
+class ProgressBroker:
+    """
+    Fans job progress events out to subscribers in the API process.
+    
+    Stage transitions arrive through on_job_update, registered as a job store
+    listener; finer progress within a stage is published directly. Every
+    subscriber gets a bounded queue, and a subscriber that falls behind loses
+    its oldest events rather than holding up the pipeline.
+    """
+    
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._loop = None
+    
+    @contextmanager
+    def subscribe(self, job_ids: Iterable[str]) -> Iterator[asyncio.Queue]:
+        """Receive the events of all the given jobs on one queue"""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        job_ids = list(job_ids)
+        
+        with self._lock:
+            for job_id in job_ids:
+                self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                for job_id in job_ids:
+                    queues = self._subscribers.get(job_id)
+                    if queues is not None:
+                        queues.discard(queue)
+                        if not queues:
+                            del self._subscribers[job_id]
+    
+    def publish(self, job_id: str, event: Dict):
+        """Send an event to the subscribers of a job; safe to call from any thread"""
+        with self._lock:
+            queues = list(self._subscribers.get(job_id, ()))
+        if not queues or self._loop is None:
+            return
+        
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        
+        for queue in queues:
+            if in_loop:
+                self._put(queue, event)
+            else:
+                self._loop.call_soon_threadsafe(self._put, queue, event)
+    
+    def publish_progress(self, job_id: str, status: str, stage: str, done: int, total: int):
+        """Publish how far a job is through the work of its current stage"""
+        fraction = done / total if total else 1.0
+        self.publish(job_id, job_event(job_id, {
+            "status": status,
+            "stage": stage,
+            "done": done,
+            "total": total,
+            "progress": stage_progress(status, fraction)
+        }))
+    
+    def on_job_update(self, job_id: str, fields: Dict):
+        """Job store listener publishing status changes"""
+        if "status" in fields or "message" in fields:
+            self.publish(job_id, job_event(job_id, fields))
+    
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: Dict):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+async def event_stream(broker: ProgressBroker, job_ids: List[str], snapshot: Callable[[], List[Dict]],
+                       is_disconnected: Callable[[], Awaitable[bool]],
+                       heartbeat: float = 15.0) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for a set of jobs
+    
+    Args:
+        broker: Broker to subscribe to
+        job_ids: Jobs to follow on this connection
+        snapshot: Returns the current event of each job, sent first
+        is_disconnected: Coroutine telling whether the client has gone away
+        heartbeat: Seconds of silence before a keep-alive comment is sent
+    
+    Yields:
+        SSE messages until every job has finished or the client disconnects
+    """
+    # Subscribe before taking the snapshot so no transition falls in between
+    with broker.subscribe(job_ids) as queue:
+        pending = set(job_ids)
+        for event in snapshot():
+            yield format_sse(event)
+            if event.get("status") in FINISHED_STATUSES:
+                pending.discard(event["job_id"])
+        
+        while pending:
+            if await is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            
+            yield format_sse(event)
+            if event.get("status") in FINISHED_STATUSES and "stage" not in event:
+                pending.discard(event["job_id"])
+        
+        yield format_sse({"job_ids": job_ids}, event_type="end")
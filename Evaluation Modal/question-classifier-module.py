@@ -1,5 +1,11 @@
 def _extract_matching_features(self, question: Dict) -> Dict:
         """Extract features specific to matching questions"""
+        from modules.rule_engine import get_rule_engine
+        
+        # Only walk the lines when the matching-columns rule fired somewhere in the text
+        if "matching" not in get_rule_engine().fired_rules(question):
+            return question
+        
         text = question["text"]
         
         # Try to extract columns to match
@@ -32,16 +38,21 @@ def _extract_matching_features(self, question: Dict) -> Dict:
     
     def _extract_mathematical_features(self, question: Dict) -> Dict:
         """Extract features specific to mathematical questions"""
+        from modules.rule_engine import get_rule_engine
+        
         text = question["text"]
+        fired = get_rule_engine().fired_rules(question).get("mathematical", [])
         
         # Identify mathematical expressions
-        math_expressions = re.findall(r'\$(.+?)\$', text)
+        math_expressions = re.findall(r'\$(.+?)\$', text) if "math_expression" in fired else []
         if math_expressions:
             question["math_expressions"] = math_expressions
         
-        # Identify units if present
-        units_pattern = r'in\s+(\w+)$|express\s+in\s+(\w+)'
-        units_match = re.search(units_pattern, text.lower())
+        # Identify units if present; unit symbols are case-sensitive (kN, Pa) and may be
+        # compound (m/s, kilometers per hour), so the whole expression is kept as written
+        unit = r'[^\s?.,;]+(?:\s+per\s+[^\s?.,;]+)*'
+        units_pattern = rf'express\s+in\s+({unit})|\bin\s+({unit})[?.]?$'
+        units_match = re.search(units_pattern, text.strip(), re.IGNORECASE) if "required_units" in fired else None
         if units_match:
             units = units_match.group(1) or units_match.group(2)
             question["required_units"] = units
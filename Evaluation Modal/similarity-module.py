@@ -0,0 +1,159 @@
+# modules/similarity.py
+"""
+Text Similarity Engine
+Batched TF-IDF similarity between student answers and answer-key references
+"""
+import hashlib
+import logging
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+from sklearn.feature_extraction.text import TfidfVectorizer
+from difflib import SequenceMatcher
+
+logger = logging.getLogger(__name__)
+
+class TfidfSimilarityEngine:
+    """
+    Fits the TF-IDF vocabulary and IDF weights once on the answer-key corpus
+    of a test and keeps the (L2-normalized) reference vectors. Student answers
+    are then scored with a single transform and a row-wise sparse dot product.
+    """
+    
+    def __init__(self, tokenizer: Optional[Callable[[str], List[str]]] = None, short_text_length: int = 50):
+        self.tokenizer = tokenizer
+        self.short_text_length = short_text_length
+        self.vectorizer = None
+        self.question_ids = []
+        self.reference_texts = []
+        self.reference_vectors = None
+        self._index = {}
+        self._fingerprint = None
+    
+    @staticmethod
+    def _corpus_fingerprint(references: Dict[str, str]) -> str:
+        digest = hashlib.sha256()
+        for question_id in sorted(references):
+            digest.update(question_id.encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(str(references[question_id]).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def fit(self, references: Dict[str, str],
+            reference_tokens: Optional[Dict[str, List[str]]] = None) -> "TfidfSimilarityEngine":
+        """
+        Fit on the reference answers of a test
+        
+        Args:
+            references: Mapping of question id to answer-key text
+            reference_tokens: Optional already tokenized references (e.g. from a
+                              saved AnswerKey), used instead of tokenizing them again
+        """
+        references = {question_id: str(text) for question_id, text in references.items() if text}
+        
+        # Refitting on the same key (e.g. every submission of a batch) is a no-op
+        fingerprint = self._corpus_fingerprint(references)
+        if fingerprint == self._fingerprint:
+            return self
+        
+        self.question_ids = list(references)
+        self.reference_texts = [references[question_id] for question_id in self.question_ids]
+        self._index = {question_id: i for i, question_id in enumerate(self.question_ids)}
+        self._fingerprint = fingerprint
+        
+        tokenizer = self.tokenizer
+        if reference_tokens and tokenizer is not None:
+            known_tokens = {
+                references[question_id]: tokens
+                for question_id, tokens in reference_tokens.items() if question_id in references
+            }
+            base_tokenizer = tokenizer
+            tokenizer = lambda text: known_tokens[text] if text in known_tokens else base_tokenizer(text)
+        
+        vectorizer = TfidfVectorizer(tokenizer=tokenizer, stop_words='english')
+        try:
+            self.reference_vectors = vectorizer.fit_transform(self.reference_texts).tocsr()
+            self.vectorizer = vectorizer
+        except ValueError:
+            # Empty vocabulary (no key, or only stopwords) - fall back to sequence matching
+            logger.warning("Answer key has no usable vocabulary for TF-IDF similarity")
+            self.reference_vectors = None
+            self.vectorizer = None
+        
+        return self
+    
+    @property
+    def is_fitted(self) -> bool:
+        return self.vectorizer is not None
+    
+    def score(self, question_ids: Sequence[str], answers: Sequence[str]) -> np.ndarray:
+        """
+        Score (question id, student answer) pairs against the fitted references
+        
+        Args:
+            question_ids: Question id of each pair
+            answers: Student answer text of each pair
+        
+        Returns:
+            Array of similarities in [0, 1], NaN where the question has no reference
+        """
+        n = len(answers)
+        similarities = np.full(n, np.nan)
+        if n == 0:
+            return similarities
+        
+        rows = np.fromiter((self._index.get(question_id, -1) for question_id in question_ids), dtype=np.intp, count=n)
+        known = rows >= 0
+        texts = [str(answer or "") for answer in answers]
+        
+        # Short pairs keep the character-level comparison used for single pairs
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.intp, count=n)
+        reference_lengths = np.array([len(self.reference_texts[row]) if row >= 0 else 0 for row in rows], dtype=np.intp)
+        short = known & (lengths < self.short_text_length) & (reference_lengths < self.short_text_length)
+        
+        tfidf = known & ~short
+        if not self.is_fitted:
+            short = known
+            tfidf = np.zeros(n, dtype=bool)
+        
+        if tfidf.any():
+            selected = np.flatnonzero(tfidf)
+            student_vectors = self.vectorizer.transform([texts[i] for i in selected])
+            reference_vectors = self.reference_vectors[rows[selected]]
+            # Both sides are L2-normalized, so the row-wise dot product is the cosine
+            similarities[selected] = np.asarray(student_vectors.multiply(reference_vectors).sum(axis=1)).ravel()
+        
+        for i in np.flatnonzero(short):
+            similarities[i] = SequenceMatcher(
+                None, texts[i].lower(), self.reference_texts[rows[i]].lower()
+            ).ratio()
+        
+        return similarities
+    
+    def score_matrix(self, student_answers: Sequence[Dict[str, str]]) -> np.ndarray:
+        """
+        Score a whole class against every fitted question at once
+        
+        Args:
+            student_answers: One mapping of question id to answer text per student
+        
+        Returns:
+            Array of shape (students, questions) ordered like self.question_ids,
+            NaN where a student gave no answer
+        """
+        pair_students = []
+        pair_questions = []
+        pair_answers = []
+        for student, answers in enumerate(student_answers):
+            for question_id, answer in answers.items():
+                if question_id in self._index and answer:
+                    pair_students.append(student)
+                    pair_questions.append(question_id)
+                    pair_answers.append(answer)
+        
+        matrix = np.full((len(student_answers), len(self.question_ids)), np.nan)
+        if pair_answers:
+            columns = np.fromiter((self._index[question_id] for question_id in pair_questions), dtype=np.intp)
+            matrix[np.asarray(pair_students, dtype=np.intp), columns] = self.score(pair_questions, pair_answers)
+        
+        return matrix
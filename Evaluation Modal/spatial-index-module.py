@@ -0,0 +1,89 @@
+# modules/spatial_index.py
+"""
+Spatial Index
+Per-page index of text blocks sorted by vertical position, for region lookups around questions
+"""
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from modules.document_model import Document, TextBlocks
+
+class TextBlockIndex:
+    """
+    Text blocks of one page sorted by their top edge, so "blocks below / near
+    this bbox" queries are a binary search plus a scan of only the matching
+    blocks. The bounding boxes are held in one NumPy array; blocks are given
+    as text block dicts (which lookups then yield) or as compact TextBlocks.
+    """
+    
+    def __init__(self, text_blocks: Union[List[Dict], TextBlocks]):
+        if isinstance(text_blocks, TextBlocks):
+            self._dicts = None
+        else:
+            self._dicts = text_blocks
+            text_blocks = TextBlocks.from_dicts(text_blocks)
+        self.text_blocks = text_blocks
+        
+        self._order = np.argsort(text_blocks.bboxes[:, 1], kind="stable")
+        self._bboxes = text_blocks.bboxes[self._order]
+        self._tops = self._bboxes[:, 1]
+        self._max_height = float((self._bboxes[:, 3] - self._tops).max()) if len(self._order) else 0.0
+    
+    def __len__(self) -> int:
+        return len(self._order)
+    
+    def _block(self, i: int) -> Dict:
+        """The i-th block from the top, as a text block dict"""
+        index = int(self._order[i])
+        if self._dicts is not None:
+            return self._dicts[index]
+        return self.text_blocks.block(index)
+    
+    def blocks_below(self, bbox, max_distance: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Blocks whose top edge is below the bottom of bbox, nearest first
+        
+        Args:
+            bbox: [x0, y0, x1, y1] of the reference region
+            max_distance: Optional limit on how far below bbox a block may start
+        """
+        start = int(np.searchsorted(self._tops, bbox[3], side="right"))
+        if max_distance is None:
+            end = len(self._order)
+        else:
+            end = int(np.searchsorted(self._tops, bbox[3] + max_distance, side="right"))
+        
+        for i in range(start, end):
+            yield self._block(i)
+    
+    def blocks_near(self, bbox, margin: float) -> Iterator[Dict]:
+        """Blocks overlapping bbox expanded by margin on every side, top to bottom"""
+        x0, y0, x1, y1 = bbox[0] - margin, bbox[1] - margin, bbox[2] + margin, bbox[3] + margin
+        
+        # Only blocks starting between (region top - tallest block) and the region bottom can overlap it
+        start = int(np.searchsorted(self._tops, y0 - self._max_height, side="left"))
+        end = int(np.searchsorted(self._tops, y1, side="right"))
+        
+        candidates = self._bboxes[start:end]
+        overlapping = (candidates[:, 3] >= y0) & (candidates[:, 2] >= x0) & (candidates[:, 0] <= x1)
+        for i in np.flatnonzero(overlapping):
+            yield self._block(start + int(i))
+
+class PageIndexes:
+    """Lazily built TextBlockIndex per page of processed PDF content (a pdf_content dict or a Document)"""
+    
+    def __init__(self, pdf_content: Union[Dict, Document]):
+        self.pdf_content = pdf_content
+        self._indexes = {}
+    
+    def __getitem__(self, page_num: int) -> TextBlockIndex:
+        index = self._indexes.get(page_num)
+        if index is None:
+            if isinstance(self.pdf_content, Document):
+                text_blocks = self.pdf_content.pages[page_num].text_blocks
+            else:
+                text_blocks = self.pdf_content["pages"][page_num].get("text_blocks", [])
+            index = TextBlockIndex(text_blocks)
+            self._indexes[page_num] = index
+        return index
@@ -0,0 +1,236 @@
+# modules/spool.py
+"""
+Job Spool
+Shared-directory job hand-off between the API tier and evaluation workers, claimed by atomic renames
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+from typing import Dict, Iterator, Optional, Tuple
+
+from modules.job_queue import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+SPEC_FILE = "job.json"
+STATUS_FILE = "status.json"
+CANCEL_FILE = "cancel"
+
+def _write_json(directory: str, name: str, data: Dict):
+    """Write a JSON file through a temp file and rename, so readers never see partial files"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+class SpoolJob:
+    """A claimed job: its directory in the spool and its specification"""
+    
+    def __init__(self, name: str, path: str, spec: Dict):
+        self.name = name
+        self.path = path
+        self.spec = spec
+    
+    @property
+    def job_id(self) -> str:
+        return self.spec["job_id"]
+    
+    def file(self, name: Optional[str]) -> Optional[str]:
+        """Path of one of the job's files"""
+        return os.path.join(self.path, name) if name else None
+
+class JobSpool:
+    """
+    A job queue on a filesystem shared by the API and any number of worker
+    processes or hosts, with no broker.
+    
+    Each job is a directory holding its uploads and job.json. It is built in
+    tmp/ and renamed into pending/ under a name that sorts by priority lane
+    and submission time. A worker claims a job by renaming it into running/;
+    the rename is atomic, so exactly one worker wins. The worker publishes
+    the job record as status.json in the job directory, touches the directory
+    as a heartbeat and renames it into done/ when it has finished. Jobs whose
+    worker stopped sending heartbeats are moved back to pending/.
+    """
+    
+    def __init__(self, directory: str = "spool"):
+        self.directory = directory
+        for state in ("tmp", "pending", "running", "done"):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+    
+    def _dir(self, state: str, name: str = "") -> str:
+        return os.path.join(self.directory, state, name)
+    
+    def submit(self, job_id: str, spec: Dict, files: Dict[str, str],
+               shared_files: Optional[Dict[str, str]] = None, priority: str = "normal") -> str:
+        """
+        Add a job to the spool
+        
+        Args:
+            job_id: Job id, also stored in the spec
+            spec: JSON-serializable description of the job
+            files: Files to move into the job directory, by name
+            shared_files: Files to link (or copy) into the job directory, by name,
+                          for inputs several jobs use, like a batch's answer key
+            priority: Lane of the job, one of PRIORITIES
+        
+        Returns:
+            Name of the job directory
+        """
+        name = f"{PRIORITIES[priority]}-{time.time_ns():020d}-{job_id}"
+        staging = self._dir("tmp", name)
+        os.makedirs(staging)
+        
+        try:
+            for file_name, source in files.items():
+                shutil.move(source, os.path.join(staging, file_name))
+            for file_name, source in (shared_files or {}).items():
+                target = os.path.join(staging, file_name)
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+            _write_json(staging, SPEC_FILE, dict(spec, job_id=job_id, priority=priority))
+            
+            # Workers only ever see complete job directories
+            os.rename(staging, self._dir("pending", name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        
+        return name
+    
+    def pending_count(self) -> int:
+        return len(os.listdir(self._dir("pending")))
+    
+    def claim(self) -> Optional[SpoolJob]:
+        """Claim the first pending job, or return None if there is none"""
+        for name in sorted(os.listdir(self._dir("pending"))):
+            path = self._dir("running", name)
+            try:
+                os.rename(self._dir("pending", name), path)
+            except OSError:
+                # Another worker claimed it first
+                continue
+            
+            os.utime(path, None)
+            spec = _read_json(os.path.join(path, SPEC_FILE))
+            if spec is None:
+                logger.error(f"Discarding spooled job {name} without a readable {SPEC_FILE}")
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            return SpoolJob(name, path, spec)
+        return None
+    
+    def write_status(self, job: SpoolJob, record: Dict):
+        """Publish the job record for the API to collect; also a heartbeat"""
+        _write_json(job.path, STATUS_FILE, record)
+        self.heartbeat(job)
+    
+    def heartbeat(self, job: SpoolJob):
+        os.utime(job.path, None)
+    
+    def finish(self, job: SpoolJob):
+        """Hand a finished job back to the API"""
+        os.rename(job.path, self._dir("done", job.name))
+    
+    def _find(self, state: str, job_id: str) -> Optional[str]:
+        suffix = f"-{job_id}"
+        for name in os.listdir(self._dir(state)):
+            if name.endswith(suffix):
+                return name
+        return None
+    
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a spooled job
+        
+        Returns:
+            "queued" if the job was pending and won't run, "running" if its
+            worker was asked to stop it, None if the spool doesn't know it
+        """
+        name = self._find("pending", job_id)
+        if name is not None:
+            # Renaming out of pending/ races claims atomically, like a claim does
+            cancelled = self._dir("tmp", f"cancelled-{name}")
+            try:
+                os.rename(self._dir("pending", name), cancelled)
+            except OSError:
+                pass
+            else:
+                shutil.rmtree(cancelled, ignore_errors=True)
+                return "queued"
+        
+        name = self._find("running", job_id)
+        if name is not None:
+            try:
+                open(os.path.join(self._dir("running", name), CANCEL_FILE), "w").close()
+            except OSError:
+                # Finished in the meantime
+                return None
+            return "running"
+        return None
+    
+    def cancel_requested(self, job: SpoolJob) -> bool:
+        return os.path.exists(os.path.join(job.path, CANCEL_FILE))
+    
+    def requeue_stale(self, stale_seconds: float) -> int:
+        """Move running jobs without a heartbeat for stale_seconds back to pending"""
+        requeued = 0
+        cutoff = time.time() - stale_seconds
+        for name in os.listdir(self._dir("running")):
+            path = self._dir("running", name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.rename(path, self._dir("pending", name))
+            except OSError:
+                continue
+            
+            try:
+                os.remove(os.path.join(self._dir("pending", name), STATUS_FILE))
+            except OSError:
+                pass
+            logger.warning(f"Requeued spooled job {name} after its worker stopped responding")
+            requeued += 1
+        return requeued
+    
+    def collect(self) -> Iterator[Tuple[Dict, bool, str]]:
+        """
+        Yield (job record, finished, job directory) for every published status.
+        Finished jobs are only yielded once their directory is in done/;
+        remove it with discard once the record has been stored.
+        """
+        for state, finished in (("running", False), ("done", True)):
+            for name in sorted(os.listdir(self._dir(state))):
+                path = self._dir(state, name)
+                record = _read_json(os.path.join(path, STATUS_FILE))
+                if record is not None:
+                    yield record, finished, path
+    
+    def discard(self, path: str):
+        shutil.rmtree(path, ignore_errors=True)
+
+def create_spool() -> Optional[JobSpool]:
+    """Create the job spool configured by SPOOL_DIR (unset keeps all jobs in the API process)"""
+    directory = os.environ.get("SPOOL_DIR")
+    if not directory:
+        return None
+    return JobSpool(directory)
@@ -0,0 +1,112 @@
+# worker.py
+"""
+Evaluation Worker
+Claims test evaluations from the shared job spool (SPOOL_DIR) and publishes their progress and results back to it
+"""
+import os
+import asyncio
+import logging
+import argparse
+
+# Job records live in the spool; the worker only keeps those of its own running jobs
+os.environ["JOB_STORE_BACKEND"] = "memory"
+
+import main as evaluation_api
+from modules.spool import JobSpool, SpoolJob, create_spool
+
+logger = logging.getLogger(__name__)
+
+async def run_worker(spool: JobSpool, concurrency: int = 2, poll_interval: float = 1.0,
+                     stale_seconds: float = 300.0, drain: bool = False):
+    """
+    Claim and evaluate spooled jobs
+    
+    Args:
+        spool: Spool shared with the API
+        concurrency: Jobs evaluated at the same time
+        poll_interval: Seconds between looking for new jobs, heartbeats and cancellations
+        stale_seconds: Jobs of other workers silent for this long are requeued
+        drain: Return once the spool has no pending jobs left instead of waiting for more
+    """
+    job_store = evaluation_api.job_store
+    job_queue = evaluation_api.job_queue
+    claimed = {}
+    
+    def publish(job_id: str, fields):
+        job = claimed.get(job_id)
+        if job is not None:
+            spool.write_status(job, dict(job_store.get(job_id), job_id=job_id))
+    
+    def finished(job: SpoolJob, future: asyncio.Future):
+        if future.cancelled():
+            job_store.update(job.job_id, status="cancelled", message="Evaluation cancelled")
+        try:
+            spool.finish(job)
+        except OSError as e:
+            logger.warning(f"Could not hand back job {job.job_id}, it was probably requeued: {str(e)}")
+        claimed.pop(job.job_id, None)
+        job_store.delete(job.job_id)
+    
+    def start(job: SpoolJob):
+        spec = job.spec
+        logger.info(f"Claimed job {job.job_id}")
+        claimed[job.job_id] = job
+        job_store.create(job.job_id, status="queued", message="Test evaluation has been claimed by a worker")
+        
+        future = job_queue.submit(
+            job.job_id,
+            evaluation_api.process_test_evaluation,
+            job.job_id,
+            job.file(spec["test_file"]),
+            job.file(spec.get("answer_key_file")),
+            spec.get("config"),
+            test_hash=spec.get("test_hash"),
+            answer_key_hash=spec.get("answer_key_hash"),
+            priority=spec.get("priority", "normal"),
+            force=True
+        )
+        future.add_done_callback(lambda future: finished(job, future))
+    
+    job_store.add_listener(publish)
+    evaluation_api.pipeline_executor.start()
+    job_queue.start()
+    
+    try:
+        while True:
+            spool.requeue_stale(stale_seconds)
+            
+            for job in list(claimed.values()):
+                spool.heartbeat(job)
+                if spool.cancel_requested(job):
+                    job_queue.cancel(job.job_id)
+            
+            while len(claimed) < concurrency:
+                job = spool.claim()
+                if job is None:
+                    break
+                start(job)
+            
+            if drain and not claimed and not spool.pending_count():
+                break
+            await asyncio.sleep(poll_interval)
+    finally:
+        await job_queue.shutdown()
+        evaluation_api.pipeline_executor.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate test submissions from the shared job spool")
+    parser.add_argument("--spool-dir", help="Spool directory (default: SPOOL_DIR)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("WORKER_CONCURRENCY", 2)))
+    parser.add_argument("--poll-interval", type=float, default=float(os.environ.get("SPOOL_POLL_SECONDS", 1.0)))
+    parser.add_argument("--stale-seconds", type=float, default=float(os.environ.get("SPOOL_STALE_SECONDS", 300)))
+    parser.add_argument("--drain", action="store_true", help="Exit once no jobs are left")
+    args = parser.parse_args()
+    
+    spool = JobSpool(args.spool_dir) if args.spool_dir else create_spool()
+    if spool is None:
+        parser.error("Set SPOOL_DIR or pass --spool-dir")
+    
+    try:
+        asyncio.run(run_worker(spool, args.concurrency, args.poll_interval, args.stale_seconds, args.drain))
+    except KeyboardInterrupt:
+        pass
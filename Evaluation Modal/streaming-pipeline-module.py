@@ -0,0 +1,135 @@
+# modules/streaming_pipeline.py
+"""
+Streaming Pipeline
+Runs extraction, question detection and classification page by page over a bounded page window
+"""
+import queue
+import logging
+import threading
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+def prefetch(iterator: Iterator, size: int) -> Iterator:
+    """
+    Run an iterator in a background thread, buffering at most size items,
+    so page extraction overlaps with the analysis of earlier pages
+    """
+    buffer = queue.Queue(maxsize=max(1, size))
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        """Buffer an item, giving up if the consumer has stopped"""
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(e)
+    
+    thread = threading.Thread(target=produce, name="page-prefetch", daemon=True)
+    thread.start()
+    
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Let the producer exit if the consumer stops early
+        stop.set()
+
+class StreamingPipeline:
+    """
+    Streams pages through extraction -> question detection -> classification.
+    
+    Only a window of window_size consecutive pages is held in memory. Each
+    window is analyzed as a small document and only the questions starting
+    on its first page are emitted, so a question that runs onto the next
+    page is always analyzed with that page's content available. The window
+    then slides forward by one page.
+    """
+    
+    def __init__(self, pdf_processor, doc_engine, question_classifier,
+                 window_size: int = 2, prefetch_pages: int = 2):
+        self.pdf_processor = pdf_processor
+        self.doc_engine = doc_engine
+        self.question_classifier = question_classifier
+        self.window_size = max(2, window_size)  # At least one page of look-ahead
+        self.prefetch_pages = prefetch_pages
+        
+        # Extraction time, table and figure counts of every page streamed so far
+        self.page_stats = []
+    
+    def iter_questions(self, pdf_path: str) -> Iterator[Dict]:
+        """Yield classified questions in page order while the document is still being read"""
+        pages = self.pdf_processor.iter_pages(pdf_path)
+        if self.prefetch_pages > 0:
+            pages = prefetch(pages, self.prefetch_pages)
+        
+        window = []
+        window_start = 0
+        
+        for page in pages:
+            self.page_stats.append({
+                "extraction_time": page.get("extraction_time"),
+                "tables": len(page.get("tables", [])),
+                "figures": len(page.get("figures", []))
+            })
+            window.append(page)
+            if len(window) < self.window_size:
+                continue
+            
+            yield from self._analyze_window(window, window_start, emit_pages=1)
+            window.pop(0)
+            window_start += 1
+        
+        # The final window has no more look-ahead, so everything left is emitted
+        if window:
+            yield from self._analyze_window(window, window_start, emit_pages=len(window))
+    
+    def run(self, pdf_path: str) -> List[Dict]:
+        """Stream a whole document and collect its classified questions"""
+        questions = list(self.iter_questions(pdf_path))
+        logger.info(f"Streamed {len(questions)} questions from {pdf_path}")
+        return questions
+    
+    def _analyze_window(self, window: List[Dict], window_start: int, emit_pages: int) -> List[Dict]:
+        """Detect and classify the questions starting on the first emit_pages pages of a window"""
+        document_structure = self.doc_engine.analyze({
+            "metadata": {},
+            "page_count": len(window),
+            "pages": window,
+            "tables": [table for page in window for table in page.get("tables", [])]
+        })
+        
+        # Questions on the look-ahead pages are picked up again by a later window
+        document_structure["questions"] = [
+            question for question in document_structure.get("questions", [])
+            if question.get("page", 0) < emit_pages
+        ]
+        if not document_structure["questions"]:
+            return []
+        
+        questions = self.question_classifier.classify(document_structure)
+        
+        # Page numbers are relative to the window; make them absolute
+        for question in questions:
+            question["page"] = window_start + question.get("page", 0)
+        
+        return questions
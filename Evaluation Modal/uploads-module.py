@@ -0,0 +1,79 @@
+# modules/uploads.py
+"""
+Upload Handling
+Streams uploaded files to disk in fixed-size chunks, hashing them on the way
+"""
+import os
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-file upload limit and streaming chunk size
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Limit on the whole request body, checked against Content-Length before it is read
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 2 * 1024 * 1024 * 1024))
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+    
+    def __init__(self, filename: Optional[str], max_bytes: int):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        super().__init__(f"Upload '{filename}' exceeds the limit of {max_bytes} bytes")
+
+async def save_upload(
+    upload,
+    path: str,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Tuple[str, int]:
+    """
+    Stream an uploaded file to disk without buffering it in memory
+    
+    Args:
+        upload: FastAPI UploadFile (anything with an async read(size))
+        path: Destination file path
+        max_bytes: Size limit, defaults to MAX_UPLOAD_BYTES
+        chunk_size: Read size, defaults to UPLOAD_CHUNK_SIZE
+    
+    Returns:
+        Tuple of (SHA-256 hex digest, size in bytes)
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    filename = getattr(upload, "filename", None)
+    
+    # Reject early when the client declared the part size
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise UploadTooLargeError(filename, max_bytes)
+    
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(filename, max_bytes)
+                
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        # Don't leave partial files behind
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    
+    return digest.hexdigest(), size